@@ -0,0 +1,177 @@
+"""
+Versioned JSON API for artists, venues and shows
+"""
+# Imports
+
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, request
+from werkzeug.exceptions import HTTPException
+
+import geo
+import matchmaking
+import search_index
+from availability import upcoming_slots
+from cache import cached
+from conditional import conditional
+from models import db, Artist, Venue, Show, UpcomingShow
+from pagination import keyset_page, next_offset, past_shows_page
+from queries import artist_shows, artist_version, shows_version, upcoming_shows_count, venue_shows, venue_version
+from serializers import (ARTIST_DETAIL, ARTIST_SUMMARY, NEARBY_VENUE, SEARCH_RESULT, SHOW, UPCOMING_SHOW,
+                         VENUE_DETAIL, VENUE_SUMMARY, Serializer, dumps)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def page_response(page, serializer):
+    return json_response({
+        'data': serializer.dump_many(page.items),
+        'next_cursor': page.next_token,
+        'prev_cursor': page.prev_token
+    })
+
+
+def first_or_404(query):
+    row = query.first()
+    if row is None:
+        abort(404)
+    return row
+
+
+# The app's own 404 and 500 handlers would otherwise win over the class handler
+@api.errorhandler(404)
+@api.errorhandler(500)
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response({'error': error.name, 'message': error.description}, error.code)
+
+# Artists.
+
+
+@api.route('/artists')
+@cached('artists')
+def artists():
+    query = db.session.query(*ARTIST_SUMMARY.columns)
+    page = keyset_page(query, (Artist.created_at, Artist.id), request.args.get('cursor'))
+    return page_response(page, ARTIST_SUMMARY)
+
+
+@api.route('/artists/search')
+@cached('artists')
+def search_artists():
+    return search_response(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional(artist_version)
+@cached('artist:{artist_id}', 'shows', 'venues')
+def artist(artist_id):
+    now = datetime.now()
+    data = ARTIST_DETAIL.dump(first_or_404(db.session.query(*ARTIST_DETAIL.columns).filter(Artist.id == artist_id)))
+    data.update(artist_shows(artist_id, now=now, **past_shows_page()))
+    data['availability'] = [slot.to_dict() for slot in upcoming_slots(artist_id, now)]
+    return json_response(data)
+
+
+@api.route('/artists/<int:artist_id>/matches')
+def artist_matches(artist_id):
+    return matches_response(Artist, artist_id)
+
+# Venues.
+
+
+@api.route('/venues')
+@cached('venues', 'shows')
+def venues():
+    # Built per request: the upcoming count compares against the current time
+    listing = Serializer(*VENUE_SUMMARY.columns, upcoming_shows_count().label('num_upcoming_shows'))
+    query = db.session.query(*listing.columns)
+    page = keyset_page(query, (Venue.state, Venue.city, Venue.id), request.args.get('cursor'))
+    return page_response(page, listing)
+
+
+@api.route('/venues/search')
+@cached('venues')
+def search_venues():
+    return search_response(Venue)
+
+
+@api.route('/venues/near')
+@cached('venues')
+def venues_near():
+    try:
+        latitude, longitude, radius_km = geo.requested_point(request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    return json_response({
+        'latitude': latitude,
+        'longitude': longitude,
+        'radius_km': radius_km,
+        'data': NEARBY_VENUE.dump_many(geo.venues_near(latitude, longitude, radius_km))
+    })
+
+
+@api.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    return matches_response(Venue, venue_id)
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional(venue_version)
+@cached('venue:{venue_id}', 'shows', 'artists')
+def venue(venue_id):
+    data = VENUE_DETAIL.dump(first_or_404(db.session.query(*VENUE_DETAIL.columns).filter(Venue.id == venue_id)))
+    data.update(venue_shows(venue_id, **past_shows_page()))
+    return json_response(data)
+
+# Shows.
+
+
+def show_query():
+    return db.session.query(*SHOW.columns).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id)
+
+
+@api.route('/shows')
+@conditional(shows_version)
+@cached('shows', 'artists', 'venues')
+def shows():
+    # Upcoming shows from the feed, like the /shows page; ?past=1 lists every show
+    if request.args.get('past') == '1':
+        page = keyset_page(show_query(), (Show.start_time, Show.id), request.args.get('cursor'))
+        return page_response(page, SHOW)
+    query = db.session.query(*UPCOMING_SHOW.columns).filter(UpcomingShow.start_time > datetime.now())
+    page = keyset_page(query, (UpcomingShow.start_time, UPCOMING_SHOW.columns[0]), request.args.get('cursor'))
+    return page_response(page, UPCOMING_SHOW)
+
+
+@api.route('/shows/<int:show_id>')
+@cached('shows', 'artists', 'venues')
+def show(show_id):
+    return json_response(SHOW.dump(first_or_404(show_query().filter(Show.id == show_id))))
+
+# Matches.
+
+
+def matches_response(model, id):
+    limit = min(max(request.args.get('limit', 0, type=int), 0), 100)
+    found = matchmaking.matches(model, id, limit or None)
+    if found is None:
+        abort(404)
+    return json_response({'data': found[1]})
+
+# Search.
+
+
+def search_response(model):
+    term = request.args.get('q', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    count, rows = search_index.ranked(model, term, offset=offset)
+    return json_response({
+        'count': count,
+        'data': SEARCH_RESULT.dump_many(rows),
+        'next_offset': next_offset(count, offset, len(rows))
+    })
@@ -6,17 +6,38 @@ Contains all routes and endpoints for the music app.
 # Imports
 import os
 import logging
-import babel
-import dateutil.parser
 from datetime import datetime
-from collections import defaultdict
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import (Flask, Response, abort, flash, jsonify, redirect, render_template, request, send_file,
+                   stream_with_context, url_for)
 from flask_migrate import Migrate
 from flask_moment import Moment
 from logging import FileHandler, Formatter
 
+import async_mode
+import feed
+import geo
+import matchmaking
+import search_index
+from api import api
+from assets import IMMUTABLE_MAX_AGE, Assets, assets_command
+from availability import is_artist_available, replace_slots, upcoming_slots
+from bookings import BookingError, book_show, parse_ids
+from cache import cached, page_cache
+from conditional import conditional
+from exporter import (ENTITIES as EXPORT_ENTITIES, FORMATS as EXPORT_FORMATS, export_chunks, export_command,
+                      mimetype)
+from formatting import format_datetime
 from forms import *
-from models import db, Artist, Venue, Show
+from genres import area_facets, facets, genre_choices, listing_criteria, selected_genres
+from images import DEFAULT_IMAGE, KINDS as IMAGE_KINDS, SIZES as IMAGE_SIZES, FetchError, Thumbnails, link_version
+from importer import import_command
+from instrumentation import Instrumentation
+from models import db, Artist, Venue, Show, UpcomingShow
+from pagination import keyset_page, next_offset, past_shows_page
+from pool_metrics import SessionLifecycle, pool_metrics
+from queries import (artist_shows, artist_version, group_by_area, load, shows_version, venue_query, venue_rows,
+                     venue_shows, venue_version)
+from serializers import ARTIST_DETAIL, VENUE_DETAIL
 
 # App Setup
 app = Flask(__name__)
@@ -24,23 +45,27 @@ moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
 migrate = Migrate(app, db)
+instrumentation = Instrumentation(app)
+session_lifecycle = SessionLifecycle(db, app)
+page_cache.init_app(app)
+assets = Assets(app)
+thumbnails = Thumbnails(app)
+app.register_blueprint(api)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(feed.feed_command)
+app.cli.add_command(assets_command)
 
 # Jinja Custom Filter
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value) if isinstance(value, str) else value
-    format_str = {
-        'full': "EEEE MMMM d, y 'at' h:mma",
-        'medium': "EE MM dd, y h:mma"
-    }.get(format, format)
-    return babel.dates.format_datetime(date, format_str)
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+
 # Home Route
 @app.route('/')
+@cached('artists', 'venues')
 def index():
-    recent_artists = Artist.query.order_by(Artist.created_at.desc()).limit(10).all()
-    recent_venues = Venue.query.order_by(Venue.created_at.desc()).limit(10).all()
+    recent_artists = load(Artist, 'list').order_by(Artist.created_at.desc()).limit(10).all()
+    recent_venues = load(Venue, 'list').order_by(Venue.created_at.desc()).limit(10).all()
     return render_template('pages/home.html', recent_artists=recent_artists, recent_venues=recent_venues)
 
 # Search Route
@@ -52,23 +77,35 @@ def search():
     if request.method == 'POST':
         if form.validate():
             city, state = form.city.data, form.state.data
-            artists = Artist.query.filter_by(city=city, state=state).all()
-            venues = Venue.query.filter_by(city=city, state=state).all()
-            return render_template('pages/show_results.html', city=city, state=state, artists=artists, venues=venues)
+            genres, match = selected_genres(request.form)
+            artists = load(Artist, 'list').filter(*listing_criteria(Artist, city, state, genres, match)).all()
+            venues = load(Venue, 'list').filter(*listing_criteria(Venue, city, state, genres, match)).all()
+            return render_template('pages/show_results.html', form=form, city=city, state=state, artists=artists,
+                                   venues=venues, facets=area_facets(city, state), genres=genres, match=match)
         flash('Please enter a valid city and state.')
 
     return render_template('forms/search_results.html', form=form, artists=artists, venues=venues)
 
 # Artist Routes
 @app.route('/artists')
+@cached('artists')
 def artists():
-    return render_template('pages/artists.html', artists=Artist.query.all())
+    city, state = request.args.get('city'), request.args.get('state')
+    genres, match = selected_genres(request.args)
+    query = load(Artist, 'list').filter(*listing_criteria(Artist, city, state, genres, match))
+    page = keyset_page(query, (Artist.created_at, Artist.id), request.args.get('cursor'))
+    return render_template('pages/artists.html', artists=page.items, page=page, facets=facets(Artist, city, state),
+                           genres=genres, match=match)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    term = request.form.get('search_term')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{term}%')).all()
-    return render_template('pages/search_artists.html', results={'count': len(artists), 'data': artists}, search_term=term)
+    term = request.form.get('search_term', '')
+    offset = max(request.form.get('offset', 0, type=int), 0)
+    genres, match = selected_genres(request.form)
+    count, artists = search_index.ranked(Artist, term, offset=offset, genres=genres, match=match)
+    results = {'count': count, 'data': artists, 'next_offset': next_offset(count, offset, len(artists))}
+    return render_template('pages/search_artists.html', results=results, search_term=term, facets=genre_choices(),
+                           genres=genres, match=match)
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
@@ -82,59 +119,48 @@ def create_artist_submission():
             artist = Artist(**{field.name: field.data for field in form})
             db.session.add(artist)
             db.session.commit()
+            search_index.invalidate(Artist)
+            matchmaking.refresh(Artist, artist.id)
+            page_cache.invalidate('artists')
             flash(f'Artist {artist.name} was successfully listed!')
             return redirect(url_for('index'))
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print(e)
+            app.logger.exception('Artist %s could not be listed', form.name.data)
             flash(f'An error occurred. Artist {form.name.data} could not be listed.')
-        finally:
-            db.session.close()
     else:
         errors = ", ".join([f"{field}: {error}" for field, errs in form.errors.items() for error in errs])
         flash(f'Please fix the following errors: {errors}')
     return render_template('forms/new_artist.html', form=form)
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_version)
+@cached('artist:{artist_id}', 'shows', 'venues')
 def show_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = db.session.query(*ARTIST_DETAIL.columns).filter(Artist.id == artist_id).first()
+    if artist is None:
+        abort(404)
     now = datetime.now()
+    past_page = past_shows_page()
 
-    shows = db.session.query(Show, Venue).join(Venue).filter(Show.artist_id == artist_id).all()
-    past, upcoming = [], []
-
-    for show, venue in shows:
-        info = {
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "venue_image_link": venue.image_link,
-            "start_time": format_datetime(show.start_time)
-        }
-        (past if show.start_time <= now else upcoming).append(info)
-
-    artist_data = artist.__dict__
-    artist_data.update({
-        'past_shows': past,
-        'upcoming_shows': upcoming,
-        'past_shows_count': len(past),
-        'upcoming_shows_count': len(upcoming)
-    })
+    artist_data = ARTIST_DETAIL.dump(artist)
+    artist_data.update(artist_shows(artist_id, now=now, **past_page))
+
+    availability = [slot.starts_at.strftime('%Y-%m-%d, %H:%M') for slot in upcoming_slots(artist_id, now)]
 
-    availability = []
-    if artist.availability:
-        for slot in artist.availability:
-            try:
-                slot_time = datetime.strptime(f"{slot['date']} {slot['start_time']}", "%Y-%m-%d %H:%M")
-                if slot_time > now:
-                    availability.append(f"{slot['date']}, {slot['start_time']}")
-            except ValueError:
-                continue
+    return render_template('pages/show_artist.html', artist=artist_data, availability_data=availability, past_page=past_page)
 
-    return render_template('pages/show_artist.html', artist=artist_data, availability_data=availability)
+@app.route('/artists/<int:artist_id>/matches')
+def artist_matches(artist_id):
+    found = matchmaking.matches(Artist, artist_id)
+    if found is None:
+        abort(404)
+    subject, matches = found
+    return render_template('pages/matches.html', subject=subject, kind='artist', counterpart='venue', matches=matches)
 
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = load(Artist, 'detail').get_or_404(artist_id)
     return render_template('forms/edit_artist.html', form=ArtistForm(obj=artist), artist=artist)
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
@@ -145,45 +171,61 @@ def edit_artist_submission(artist_id):
         for field in form:
             if hasattr(artist, field.name):
                 setattr(artist, field.name, field.data)
+        feed.refresh(Show.artist_id == artist_id)
         db.session.commit()
+        search_index.invalidate(Artist)
+        matchmaking.refresh(Artist, artist_id)
+        page_cache.invalidate('artists', f'artist:{artist_id}')
         flash(f'Artist {artist.name} was successfully updated!')
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(e)
+        app.logger.exception('Artist %s could not be updated', artist_id)
         flash(f'An error occurred. Artist {form.name.data} could not be updated.')
-    finally:
-        db.session.close()
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 # Venue Routes
 @app.route('/venues')
+@cached('venues', 'shows')
 def venues():
-    venues = Venue.query.order_by(Venue.state, Venue.city).all()
-    grouped_data = defaultdict(lambda: {"venues": []})
-
-    for venue in venues:
-        key = (venue.city, venue.state)
-        grouped_data[key]["city"] = venue.city
-        grouped_data[key]["state"] = venue.state
-        grouped_data[key]["venues"].append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len([show for show in venue.shows if show.start_time > datetime.now()])
-        })
-
-    return render_template('pages/venues.html', areas=list(grouped_data.values()))
+    city, state = request.args.get('city'), request.args.get('state')
+    genres, match = selected_genres(request.args)
+    query = venue_query(*listing_criteria(Venue, city, state, genres, match))
+    page = keyset_page(query, (Venue.state, Venue.city, Venue.id), request.args.get('cursor'))
+    return render_template('pages/venues.html', areas=group_by_area(page.items), page=page,
+                           facets=facets(Venue, city, state), genres=genres, match=match)
+
+@app.route('/venues/near')
+@cached('venues')
+def venues_near():
+    if not request.args:
+        return render_template('pages/venues_near.html', venues=None, radius_km=app.config['NEAR_DEFAULT_RADIUS_KM'],
+                               max_radius=app.config['NEAR_MAX_RADIUS_KM'])
+    try:
+        latitude, longitude, radius_km = geo.requested_point(request.args)
+    except ValueError as e:
+        # Not a 200, so the cache does not keep the flashed message
+        flash(str(e))
+        return render_template('pages/venues_near.html', venues=None, radius_km=app.config['NEAR_DEFAULT_RADIUS_KM'],
+                               max_radius=app.config['NEAR_MAX_RADIUS_KM']), 400
+    return render_template('pages/venues_near.html', venues=geo.venues_near(latitude, longitude, radius_km),
+                           radius_km=radius_km, max_radius=app.config['NEAR_MAX_RADIUS_KM'])
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    term = request.form.get('search_term')
-    venues = Venue.query.filter(Venue.name.ilike(f'%{term}%')).all()
+    term = request.form.get('search_term', '')
+    offset = max(request.form.get('offset', 0, type=int), 0)
+    genres, match = selected_genres(request.form)
+    count, venues = search_index.ranked(Venue, term, offset=offset, genres=genres, match=match)
+    upcoming = {row.id: row.num_upcoming_shows for row in venue_rows(Venue.id.in_([venue.id for venue in venues]))}
     data = [{
         'id': venue.id,
         'name': venue.name,
-        'num_upcoming_shows': len([show for show in venue.shows if show.start_time > datetime.now()])
+        'num_upcoming_shows': upcoming.get(venue.id, 0)
     } for venue in venues]
 
-    return render_template('pages/search_venues.html', results={'count': len(data), 'data': data}, search_term=term)
+    results = {'count': count, 'data': data, 'next_offset': next_offset(count, offset, len(data))}
+    return render_template('pages/search_venues.html', results=results, search_term=term, facets=genre_choices(),
+                           genres=genres, match=match)
 
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
@@ -197,49 +239,45 @@ def create_venue_submission():
             venue = Venue(**{field.name: field.data for field in form})
             db.session.add(venue)
             db.session.commit()
+            search_index.invalidate(Venue)
+            matchmaking.refresh(Venue, venue.id)
+            page_cache.invalidate('venues')
             flash(f'Venue {venue.name} was successfully listed!')
             return redirect(url_for('index'))
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print(e)
+            app.logger.exception('Venue %s could not be listed', form.name.data)
             flash('An error occurred. Venue could not be listed.')
-        finally:
-            db.session.close()
     else:
         errors = ", ".join([f"{field}: {error}" for field, errs in form.errors.items() for error in errs])
         flash(f'Please fix the following errors: {errors}')
     return render_template('forms/new_venue.html', form=form)
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_version)
+@cached('venue:{venue_id}', 'shows', 'artists')
 def show_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
-    now = datetime.now()
+    venue = db.session.query(*VENUE_DETAIL.columns).filter(Venue.id == venue_id).first()
+    if venue is None:
+        abort(404)
+    past_page = past_shows_page()
 
-    shows = db.session.query(Show, Artist).join(Artist).filter(Show.venue_id == venue_id).all()
-    past, upcoming = [], []
-
-    for show, artist in shows:
-        info = {
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": format_datetime(show.start_time)
-        }
-        (past if show.start_time <= now else upcoming).append(info)
-
-    venue_data = venue.__dict__
-    venue_data.update({
-        'past_shows': past,
-        'upcoming_shows': upcoming,
-        'past_shows_count': len(past),
-        'upcoming_shows_count': len(upcoming)
-    })
+    venue_data = VENUE_DETAIL.dump(venue)
+    venue_data.update(venue_shows(venue_id, **past_page))
+
+    return render_template('pages/show_venue.html', venue=venue_data, past_page=past_page)
 
-    return render_template('pages/show_venue.html', venue=venue_data)
+@app.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    found = matchmaking.matches(Venue, venue_id)
+    if found is None:
+        abort(404)
+    subject, matches = found
+    return render_template('pages/matches.html', subject=subject, kind='venue', counterpart='artist', matches=matches)
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
+    venue = load(Venue, 'detail').get_or_404(venue_id)
     return render_template('forms/edit_venue.html', form=VenueForm(obj=venue), venue=venue)
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
@@ -250,27 +288,33 @@ def edit_venue_submission(venue_id):
         for field in form:
             if hasattr(venue, field.name):
                 setattr(venue, field.name, field.data)
+        feed.refresh(Show.venue_id == venue_id)
         db.session.commit()
+        search_index.invalidate(Venue)
+        matchmaking.refresh(Venue, venue_id)
+        page_cache.invalidate('venues', f'venue:{venue_id}')
         flash(f'Venue {venue.name} was successfully updated!')
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(e)
+        app.logger.exception('Venue %s could not be updated', venue_id)
         flash(f'An error occurred. Venue {form.name.data} could not be updated.')
-    finally:
-        db.session.close()
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 # Show Routes
 @app.route('/shows')
+@conditional(shows_version)
+@cached('shows', 'artists', 'venues')
 def shows():
-    shows = db.session.query(
-        Show.venue_id,
-        Venue.name.label("venue_name"),
-        Show.artist_id,
-        Artist.name.label("artist_name"),
-        Artist.image_link.label("artist_image_link"),
-        Show.start_time
-    ).join(Artist).join(Venue).all()
+    query = db.session.query(
+        UpcomingShow.show_id,
+        UpcomingShow.venue_id,
+        UpcomingShow.venue_name,
+        UpcomingShow.artist_id,
+        UpcomingShow.artist_name,
+        UpcomingShow.artist_image_link,
+        UpcomingShow.start_time
+    ).filter(UpcomingShow.start_time > datetime.now())
+    page = keyset_page(query, (UpcomingShow.start_time, UpcomingShow.show_id), request.args.get('cursor'))
 
     data = [{
         'venue_id': show.venue_id,
@@ -278,65 +322,113 @@ def shows():
         'artist_id': show.artist_id,
         'artist_name': show.artist_name,
         'artist_image_link': show.artist_image_link,
-        'start_time': show.start_time.isoformat()
-    } for show in shows]
+        'start_time': show.start_time
+    } for show in page.items]
 
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=data, page=page)
 
 @app.route('/shows/create', methods=['GET', 'POST'])
 def create_show_submission():
     form = ShowForm(request.form, meta={'csrf': False})
     if request.method == 'POST' and form.validate():
         try:
-            show = Show(
-                artist_id=form.artist_id.data,
-                venue_id=form.venue_id.data,
-                start_time=form.start_time.data
-            )
-            show_date = show.start_time.date().isoformat()
-            show_time = show.start_time.time().strftime('%H:%M')
-            if is_artist_available(show.artist_id, show_date, show_time):
-                db.session.add(show)
+            artist_id, venue_id = parse_ids(form.artist_id.data, form.venue_id.data)
+            if is_artist_available(artist_id, form.start_time.data):
+                show = book_show(artist_id, venue_id, form.start_time.data, form.ends_at.data)
+                feed.refresh(Show.id == show.id)
                 db.session.commit()
+                page_cache.invalidate('shows')
                 flash('Show successfully listed!')
                 return redirect(url_for('index'))
             else:
                 flash('Artist is not available at that time.')
-        except Exception as e:
+        except BookingError as e:
             db.session.rollback()
-            print(e)
+            flash(str(e))
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Show could not be listed')
             flash('An error occurred. Show could not be listed.')
-        finally:
-            db.session.close()
     return render_template('forms/new_show.html', form=form)
 
-def is_artist_available(artist_id, date_str, time_str):
-    artist = Artist.query.get_or_404(artist_id)
-    return any(slot['date'] == date_str and slot['start_time'] == time_str for slot in artist.availability)
-
 # Artist Availability
 @app.route('/artists/<int:artist_id>/set_availability', methods=['GET', 'POST'])
 def set_availability(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = load(Artist, 'list').get_or_404(artist_id)
     form = AvailabilityForm(request.form, meta={'csrf': False})
     if request.method == 'POST' and form.validate():
         try:
-            availability = [{
-                'date': entry.date.data.strftime('%Y-%m-%d'),
-                'start_time': entry.start_time.data.strftime('%H:%M')
-            } for entry in form.entries]
-            artist.availability = availability
+            replace_slots(artist_id, [
+                datetime.combine(entry.date.data, entry.start_time.data) for entry in form.entries
+            ])
             db.session.commit()
+            matchmaking.refresh(Artist, artist_id)
+            page_cache.invalidate(f'artist:{artist_id}')
             flash('Availability updated!')
             return redirect(url_for('show_artist', artist_id=artist_id))
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print(e)
+            app.logger.exception('Availability of artist %s could not be updated', artist_id)
             flash('Error updating availability.')
-        finally:
-            db.session.close()
     return render_template('forms/set_availability.html', form=form, artist=artist)
 
+# Export
+@app.route('/export/<entity>')
+def export(entity):
+    fmt = request.args.get('format', 'csv')
+    if entity not in EXPORT_ENTITIES:
+        abort(404)
+    if fmt not in EXPORT_FORMATS:
+        abort(400, f'Unknown export format: {fmt}')
+    extension = 'csv' if fmt == 'csv' else 'jsonl'
+    return Response(stream_with_context(export_chunks(entity, fmt)), mimetype=mimetype(fmt), headers={
+        'Content-Disposition': f'attachment; filename={entity}.{extension}'
+    })
+
+# Images
+@app.route('/img/<kind>/<int:entity_id>/<size>')
+def image(kind, entity_id, size):
+    if kind not in IMAGE_KINDS or size not in IMAGE_SIZES:
+        abort(404)
+    model = IMAGE_KINDS[kind]
+    row = db.session.query(model.image_link).filter(model.id == entity_id).first()
+    if row is None:
+        abort(404)
+    if not row.image_link:
+        return redirect(assets.asset_url(DEFAULT_IMAGE))
+    try:
+        path, digest = thumbnails.thumbnail(row.image_link, size)
+    except FetchError:
+        app.logger.warning('Image of %s %s could not be rendered', kind, entity_id, exc_info=True)
+        return redirect(assets.asset_url(DEFAULT_IMAGE))
+
+    # image_url() versions the URL by source link, so a matching ?v= names one image forever
+    immutable = request.args.get('v') == link_version(row.image_link)
+    response = send_file(path, mimetype='image/jpeg', etag=digest, conditional=True,
+                         max_age=IMMUTABLE_MAX_AGE if immutable else 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = immutable
+    return response
+
+# Stats
+@app.route('/_stats/cache')
+def cache_stats():
+    if not app.config.get('EXPOSE_STATS'):
+        abort(404)
+    return jsonify(dict(page_cache.info(), images=thumbnails.store.info()))
+
+@app.route('/_stats/db')
+def db_stats():
+    if not app.config.get('EXPOSE_STATS'):
+        abort(404)
+    pools = {key or 'default': pool_metrics(engine) for key, engine in db.engines.items()}
+    if 'async_mode' in app.extensions:
+        pools['async'] = pool_metrics(app.extensions['async_mode'].engine.sync_engine)
+    return jsonify(pools=pools, leaked_sessions=session_lifecycle.leaked)
+
+# Async Mode
+async_mode.init_app(app)
+
 # Error Handlers
 @app.errorhandler(404)
 def not_found_error(error):
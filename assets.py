@@ -0,0 +1,244 @@
+"""
+Static asset bundles: fingerprinted, minified and precompressed by `flask assets build`
+
+The build concatenates each bundle's sources, writes it to static/dist under
+a content-hashed name with .gz (and .br, when brotli is installed) copies,
+and records the names in a manifest. Templates call asset_urls(bundle) and
+asset_url(filename); with a manifest they get the fingerprinted URLs,
+served with an immutable Cache-Control, and without one (or with
+ASSET_BUNDLES off) the plain /static sources.
+"""
+# Imports
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# The CSS and JS of templates/layouts/main.html, in page order
+BUNDLES = {
+    'css/site.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css', 'css/main.responsive.css',
+                     'css/main.quickfix.css'],
+    'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'js/site.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+# Fingerprinted on their own: loaded conditionally, or referenced outside the bundles
+FILES = ('js/libs/jquery-1.11.1.min.js', 'js/libs/respond-1.4.2.min.js', 'img/front-splash.jpg',
+         'img/default-venue.jpg')
+
+DIST = 'dist'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.map')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+SOURCE_MAP = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.MULTILINE)
+
+# Minification.
+
+
+def minify_css(css):
+    """ Strips comments and the whitespace around braces, semicolons and commas, outside strings
+
+    Deliberately conservative: whitespace around ':' is kept, since in a
+    selector it separates a descendant from a pseudo-class.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    parts = CSS_STRING.split(css)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        parts[index] = re.sub(r'\s*([{};,>])\s*', r'\1', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(js, filename):
+    """ Minifies unminified sources with rjsmin, when it is installed """
+    js = SOURCE_MAP.sub('', js)
+    if rjsmin is not None and not filename.endswith('.min.js'):
+        js = rjsmin.jsmin(js)
+    return js.strip()
+
+
+def rebase_urls(css, source, target):
+    """ Rewrites the relative url()s of a stylesheet moved from source to target, both static-relative """
+
+    def rebase(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', url, re.IGNORECASE):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        return f'url({quote}{posixpath.relpath(resolved, posixpath.dirname(target))}{suffix}{quote})'
+
+    return CSS_URL.sub(rebase, css)
+
+# Build.
+
+
+def fingerprinted(name, content):
+    """ Returns name with the first 12 hex digits of content's SHA-256 before the extension """
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def bundle(static_folder, name, sources, output):
+    """ Returns the minified concatenation of sources as it would be written to output """
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if name.endswith('.css'):
+            parts.append(minify_css(rebase_urls(text, source, output)))
+        else:
+            parts.append(minify_js(text, source))
+    # A source without a trailing semicolon must not run into the next
+    return ('\n' if name.endswith('.css') else ';\n').join(parts).encode()
+
+
+def compressed(content):
+    """ Yields (suffix, bytes) for each precompressed variant of content """
+    yield '.gz', gzip.compress(content, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', brotli.compress(content, quality=11)
+
+
+def write(output_dir, path, content):
+    path = os.path.join(output_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def build(static_folder, output_dir):
+    """ Writes the bundles and files to output_dir and returns the manifest {name: fingerprinted path}
+
+    Earlier builds' files are removed, so output_dir only holds what the
+    manifest names.
+    """
+    dist = os.path.relpath(output_dir, static_folder).replace(os.sep, '/')
+    manifest = {}
+    for name, sources in list(BUNDLES.items()) + [(name, None) for name in FILES]:
+        if sources is None:
+            with open(os.path.join(static_folder, name), 'rb') as f:
+                content = f.read()
+        else:
+            # Fingerprinting keeps the directory, so url()s rebase against the name
+            content = bundle(static_folder, name, sources, posixpath.join(dist, name))
+        path = fingerprinted(name, content)
+        write(output_dir, path, content)
+        if name.endswith(COMPRESSIBLE):
+            for suffix, variant in compressed(content):
+                write(output_dir, path + suffix, variant)
+        manifest[name] = path
+
+    kept = {os.path.normpath(os.path.join(output_dir, path + suffix))
+            for path in manifest.values() for suffix in ('', '.gz', '.br')}
+    for root, _, files in os.walk(output_dir):
+        for filename in files:
+            path = os.path.normpath(os.path.join(root, filename))
+            if path not in kept and filename != 'manifest.json':
+                os.remove(path)
+    write(output_dir, 'manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+# Serving.
+
+
+def preferred_encoding(path):
+    """ Returns (encoding, suffix) of the best precompressed copy of path the client accepts, or (None, '') """
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(path + suffix):
+            return encoding, suffix
+    return None, ''
+
+
+class Assets:
+    """ Resolves bundle and file names to fingerprinted URLs, and serves them """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.output_dir = os.path.join(app.static_folder, DIST)
+        self.manifest = read_manifest(self.output_dir) if app.config.get('ASSET_BUNDLES', not app.debug) else {}
+        app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'assets', self.send)
+        app.add_template_global(self.asset_url, 'asset_url')
+        app.add_template_global(self.asset_urls, 'asset_urls')
+        app.extensions['assets'] = self
+
+    def asset_url(self, filename):
+        """ Returns the URL of a static file or bundle, like url_for('static', filename=...) """
+        if filename in self.manifest:
+            return url_for('assets', filename=self.manifest[filename])
+        return url_for('static', filename=filename)
+
+    def asset_urls(self, name):
+        """ Returns the URLs to load a bundle: the built file, or its sources when it is not built """
+        if name in self.manifest:
+            return [url_for('assets', filename=self.manifest[name])]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def send(self, filename):
+        """ Serves a fingerprinted file, precompressed when the client accepts it, cached for a year """
+        if filename not in self.manifest.values():
+            abort(404)
+        encoding, suffix = preferred_encoding(os.path.join(self.output_dir, filename))
+        response = send_from_directory(self.output_dir, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        if encoding:
+            response.content_encoding = encoding
+        if filename.endswith(COMPRESSIBLE):
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+# Commands.
+
+
+assets_command = AppGroup('assets', help='Build the static asset bundles.')
+
+
+@assets_command.command('build')
+def build_command():
+    """ Bundles, fingerprints and precompresses the static assets """
+    app = current_app
+    output_dir = app.extensions['assets'].output_dir
+    manifest = app.extensions['assets'].manifest = build(app.static_folder, output_dir)
+    for name, path in sorted(manifest.items()):
+        sizes = [f'{os.path.getsize(os.path.join(output_dir, path + suffix))} {label}'
+                 for suffix, label in (('', 'bytes'), ('.gz', 'gzip'), ('.br', 'brotli'))
+                 if os.path.exists(os.path.join(output_dir, path + suffix))]
+        click.echo(f'{name} -> {path} ({", ".join(sizes)})')
+    if brotli is None:
+        click.echo('brotli is not installed; wrote gzip copies only.')
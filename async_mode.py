@@ -0,0 +1,150 @@
+"""
+Optional async read path: catalog pages query PostgreSQL through asyncpg
+"""
+# Imports
+
+import asyncio
+import threading
+from datetime import datetime
+
+from flask import abort, current_app, render_template
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from availability import upcoming_slots_query
+from cache import cached
+from conditional import conditional
+from instrumentation import current_metrics, request_metrics
+from models import Artist, Venue, Show
+from pagination import past_shows_page
+from pool_metrics import InstrumentedAsyncPool
+from queries import (LOADER_PROFILES, artist_version, past_shows_count_query, show_listing_query, show_listing_result,
+                     venue_version)
+from serializers import ARTIST_DETAIL, VENUE_DETAIL
+
+# Reader.
+
+
+class AsyncReader:
+    """ An async engine driven by one event loop in a background thread
+
+    Views stay synchronous, so the page cache, conditional GETs, templates and
+    request context work unchanged; each view hands its statements to the loop
+    in one call and they run concurrently, each on its own pooled connection.
+    """
+
+    def __init__(self, uri, **engine_options):
+        self.engine = create_async_engine(uri, poolclass=InstrumentedAsyncPool, **engine_options)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-reader', daemon=True)
+        self.thread.start()
+
+    async def fetch(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    async def fetch_all(self, statements, metrics=None):
+        # The statements' tasks inherit this, so the SQL events count them in metrics
+        request_metrics.set(metrics)
+        return await asyncio.gather(*(self.fetch(statement) for statement in statements))
+
+    def gather(self, *statements):
+        """ Runs the statements concurrently and returns their rows, in order
+
+        They are counted in the calling request's metrics, though they run on
+        the loop's thread.
+        """
+        return asyncio.run_coroutine_threadsafe(self.fetch_all(statements, current_metrics()), self.loop).result()
+
+
+def reader():
+    return current_app.extensions['async_mode']
+
+
+def async_uri(uri):
+    """ Returns a postgresql:// URI rewritten for the asyncpg driver """
+    scheme, rest = uri.split('://', 1)
+    return f"{scheme.split('+')[0]}+asyncpg://{rest}"
+
+# Views.
+# Same endpoints, decorators and templates as the sync views in app.py.
+
+
+@cached('artists', 'venues')
+def index():
+    def recent(model):
+        columns = (getattr(model, name) for name in LOADER_PROFILES['list'])
+        return select(*columns).order_by(model.created_at.desc()).limit(10)
+
+    recent_artists, recent_venues = reader().gather(recent(Artist), recent(Venue))
+    return render_template('pages/home.html', recent_artists=recent_artists, recent_venues=recent_venues)
+
+
+@conditional(artist_version)
+@cached('artist:{artist_id}', 'shows', 'venues')
+def show_artist(artist_id):
+    now = datetime.now()
+    past_page = past_shows_page()
+    artist, shows, slots = reader().gather(
+        select(*ARTIST_DETAIL.columns).filter(Artist.id == artist_id),
+        show_listing_query(Show.artist_id, artist_id, Venue, Show.venue_id, now, **past_page).statement,
+        upcoming_slots_query(artist_id, now).statement
+    )
+    if not artist:
+        abort(404)
+
+    artist_data = ARTIST_DETAIL.dump(artist[0])
+    artist_data.update(show_listing_result(shows, 'venue'))
+    if not artist_data['past_shows'] and past_page['past_offset']:
+        counts, = reader().gather(past_shows_count_query(Show.artist_id, artist_id, now).statement)
+        artist_data['past_shows_count'] = counts[0][0]
+
+    availability = [slot.starts_at.strftime('%Y-%m-%d, %H:%M') for slot in slots]
+
+    return render_template('pages/show_artist.html', artist=artist_data, availability_data=availability, past_page=past_page)
+
+
+@conditional(venue_version)
+@cached('venue:{venue_id}', 'shows', 'artists')
+def show_venue(venue_id):
+    now = datetime.now()
+    past_page = past_shows_page()
+    venue, shows = reader().gather(
+        select(*VENUE_DETAIL.columns).filter(Venue.id == venue_id),
+        show_listing_query(Show.venue_id, venue_id, Artist, Show.artist_id, now, **past_page).statement
+    )
+    if not venue:
+        abort(404)
+
+    venue_data = VENUE_DETAIL.dump(venue[0])
+    venue_data.update(show_listing_result(shows, 'artist'))
+    if not venue_data['past_shows'] and past_page['past_offset']:
+        counts, = reader().gather(past_shows_count_query(Show.venue_id, venue_id, now).statement)
+        venue_data['past_shows_count'] = counts[0][0]
+
+    return render_template('pages/show_venue.html', venue=venue_data, past_page=past_page)
+
+
+VIEWS = {'index': index, 'show_artist': show_artist, 'show_venue': show_venue}
+
+
+def init_app(app):
+    """ With ASYNC_MODE on, serves the VIEWS endpoints through an AsyncReader """
+    if not app.config.get('ASYNC_MODE'):
+        return
+    uri = app.config.get('ASYNC_DATABASE_URI') or async_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    # Same pool limits and statement timeouts as the sync engine, with asyncpg's spelling
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    app.extensions['async_mode'] = AsyncReader(
+        uri,
+        pool_size=app.config.get('ASYNC_POOL_SIZE', 20),
+        max_overflow=app.config.get('ASYNC_MAX_OVERFLOW', 10),
+        pool_timeout=options.get('pool_timeout', 30),
+        pool_recycle=options.get('pool_recycle', -1),
+        pool_pre_ping=options.get('pool_pre_ping', False),
+        connect_args={'server_settings': {
+            'statement_timeout': str(app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)),
+            'idle_in_transaction_session_timeout': str(app.config.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 0)),
+        }}
+    )
+    app.view_functions.update(VIEWS)
@@ -0,0 +1,97 @@
+"""
+Artist availability slots
+"""
+# Imports
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Artist, ArtistAvailability
+
+# Queries.
+
+
+def slot_length():
+    return timedelta(minutes=current_app.config.get('AVAILABILITY_SLOT_MINUTES', 60))
+
+
+def is_artist_available(artist_id, at):
+    """ Returns True if one of the artist's slots covers the datetime at """
+    return db.session.query(
+        db.session.query(ArtistAvailability.id).filter(
+            ArtistAvailability.artist_id == artist_id,
+            ArtistAvailability.starts_at > at - slot_length(),
+            ArtistAvailability.starts_at <= at,
+            ArtistAvailability.ends_at > at
+        ).exists()
+    ).scalar()
+
+
+def available_artists(starts_at, ends_at):
+    """ Returns the ids of the artists whose slots, alone or back to back, cover the whole window
+
+    Only the slots overlapping the window are read. Slots last
+    AVAILABILITY_SLOT_MINUTES, so those start less than that before the
+    window, which bounds the starts_at index range on both sides. An artist
+    qualifies when their first slot starts by the window start, the last
+    ends by the window end, and none starts after the ones before it ended.
+    """
+    slot = ArtistAvailability
+    reached = func.max(slot.ends_at).over(partition_by=slot.artist_id, order_by=slot.starts_at, rows=(None, -1))
+    slots = db.session.query(slot.artist_id, slot.starts_at, slot.ends_at, reached.label('reached')).filter(
+        slot.starts_at > starts_at - slot_length(),
+        slot.starts_at < ends_at,
+        slot.ends_at > starts_at
+    ).subquery()
+    return [artist_id for artist_id, in db.session.query(slots.c.artist_id).group_by(slots.c.artist_id).having(
+        func.min(slots.c.starts_at) <= starts_at,
+        func.max(slots.c.ends_at) >= ends_at,
+        func.bool_and(or_(slots.c.reached.is_(None), slots.c.starts_at <= slots.c.reached))
+    ).order_by(slots.c.artist_id)]
+
+
+def upcoming_slots_query(artist_id, now):
+    """ Returns the query of the artist's slots that start after now, soonest first """
+    return ArtistAvailability.query.filter(
+        ArtistAvailability.artist_id == artist_id,
+        ArtistAvailability.starts_at > now
+    ).order_by(ArtistAvailability.starts_at)
+
+
+def upcoming_slots(artist_id, now=None):
+    """ Returns the artist's slots that start after now, soonest first """
+    return upcoming_slots_query(artist_id, now or datetime.now()).all()
+
+# Writes.
+
+
+def replace_slots(artist_id, starts):
+    """ Makes the slots starting at starts the artist's only availability
+
+    Existing slots are kept or updated in place with one bulk upsert, and the
+    ones no longer listed are deleted. The caller commits.
+    """
+    duration = slot_length()
+    starts = sorted(set(starts))
+
+    stale = ArtistAvailability.query.filter(ArtistAvailability.artist_id == artist_id)
+    if starts:
+        stale = stale.filter(ArtistAvailability.starts_at.notin_(starts))
+    stale.delete(synchronize_session=False)
+
+    if starts:
+        statement = insert(ArtistAvailability).values([{
+            'artist_id': artist_id,
+            'starts_at': starts_at,
+            'ends_at': starts_at + duration
+        } for starts_at in starts])
+        db.session.execute(statement.on_conflict_do_update(
+            constraint='uq_artist_availability_artist_id_starts_at',
+            set_={'ends_at': statement.excluded.ends_at}
+        ))
+
+    # The artist page lists the slots, so they count as a change to the artist
+    db.session.execute(db.update(Artist).where(Artist.id == artist_id).values(updated_at=db.func.now()))
@@ -0,0 +1,8 @@
+"""
+Benchmarks and load tests
+
+    python -m benchmarks.datagen --size small      # fill DATABASE_URL with synthetic data
+    BENCH_DATABASE_URL=... python -m pytest benchmarks
+    python -m benchmarks.explain --threshold 1000  # fail on seq scans in the routes' queries
+    locust -f benchmarks/locustfile.py --host http://localhost:5010
+"""
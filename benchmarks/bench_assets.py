@@ -0,0 +1,62 @@
+"""
+Page weight of the home page's CSS and JS, as separate sources and as built bundles
+
+The bundles are built into a temporary directory for the module. Each
+benchmark records the asset requests and the bytes they transfer for a
+client that accepts gzip and brotli.
+"""
+# Imports
+
+import re
+
+import pytest
+
+ACCEPT = {'Accept-Encoding': 'gzip, br'}
+
+
+@pytest.fixture(scope='module')
+def built(app, tmp_path_factory):
+    import assets
+
+    extension = app.extensions['assets']
+    output_dir, manifest = extension.output_dir, extension.manifest
+    extension.output_dir = str(tmp_path_factory.mktemp('dist'))
+    extension.manifest = assets.build(app.static_folder, extension.output_dir)
+    yield extension.manifest
+    extension.output_dir, extension.manifest = output_dir, manifest
+
+
+def page_assets(client, path='/'):
+    """ Returns the local CSS and JS URLs a page references """
+    body = client.get(path).get_data(as_text=True)
+    return re.findall(r'(?:href|src)="(/static/[^"]+\.(?:css|js))"', body)
+
+
+def load_assets(client, urls):
+    """ Requests urls and returns the bytes transferred """
+    total = 0
+    for url in urls:
+        response = client.get(url, headers=ACCEPT)
+        assert response.status_code == 200, url
+        total += len(response.get_data())
+    return total
+
+
+@pytest.mark.benchmark(group='page_assets')
+def bench_source_assets(benchmark, app, client):
+    extension = app.extensions['assets']
+    manifest, extension.manifest = extension.manifest, {}
+    try:
+        urls = page_assets(client)
+        benchmark.extra_info['requests'] = len(urls)
+        benchmark.extra_info['bytes'] = benchmark(load_assets, client, urls)
+    finally:
+        extension.manifest = manifest
+
+
+@pytest.mark.benchmark(group='page_assets')
+def bench_bundled_assets(benchmark, client, built):
+    urls = page_assets(client)
+    assert all(url.startswith('/static/dist/') for url in urls)
+    benchmark.extra_info['requests'] = len(urls)
+    benchmark.extra_info['bytes'] = benchmark(load_assets, client, urls)
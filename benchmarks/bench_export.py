@@ -0,0 +1,84 @@
+"""
+Streaming export of a large shows table: time, and memory that stays flat
+
+BENCH_EXPORT_ROWS (default 1,000,000) shows are added for the module and
+removed afterwards. Memory is measured as the peak RSS of a subprocess that
+only exports, against one that only starts the app, so it covers libpq's
+result buffers and nothing else the test process did.
+"""
+# Imports
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import datagen
+from benchmarks.conftest import ROOT
+
+ROWS = int(os.environ.get('BENCH_EXPORT_ROWS', 1000000))
+
+# Streaming holds one batch at a time, whatever the size of the table
+RSS_GROWTH_LIMIT = 64 * 1024 * 1024
+
+# Run in a subprocess: starts the app, exports shows in the format given (if
+# any) and prints the process's peak RSS in KiB
+EXPORT_SCRIPT = """
+import resource, sys
+from app import app
+from exporter import export_chunks
+from models import db
+with app.app_context():
+    db.session.execute(db.text('SELECT 1'))
+    written = sum(len(chunk) for chunk in export_chunks('shows', sys.argv[1])) if len(sys.argv) > 1 else 0
+print(written, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+@pytest.fixture(scope='module')
+def shows(app):
+    from models import db, Artist, Venue, Show
+
+    with app.app_context():
+        artist_ids, venue_ids = datagen.generate(artists=1000, venues=1000, shows=ROWS, slots=0, seed=1)
+        db.session.commit()
+    yield ROWS
+    with app.app_context():
+        Show.query.filter(Show.artist_id.in_(artist_ids)).delete()
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        Venue.query.filter(Venue.id.in_(venue_ids)).delete()
+        db.session.commit()
+
+
+def drain(app, fmt):
+    """ Exports every show and returns the number of characters written """
+    from exporter import export_chunks
+
+    with app.app_context():
+        return sum(len(chunk) for chunk in export_chunks('shows', fmt))
+
+
+@pytest.mark.benchmark(group='export')
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl', 'columns'])
+def bench_export(benchmark, app, shows, fmt):
+    benchmark.pedantic(drain, args=(app, fmt), rounds=3)
+    benchmark.extra_info['rows'] = shows
+
+
+def export_rss(*fmt):
+    """ Returns (characters written, peak RSS in bytes) of a subprocess running EXPORT_SCRIPT """
+    result = subprocess.run([sys.executable, '-c', EXPORT_SCRIPT, *fmt], cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    written, rss = result.stdout.split()[-2:]
+    return int(written), int(rss) * 1024
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def bench_export_memory(app, shows, fmt):
+    _, baseline = export_rss()
+    written, peak = export_rss(fmt)
+    print(f'\n{fmt}: {written} chars, peak RSS {peak / 2 ** 20:.0f} MiB, '
+          f'{baseline / 2 ** 20:.0f} MiB without exporting')
+    assert written > shows
+    assert peak - baseline < RSS_GROWTH_LIMIT
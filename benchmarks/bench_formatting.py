@@ -0,0 +1,37 @@
+"""
+The datetime filter: per-call dateutil and babel parsing against formatting.py
+"""
+# Imports
+
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+import pytest
+
+from formatting import format_datetime
+
+SHOW_TIMES = [datetime(2026, 1, 1, 20) + timedelta(hours=3 * index) for index in range(10000)]
+
+
+def legacy_format_datetime(value, format='medium'):
+    """ The filter as it was: parse the ISO string back, then let babel parse the pattern """
+    date = dateutil.parser.parse(value) if isinstance(value, str) else value
+    format_str = {
+        'full': "EEEE MMMM d, y 'at' h:mma",
+        'medium': "EE MM dd, y h:mma"
+    }.get(format, format)
+    return babel.dates.format_datetime(date, format_str)
+
+
+@pytest.mark.benchmark(group='format_datetime')
+def bench_legacy_filter(benchmark):
+    times = [time.isoformat() for time in SHOW_TIMES]
+    benchmark(lambda: [legacy_format_datetime(time, 'full') for time in times])
+
+
+@pytest.mark.benchmark(group='format_datetime')
+def bench_cached_formatter(benchmark):
+    assert [format_datetime(time, 'full') for time in SHOW_TIMES[:100]] == \
+        [legacy_format_datetime(time, 'full') for time in SHOW_TIMES[:100]]
+    benchmark(lambda: [format_datetime(time, 'full') for time in SHOW_TIMES])
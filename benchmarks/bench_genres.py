@@ -0,0 +1,84 @@
+"""
+Genre filters and facets over a large catalog
+
+BENCH_GENRE_ROWS (default 1,000,000) artists are added for the module and
+removed afterwards. The filter benchmarks record their plan's scan nodes, to
+show whether the GIN index on genres served them. The listing benchmarks run
+uncached by default, so they include the facet query the cache normally
+absorbs; BENCH_CACHE=lru measures cached pages instead.
+"""
+# Imports
+
+import os
+
+import pytest
+
+from benchmarks import datagen
+from benchmarks.conftest import sql_count
+
+ROWS = int(os.environ.get('BENCH_GENRE_ROWS', 1000000))
+
+FILTERS = [
+    ('any_one', ['Jazz'], 'any'),
+    ('any_three', ['Jazz', 'Blues', 'Soul'], 'any'),
+    ('all_two', ['Jazz', 'Blues'], 'all'),
+    ('all_three', ['Jazz', 'Blues', 'Soul'], 'all'),
+]
+
+
+@pytest.fixture(scope='module')
+def catalog(app):
+    from models import db, Artist
+
+    with app.app_context():
+        artist_ids, _ = datagen.generate(artists=ROWS, venues=0, shows=0, slots=0, seed=3)
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM ANALYZE artists')
+    yield ROWS
+    with app.app_context():
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        db.session.commit()
+
+
+def scan_nodes(request):
+    """ Returns the scan node types and indexes of the plans of the queries request() runs """
+    from benchmarks.explain import captured_selects, explain, plan_nodes
+    from models import db
+
+    return [' '.join(filter(None, (node['Node Type'], node.get('Index Name'))))
+            for statement, parameters in captured_selects(db.engine, request)
+            for node in plan_nodes(explain(db.engine, statement, parameters)['Plan'])
+            if 'Scan' in node['Node Type']]
+
+
+@pytest.mark.benchmark(group='genre_filter')
+@pytest.mark.parametrize('name, genres, match', FILTERS, ids=[name for name, _, _ in FILTERS])
+def bench_genre_filter(benchmark, app, catalog, name, genres, match):
+    from genres import genre_filter
+    from models import db, Artist
+
+    with app.app_context():
+        query = db.session.query(db.func.count(Artist.id)).filter(genre_filter(Artist, genres, match))
+        benchmark.extra_info['rows'] = benchmark(query.scalar)
+        benchmark.extra_info['plan'] = scan_nodes(query.scalar)
+
+
+@pytest.mark.benchmark(group='genre_facets')
+@pytest.mark.parametrize('area', [(None, None), ('Austin', 'TX')], ids=['everywhere', 'area'])
+def bench_facet_counts(benchmark, app, catalog, area):
+    from genres import area_criteria, facet_counts
+    from models import Artist
+
+    with app.app_context():
+        counts = benchmark(facet_counts, Artist, *area_criteria(Artist, *area))
+        benchmark.extra_info['genres'] = len(counts)
+
+
+@pytest.mark.benchmark(group='genre_listing')
+@pytest.mark.parametrize('name, genres, match', FILTERS, ids=[name for name, _, _ in FILTERS])
+def bench_filtered_listing(benchmark, client, catalog, name, genres, match):
+    url = '/artists?' + '&'.join(f'genre={genre}' for genre in genres) + f'&match={match}'
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+    benchmark.extra_info['sql_count'] = sql_count(response)
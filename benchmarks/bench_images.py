@@ -0,0 +1,67 @@
+"""
+The image proxy: a cold render (fetch, decode, resize, store) against a cache hit
+
+Sources are generated JPEGs read through images.FileFetcher, so the cold
+numbers measure rendering rather than the network. Each benchmark records
+the source and served sizes in bytes.
+"""
+# Imports
+
+import os
+
+import pytest
+
+SOURCE_SIZE = (2400, 1600)
+
+
+@pytest.fixture(scope='module')
+def proxy(app, tmp_path_factory):
+    """ The app's thumbnails with a scratch store, a file fetcher and one photo-like source """
+    from PIL import Image
+
+    import images
+
+    root = tmp_path_factory.mktemp('sources')
+    photo = Image.effect_mandelbrot(SOURCE_SIZE, (-2.0, -1.0, 1.0, 1.0), 100).convert('RGB')
+    photo.save(root / 'photo.jpg', quality=92)
+    thumbnails = app.extensions['thumbnails']
+    store, fetcher = thumbnails.store, thumbnails.fetcher
+    thumbnails.store = images.ImageStore(str(tmp_path_factory.mktemp('store')))
+    thumbnails.fetcher = images.FileFetcher(str(root))
+    yield thumbnails, os.path.getsize(root / 'photo.jpg')
+    thumbnails.store, thumbnails.fetcher = store, fetcher
+
+
+@pytest.mark.benchmark(group='image_proxy')
+@pytest.mark.parametrize('size', ['sm', 'md', 'lg'])
+def bench_cold_render(benchmark, app, proxy, size):
+    thumbnails, source_bytes = proxy
+    renders = iter(range(1000000))
+
+    def render():
+        # A new link per round, so every call misses the store
+        return thumbnails.thumbnail(f'http://images.example/photo.jpg?{next(renders)}', size)
+
+    path, _ = benchmark(render)
+    benchmark.extra_info.update(source_bytes=source_bytes, served_bytes=os.path.getsize(path))
+
+
+@pytest.mark.benchmark(group='image_proxy')
+def bench_cached_image(benchmark, client, ids, proxy):
+    from models import db, Artist
+
+    app = client.application
+    with app.app_context():
+        artist = db.session.get(Artist, ids['artist_id'])
+        link, artist.image_link = artist.image_link, 'http://images.example/photo.jpg'
+        db.session.commit()
+    try:
+        response = client.get(f"/img/artist/{ids['artist_id']}/md")
+        assert response.status_code == 200
+        response = benchmark(client.get, f"/img/artist/{ids['artist_id']}/md")
+        assert response.status_code == 200
+        benchmark.extra_info.update(source_bytes=proxy[1], served_bytes=len(response.get_data()))
+    finally:
+        with app.app_context():
+            db.session.get(Artist, ids['artist_id']).image_link = link
+            db.session.commit()
@@ -0,0 +1,98 @@
+"""
+Matchmaking over a large catalog: the inverted index against scoring every seeking row
+
+BENCH_MATCH_ARTISTS (default 100,000) artists and BENCH_MATCH_VENUES
+(default 10,000) venues are added for the module and removed afterwards.
+The brute-force baseline loads the seeking counterparts and scores each one
+with the same weights; each benchmark records the rows it scored.
+"""
+# Imports
+
+import heapq
+import os
+
+import pytest
+
+from benchmarks import datagen
+
+ARTISTS = int(os.environ.get('BENCH_MATCH_ARTISTS', 100000))
+VENUES = int(os.environ.get('BENCH_MATCH_VENUES', 10000))
+LIMIT = 20
+
+
+@pytest.fixture(scope='module')
+def catalog(app):
+    from models import db, Artist, Venue
+
+    with app.app_context():
+        artist_ids, venue_ids = datagen.generate(artists=ARTISTS, venues=VENUES, shows=0, slots=2, seed=5)
+        db.session.commit()
+    yield artist_ids, venue_ids
+    with app.app_context():
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        Venue.query.filter(Venue.id.in_(venue_ids)).delete()
+        db.session.commit()
+
+
+def brute_force(model, id, limit=LIMIT):
+    """ Scores every seeking counterpart of the model row id and returns the best limit ids """
+    import matchmaking
+    from geo import place_key
+    from models import Artist, Venue
+
+    subject = matchmaking.listing_rows(model, model.id == id)[0]
+    counterpart = Venue if model is Artist else Artist
+    rows = matchmaking.listing_rows(counterpart, matchmaking.seeking(counterpart).is_(True))
+    slots = matchmaking.slot_counts() if counterpart is Artist else {}
+    genres = set(subject.genres or ())
+    city, state = place_key(subject.city, subject.state)
+    scored = []
+    for row in rows:
+        score = matchmaking.GENRE_WEIGHT * len(genres.intersection(row.genres or ())) / len(genres) if genres else 0.0
+        row_city, row_state = place_key(row.city, row.state)
+        if row_state == state:
+            score += matchmaking.STATE_WEIGHT
+            if row_city == city:
+                score += matchmaking.CITY_WEIGHT
+        if score and counterpart is Artist:
+            cap = matchmaking.AVAILABILITY_CAP
+            score += matchmaking.AVAILABILITY_WEIGHT * min(slots.get(row.id, 0), cap) / cap
+        if score:
+            scored.append((score, -row.id))
+    return [-id for _, id in heapq.nlargest(limit, scored)], len(rows)
+
+
+@pytest.mark.benchmark(group='match_index')
+def bench_index_build(benchmark, app, catalog):
+    import matchmaking
+
+    def build():
+        matchmaking.invalidate()
+        return matchmaking.get_index()
+
+    with app.app_context():
+        index = benchmark(build)
+    benchmark.extra_info.update({model.__tablename__: len(postings.rows) for model, postings in index.postings.items()})
+
+
+@pytest.mark.benchmark(group='matches')
+@pytest.mark.parametrize('kind', ['artist', 'venue'])
+@pytest.mark.parametrize('method', ['index', 'brute_force'])
+def bench_matches(benchmark, app, catalog, kind, method):
+    import matchmaking
+    from models import Artist, Venue
+
+    model, ids = (Artist, catalog[0]) if kind == 'artist' else (Venue, catalog[1])
+    id = ids[len(ids) // 2]
+    with app.app_context():
+        index = matchmaking.get_index()
+        expected, seeking = brute_force(model, id)
+        if method == 'index':
+            _, found = benchmark(matchmaking.matches, model, id, LIMIT)
+            assert [match['id'] for match in found] == expected
+            counterpart = Venue if model is Artist else Artist
+            subject = matchmaking.listing_rows(model, model.id == id)[0]
+            benchmark.extra_info['scored'] = len(index.scores(subject, counterpart))
+        else:
+            benchmark(brute_force, model, id)
+            benchmark.extra_info['scored'] = seeking
@@ -0,0 +1,99 @@
+"""
+Microbenchmarks of each route through Flask's test client
+
+Each records latency percentiles, SQL statements per request and peak Python
+memory in the benchmark's extra_info (see --benchmark-json).
+"""
+# Imports
+
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+
+from benchmarks.conftest import percentiles, sql_count, traced_peak
+
+ROUTES = [
+    ('home', 'GET', '/', None),
+    ('artists', 'GET', '/artists', None),
+    ('artists_by_genre', 'GET', '/artists?genre=Jazz&genre=Blues&match=all', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues_near', 'GET', '/venues/near?city=Austin&state=TX&radius=50', None),
+    ('shows', 'GET', '/shows', None),
+    ('show_artist', 'GET', '/artists/{artist_id}', None),
+    ('show_venue', 'GET', '/venues/{venue_id}', None),
+    ('search', 'GET', '/search', None),
+    ('search_area', 'POST', '/search', {'city': 'Austin', 'state': 'TX'}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': 'the'}),
+    ('search_venues', 'POST', '/venues/search', {'search_term': 'river'}),
+    ('create_show_form', 'GET', '/shows/create', None),
+    ('api_artists', 'GET', '/api/v1/artists', None),
+    ('api_venues', 'GET', '/api/v1/venues', None),
+    ('api_venues_near', 'GET', '/api/v1/venues/near?lat=40.71&lon=-74.01&radius=25', None),
+    ('api_shows', 'GET', '/api/v1/shows', None),
+    ('api_artist', 'GET', '/api/v1/artists/{artist_id}', None),
+    ('api_venue', 'GET', '/api/v1/venues/{venue_id}', None),
+    ('api_search_artists', 'GET', '/api/v1/artists/search?q=the', None),
+]
+
+
+def measure(benchmark, request, status=200):
+    """ Benchmarks request(), then records SQL count and peak memory of one more call """
+    response = benchmark(request)
+    assert response.status_code == status, response.status_code
+    response, peak = traced_peak(request)
+    if benchmark.enabled:
+        benchmark.extra_info.update(percentiles(benchmark, 50, 95, 99))
+    benchmark.extra_info['sql_count'] = sql_count(response)
+    benchmark.extra_info['peak_memory_kb'] = round(peak / 1024, 1)
+
+
+@pytest.mark.benchmark(group='routes')
+@pytest.mark.parametrize('name, method, path, data', ROUTES, ids=[route[0] for route in ROUTES])
+def bench_route(benchmark, client, ids, name, method, path, data):
+    url = path.format(**ids)
+    measure(benchmark, lambda: client.open(url, method=method, data=data))
+
+
+@pytest.fixture
+def bookable(app):
+    """ An artist and venue of their own, available every three hours from a year on """
+    from models import db, Artist, ArtistAvailability, Venue, Show
+
+    starts = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=365)
+    with app.app_context():
+        artist = Artist(name='Benchmark Artist', city='Austin', state='TX', phone='512-555-0000', genres=['Jazz'])
+        venue = Venue(name='Benchmark Venue', city='Austin', state='TX', address='1 Main St',
+                      phone='512-555-0001', genres=['Jazz'])
+        db.session.add_all([artist, venue])
+        db.session.flush()
+        db.session.bulk_insert_mappings(ArtistAvailability, [{
+            'artist_id': artist.id,
+            'starts_at': starts + timedelta(hours=3 * slot),
+            'ends_at': starts + timedelta(hours=3 * slot + 1),
+        } for slot in range(20000)])
+        db.session.commit()
+        artist_id, venue_id = artist.id, venue.id
+    yield artist_id, venue_id, starts
+    with app.app_context():
+        Show.query.filter(Show.artist_id == artist_id).delete()
+        Artist.query.filter(Artist.id == artist_id).delete()
+        Venue.query.filter(Venue.id == venue_id).delete()
+        db.session.commit()
+
+
+@pytest.mark.benchmark(group='routes')
+def bench_create_show(benchmark, client, bookable):
+    artist_id, venue_id, starts = bookable
+    slots = count()
+
+    def create():
+        starts_at = starts + timedelta(hours=3 * next(slots))
+        return client.post('/shows/create', data={
+            'artist_id': artist_id,
+            'venue_id': venue_id,
+            'start_time': starts_at.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+    # A booked show redirects home; a refused one re-renders the form
+    measure(benchmark, create, status=302)
@@ -0,0 +1,79 @@
+"""
+Artist search at growing catalog sizes: pg_trgm, ranked ILIKE, the in-process n-gram index and the legacy ILIKE scan
+
+For each of BENCH_SEARCH_ROWS (default 10,000, 100,000 and 1,000,000)
+artists are added for the module and removed afterwards. The trigram
+benchmarks skip when pg_trgm is not installed. Each benchmark records the
+matches; the n-gram ones also record the seconds the index took to build.
+"""
+# Imports
+
+import os
+import time
+
+import pytest
+
+from benchmarks import datagen
+
+SIZES = [int(rows) for rows in os.environ.get('BENCH_SEARCH_ROWS', '10000,100000,1000000').split(',')]
+
+# datagen names are two of 20 words and a number: one word matches about a
+# tenth of the rows, two in order about a four hundredth
+TERMS = [('common', 'river'), ('rare', 'lantern owl')]
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=[f'{rows}_rows' for rows in SIZES])
+def catalog(app, request):
+    import search_index
+    from models import db, Artist
+
+    with app.app_context():
+        artist_ids, _ = datagen.generate(artists=request.param, venues=0, shows=0, slots=0, seed=11)
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM ANALYZE artists')
+    yield request.param
+    with app.app_context():
+        datagen.delete_rows(Artist, artist_ids)
+        db.session.commit()
+        search_index.invalidate(Artist)
+
+
+@pytest.fixture
+def backend(app):
+    """ Restores SEARCH_BACKEND after a benchmark sets it; meanwhile the n-gram index is never stale """
+    configured = app.config['SEARCH_BACKEND'], app.config['SEARCH_INDEX_TTL']
+    app.config['SEARCH_INDEX_TTL'] = 24 * 3600
+    yield
+    app.config['SEARCH_BACKEND'], app.config['SEARCH_INDEX_TTL'] = configured
+
+
+def legacy_search(term):
+    """ The search as it was: every name containing term, unranked and unpaged """
+    from models import db, Artist
+
+    rows = db.session.query(Artist.id, Artist.name).filter(Artist.name.ilike(f'%{term}%')).all()
+    return len(rows), rows
+
+
+@pytest.mark.benchmark(group='search')
+@pytest.mark.parametrize('method', ['trigram', 'ilike', 'ngram', 'legacy'])
+@pytest.mark.parametrize('name, term', TERMS, ids=[name for name, _ in TERMS])
+def bench_search(benchmark, app, catalog, backend, method, name, term):
+    import search_index
+    from models import db, Artist
+
+    with app.app_context():
+        if method == 'legacy':
+            count, _ = benchmark(legacy_search, term)
+        else:
+            if method == 'trigram' and not db.session.execute(db.text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar():
+                pytest.skip('pg_trgm is not installed')
+            app.config['SEARCH_BACKEND'] = method
+            if method == 'ngram':
+                started = time.perf_counter()
+                search_index.build(Artist)
+                benchmark.extra_info['index_build_s'] = round(time.perf_counter() - started, 3)
+            count, _ = benchmark(search_index.ranked, Artist, term)
+    benchmark.extra_info['matches'] = count
@@ -0,0 +1,78 @@
+"""
+The venue listing as the number of shows grows: the aggregated query against per-venue counting
+
+For each of BENCH_VENUE_SHOWS (default 1,000, 10,000 and 100,000) a catalog
+of 50 venues with that many shows is added and removed afterwards. The
+legacy baseline loads every venue with its shows and counts the upcoming
+ones in Python, as app.venues() used to; each benchmark records the shows
+per venue.
+"""
+# Imports
+
+import os
+from datetime import datetime
+
+import pytest
+
+from benchmarks import datagen
+
+SHOWS = [int(shows) for shows in os.environ.get('BENCH_VENUE_SHOWS', '1000,10000,100000').split(',')]
+VENUES = 50
+
+
+@pytest.fixture(scope='module', params=SHOWS, ids=[f'{shows}_shows' for shows in SHOWS])
+def catalog(app, request):
+    from models import db, Artist, Venue, Show
+
+    with app.app_context():
+        artist_ids, venue_ids = datagen.generate(artists=200, venues=VENUES, shows=request.param, slots=0, seed=7)
+        db.session.commit()
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM ANALYZE shows, upcoming_shows')
+    yield venue_ids, request.param
+    with app.app_context():
+        Show.query.filter(Show.venue_id.in_(venue_ids)).delete()
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        Venue.query.filter(Venue.id.in_(venue_ids)).delete()
+        db.session.commit()
+
+
+def legacy_venue_areas(venue_ids):
+    """ The listing as it was: every venue with every show hydrated, counted per venue """
+    from sqlalchemy.orm import selectinload
+
+    from models import Venue
+
+    areas = {}
+    venues = Venue.query.options(selectinload(Venue.shows)).filter(Venue.id.in_(venue_ids)) \
+        .order_by(Venue.state, Venue.city, Venue.id).all()
+    for venue in venues:
+        area = areas.setdefault((venue.city, venue.state), {'city': venue.city, 'state': venue.state, 'venues': []})
+        area['venues'].append({
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': len([show for show in venue.shows if show.start_time > datetime.now()]),
+        })
+    return list(areas.values())
+
+
+@pytest.mark.benchmark(group='venue_listing')
+@pytest.mark.parametrize('method', ['aggregated', 'legacy'])
+def bench_venue_areas(benchmark, app, catalog, method):
+    from models import db, Venue
+    from queries import venue_areas
+
+    venue_ids, shows = catalog
+    with app.app_context():
+        if method == 'aggregated':
+            areas = benchmark(venue_areas, Venue.id.in_(venue_ids))
+            assert areas == legacy_venue_areas(venue_ids)
+        else:
+            def legacy():
+                # A fresh session per round, as each request has
+                db.session.remove()
+                return legacy_venue_areas(venue_ids)
+
+            areas = benchmark(legacy)
+    assert sum(len(area['venues']) for area in areas) == VENUES
+    benchmark.extra_info['shows_per_venue'] = shows // VENUES
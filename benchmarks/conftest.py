@@ -0,0 +1,108 @@
+"""
+Fixtures: the app against a scratch database filled by datagen
+"""
+# Imports
+
+import os
+import re
+import tracemalloc
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+from benchmarks import datagen
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def app():
+    """ The app on BENCH_DATABASE_URL, migrated and filled with the BENCH_SIZE catalog if empty """
+    url = os.environ.get('BENCH_DATABASE_URL')
+    if not url:
+        pytest.skip('Set BENCH_DATABASE_URL to a scratch PostgreSQL database to run the benchmarks.')
+    os.environ['DATABASE_URL'] = url
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    import flask_migrate
+    from app import app
+    from cache import page_cache
+    from models import db, Artist
+
+    app.config.update(
+        CACHE_TYPE=os.environ.get('BENCH_CACHE', 'null'),
+        WTF_CSRF_ENABLED=False,
+        PROFILING_ENABLED=False,
+    )
+    page_cache.init_app(app)
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(ROOT, 'migrations'))
+        if not db.session.query(Artist.id).first():
+            datagen.generate(**datagen.SIZES[os.environ.get('BENCH_SIZE', 'small')])
+            db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def ids(app):
+    """ An artist and a venue with shows on both sides of now """
+    from models import db, Show
+
+    with app.app_context():
+        artist_id, venue_id = db.session.query(Show.artist_id, Show.venue_id) \
+            .order_by(Show.artist_id, Show.venue_id).first()
+    return {'artist_id': artist_id, 'venue_id': venue_id}
+
+# Measurements.
+
+
+def sql_count(response):
+    """ Returns the statement count from the Server-Timing header """
+    match = re.search(r'desc="(\d+) queries"', response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+@contextmanager
+def counted():
+    """ Yields {'statements', 'rows', 'objects'}: the SQL run meanwhile, the rows it fetched and ORM objects loaded """
+    counts = {'statements': 0, 'rows': 0, 'objects': 0}
+
+    def executed(conn, cursor, statement, parameters, context, executemany):
+        counts['statements'] += 1
+        if cursor.description is not None:
+            counts['rows'] += max(cursor.rowcount, 0)
+
+    def loaded(target, context):
+        counts['objects'] += 1
+
+    event.listen(Engine, 'after_cursor_execute', executed)
+    event.listen(Mapper, 'load', loaded)
+    try:
+        yield counts
+    finally:
+        event.remove(Engine, 'after_cursor_execute', executed)
+        event.remove(Mapper, 'load', loaded)
+
+
+def traced_peak(call):
+    """ Returns (result, peak bytes allocated by Python) for call() """
+    tracemalloc.start()
+    try:
+        result = call()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentiles(benchmark, *points):
+    """ Returns the given latency percentiles of a finished benchmark, in milliseconds """
+    data = sorted(benchmark.stats.stats.data)
+    return {f'p{point}_ms': round(data[min(len(data) - 1, int(len(data) * point / 100))] * 1000, 3) for point in points}
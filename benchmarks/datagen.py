@@ -0,0 +1,163 @@
+"""
+Deterministic synthetic catalog: artists, venues, shows and availability slots
+"""
+# Imports
+
+import random
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import insert
+
+import feed
+import geo
+from enums import Genre
+from models import db, Artist, ArtistAvailability, Venue, Show
+
+SIZES = {
+    'small': {'artists': 200, 'venues': 50, 'shows': 2000, 'slots': 5},
+    'medium': {'artists': 2000, 'venues': 500, 'shows': 50000, 'slots': 10},
+    'large': {'artists': 20000, 'venues': 5000, 'shows': 1000000, 'slots': 10},
+}
+
+WORDS = ('The', 'Blue', 'Velvet', 'Electric', 'Midnight', 'Golden', 'Silver', 'Wild', 'Lonely', 'Neon',
+         'Crimson', 'Hollow', 'Echo', 'River', 'Stone', 'Harbor', 'Garden', 'Lantern', 'Owl', 'Fox')
+CITIES = (('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Chicago', 'IL'), ('Seattle', 'WA'),
+          ('Nashville', 'TN'), ('New Orleans', 'LA'), ('Denver', 'CO'))
+
+# Listings are scattered up to JITTER degrees around their city's gazetteer point
+JITTER = 0.5
+
+# Shows start SHOW_SPACING apart and last SHOW_LENGTH, so none overlap
+SHOW_SPACING = timedelta(hours=3)
+SHOW_LENGTH = timedelta(hours=2)
+
+# Rows.
+
+
+def anchor():
+    """ Returns today's midnight; shows are spread on both sides of it """
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def name(rng, index):
+    return f'{rng.choice(WORDS)} {rng.choice(WORDS)} {index}'
+
+
+def listing(rng, index):
+    city, state = rng.choice(CITIES)
+    latitude, longitude = geo.geocode(city, state)
+    return {
+        'name': name(rng, index),
+        'city': city,
+        'state': state,
+        'latitude': round(latitude + rng.uniform(-JITTER, JITTER), 6),
+        'longitude': round(longitude + rng.uniform(-JITTER, JITTER), 6),
+        'phone': f'{rng.randint(200, 999)}-555-{index % 10000:04d}',
+        'genres': [genre.name for genre in rng.sample(list(Genre), rng.randint(1, 3))],
+        'image_link': f'https://picsum.photos/seed/{index}/300/300',
+        'website_link': None,
+        'facebook_link': None,
+        'seeking_description': None,
+    }
+
+
+def artist_rows(count, rng):
+    for index in range(count):
+        yield dict(listing(rng, index), seeking_venue=rng.random() < 0.3)
+
+
+def venue_rows(count, rng):
+    for index in range(count):
+        yield dict(listing(rng, index), address=f'{rng.randint(1, 999)} {rng.choice(WORDS)} St',
+                   seeking_talent=rng.random() < 0.3)
+
+
+def show_rows(count, artist_ids, venue_ids, now):
+    """ Yields count shows, half past and half upcoming, with no artist or venue double-booked
+
+    Shows are laid out in time slots of min(artists, venues) shows each, and
+    within a slot every show has a different artist and venue.
+    """
+    width = min(len(artist_ids), len(venue_ids))
+    first = now - SHOW_SPACING * (count // width // 2)
+    for index in range(count):
+        slot, offset = divmod(index, width)
+        starts_at = first + SHOW_SPACING * slot
+        yield {
+            'artist_id': artist_ids[(offset + slot * 7) % len(artist_ids)],
+            'venue_id': venue_ids[(offset + slot * 3) % len(venue_ids)],
+            'start_time': starts_at,
+            'ends_at': starts_at + SHOW_LENGTH,
+        }
+
+
+def slot_rows(artist_ids, per_artist, now):
+    """ Yields per_artist evening slots on the days after now for each artist """
+    for artist_id in artist_ids:
+        for day in range(1, per_artist + 1):
+            starts_at = now + timedelta(days=day, hours=20)
+            yield {'artist_id': artist_id, 'starts_at': starts_at, 'ends_at': starts_at + timedelta(hours=1)}
+
+# Writes.
+
+
+def insert_rows(model, rows, batch_size=5000, returning=False):
+    """ Inserts rows in executemany batches; returns the new ids in order when returning is set """
+    ids, batch = [], []
+
+    def flush():
+        statement = insert(model)
+        if returning:
+            ids.extend(db.session.scalars(statement.returning(model.id, sort_by_parameter_order=True), batch))
+        else:
+            db.session.execute(statement, batch)
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return ids
+
+
+def delete_rows(model, ids, batch_size=50000):
+    """ Deletes the rows with ids, batch_size per statement so each stays within the statement timeout """
+    for start in range(0, len(ids), batch_size):
+        model.query.filter(model.id.in_(ids[start:start + batch_size])).delete(synchronize_session=False)
+
+
+def generate(artists, venues, shows, slots, seed=0, now=None):
+    """ Inserts a synthetic catalog and returns (artist_ids, venue_ids); the caller commits
+
+    The same arguments (and now) always produce the same rows.
+    """
+    rng = random.Random(seed)
+    now = now or anchor()
+    artist_ids = insert_rows(Artist, artist_rows(artists, rng), returning=True)
+    venue_ids = insert_rows(Venue, venue_rows(venues, rng), returning=True)
+    if shows:
+        insert_rows(Show, show_rows(shows, artist_ids, venue_ids, now))
+        feed.refresh(Show.artist_id.in_(artist_ids))
+    if slots:
+        insert_rows(ArtistAvailability, slot_rows(artist_ids, slots, now))
+    return artist_ids, venue_ids
+
+
+@click.command()
+@click.option('--size', type=click.Choice(sorted(SIZES)), default='small', show_default=True)
+@click.option('--seed', default=0, show_default=True)
+def main(size, seed):
+    """ Fills the app's database with a synthetic catalog """
+    from app import app
+
+    with app.app_context():
+        generate(seed=seed, **SIZES[size])
+        db.session.commit()
+    click.echo(f'Generated the {size} catalog: ' + ', '.join(f'{n} {what}' for what, n in SIZES[size].items()))
+
+
+if __name__ == '__main__':
+    main()
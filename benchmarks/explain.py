@@ -0,0 +1,174 @@
+"""
+EXPLAIN (ANALYZE, BUFFERS) every query the routes issue, and fail on large seq scans
+
+    python -m benchmarks.explain --size medium --threshold 1000
+
+Requests each route of bench_routes (and one booking) through the test client
+against the app's database, generating the catalog first when it is empty,
+then explains every SELECT they ran. A sequential scan that reads more than
+--threshold rows fails the run unless --allow names its route or matches its
+SQL.
+
+Some full scans are by design: genre facet counts over a whole table, which
+are cached for FACET_CACHE_TTL, and without pg_trgm the ngram search index,
+built once per process:
+
+    python -m benchmarks.explain --allow 'unnest\\(' --allow search_artists --allow search_venues
+"""
+# Imports
+
+import re
+import sys
+from datetime import timedelta
+
+import click
+from sqlalchemy import event
+
+from benchmarks import datagen
+from benchmarks.bench_routes import ROUTES
+
+# Capture.
+
+
+def captured_selects(engine, request):
+    """ Calls request() and returns the (statement, parameters) of the SELECTs it ran """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip()[:6].upper() in ('SELECT', 'WITH ('):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        request()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return statements
+
+
+def explain(engine, statement, parameters):
+    """ Returns the JSON plan of statement, run in a transaction that is rolled back """
+    with engine.connect() as connection:
+        try:
+            return connection.exec_driver_sql(
+                'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + statement, parameters
+            ).scalar()[0]
+        finally:
+            connection.rollback()
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def scanned_rows(node):
+    """ Returns the rows a scan node read, including the ones its filter removed """
+    return (node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)) * node.get('Actual Loops', 1)
+
+
+def large_seq_scans(plan, threshold):
+    """ Returns the seq scan nodes of plan that read more than threshold rows """
+    return [node for node in plan_nodes(plan['Plan'])
+            if node['Node Type'] == 'Seq Scan' and scanned_rows(node) > threshold]
+
+
+def allowed(name, statement, allow):
+    """ Returns True if the route name or the statement matches one of the allow entries """
+    return name in allow or any(re.search(pattern, statement) for pattern in allow)
+
+# Requests.
+
+
+def route_requests(client, ids):
+    """ Yields (name, request) for every benchmarked route """
+    for name, method, path, data in ROUTES:
+        url = path.format(**ids)
+        yield name, lambda url=url, method=method, data=data: client.open(url, method=method, data=data)
+
+
+def booking_request(client, ids, starts_at):
+    """ Returns a request booking the sample artist at starts_at, one of its datagen slots
+
+    The show ends before the next datagen show can start, so the booking succeeds.
+    """
+    return lambda: client.post('/shows/create', data={
+        'artist_id': ids['artist_id'],
+        'venue_id': ids['venue_id'],
+        'start_time': starts_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'ends_at': (starts_at + timedelta(minutes=50)).strftime('%Y-%m-%d %H:%M:%S'),
+    })
+
+
+def sample_ids():
+    """ Returns an artist and a venue that have shows """
+    from models import db, Show
+
+    artist_id, venue_id = db.session.query(Show.artist_id, Show.venue_id) \
+        .order_by(Show.artist_id, Show.venue_id).first()
+    return {'artist_id': artist_id, 'venue_id': venue_id}
+
+
+def prepare(size):
+    """ Fills an empty database with the size catalog and refreshes the planner statistics """
+    from models import db, Artist
+
+    if not db.session.query(Artist.id).first():
+        datagen.generate(**datagen.SIZES[size])
+        db.session.commit()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('VACUUM ANALYZE')
+
+
+@click.command()
+@click.option('--size', type=click.Choice(sorted(datagen.SIZES)), default='medium', show_default=True,
+              help='Catalog to generate when the database is empty.')
+@click.option('--threshold', default=1000, show_default=True, help='Rows a seq scan may read.')
+@click.option('--allow', multiple=True, help='Route name or SQL regex whose seq scans are expected; repeatable.')
+@click.option('--verbose', '-v', is_flag=True, help='Print every plan.')
+def main(size, threshold, allow, verbose):
+    """ Explains the routes' queries and exits 1 if any seq scan reads more than threshold rows """
+    from app import app
+    from cache import page_cache
+    from models import db, Show
+
+    app.config.update(CACHE_TYPE='null', WTF_CSRF_ENABLED=False)
+    page_cache.init_app(app)
+    client = app.test_client()
+
+    with app.app_context():
+        prepare(size)
+        ids = sample_ids()
+        engine = db.engine
+    booked_at = datagen.anchor() + timedelta(days=1, hours=20)
+    requests = list(route_requests(client, ids)) + [('create_show', booking_request(client, ids, booked_at))]
+
+    failures = 0
+    for name, request in requests:
+        statements = captured_selects(engine, request)
+        for statement, parameters in statements:
+            plan = explain(engine, statement, parameters)
+            scans = large_seq_scans(plan, threshold)
+            failed = scans and not allowed(name, statement, allow)
+            failures += bool(failed)
+            if verbose or scans:
+                status = 'FAIL' if failed else 'allowed' if scans else 'ok'
+                click.echo(f"{name} [{status}] {plan['Execution Time']:.2f}ms")
+                click.echo('    ' + ' '.join(statement.split())[:300])
+                for node in scans:
+                    click.echo(f"    Seq Scan on {node['Relation Name']}: {scanned_rows(node)} rows")
+        click.echo(f'{name}: {len(statements)} queries')
+
+    # The booking above was real; remove it so the run can be repeated
+    with app.app_context():
+        Show.query.filter(Show.artist_id == ids['artist_id'], Show.start_time == booked_at).delete()
+        db.session.commit()
+
+    if failures:
+        click.echo(f'{failures} queries fell back to a seq scan over more than {threshold} rows', err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Load test: a weighted mix of browsing, search and booking
+
+    locust -f benchmarks/locustfile.py --host http://localhost:5010
+
+Run it once against the default server and once with ASYNC_MODE=1 to compare
+the sync and async read paths. On quit, prints the mean SQL statements per
+request for each route, read from the Server-Timing header.
+"""
+# Imports
+
+import random
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from locust import HttpUser, between, events, task
+
+SQL_COUNTS = defaultdict(list)
+
+
+def record_sql_count(name, response):
+    match = re.search(r'desc="(\d+) queries"', response.headers.get('Server-Timing', ''))
+    if match:
+        SQL_COUNTS[name].append(int(match.group(1)))
+
+
+@events.quitting.add_listener
+def report_sql_counts(environment, **kwargs):
+    print(f'{"route":<24}{"requests":>10}{"sql/request":>14}')
+    for name, counts in sorted(SQL_COUNTS.items()):
+        print(f'{name:<24}{len(counts):>10}{sum(counts) / len(counts):>14.1f}')
+
+
+class Visitor(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.artist_ids = [row['id'] for row in self.client.get('/api/v1/artists', name='setup').json()['data']]
+        self.venue_ids = [row['id'] for row in self.client.get('/api/v1/venues', name='setup').json()['data']]
+
+    def visit(self, path, name, method='GET', data=None):
+        with self.client.request(method, path, name=name, data=data, catch_response=True) as response:
+            record_sql_count(name, response)
+            if response.status_code >= 400:
+                response.failure(f'HTTP {response.status_code}')
+
+    @task(5)
+    def home(self):
+        self.visit('/', 'home')
+
+    @task(3)
+    def artists(self):
+        self.visit('/artists', 'artists')
+
+    @task(3)
+    def venues(self):
+        self.visit('/venues', 'venues')
+
+    @task(2)
+    def shows(self):
+        self.visit('/shows', 'shows')
+
+    @task(4)
+    def show_artist(self):
+        self.visit(f'/artists/{random.choice(self.artist_ids)}', 'show_artist')
+
+    @task(4)
+    def show_venue(self):
+        self.visit(f'/venues/{random.choice(self.venue_ids)}', 'show_venue')
+
+    @task(2)
+    def search(self):
+        self.visit('/artists/search', 'search_artists', 'POST', {'search_term': random.choice(('the', 'blue', 'neon'))})
+
+    @task(1)
+    def create_show(self):
+        # datagen offers every artist 20:00 on the days after it ran; taken slots are refused
+        starts_at = datetime.now().replace(hour=20, minute=0, second=0, microsecond=0) \
+            + timedelta(days=random.randint(1, 5))
+        self.visit('/shows/create', 'create_show', 'POST', {
+            'artist_id': random.choice(self.artist_ids),
+            'venue_id': random.choice(self.venue_ids),
+            'start_time': starts_at.strftime('%Y-%m-%d %H:%M:%S'),
+        })
@@ -0,0 +1,50 @@
+"""
+Availability windows: back-to-back slots cover a window together, gaps and past slots do not
+"""
+# Imports
+
+from datetime import timedelta
+
+import pytest
+
+from benchmarks import datagen
+
+
+@pytest.fixture
+def slotted(app):
+    """ Returns (anchor, {name: artist_id}) for artists with slots starting at anchor plus the listed hours """
+    from availability import replace_slots
+    from models import db, Artist
+
+    anchor = datagen.anchor().replace(hour=12) + timedelta(days=400)
+    hours = {'back_to_back': [0, 1, 2], 'gap': [0, 2], 'single': [1], 'past': [-48, 0]}
+    with app.app_context():
+        artists = {name: Artist(name=f'Slotted {name}', city='Austin', state='TX', phone='512-555-0000',
+                                genres=['Jazz']) for name in hours}
+        db.session.add_all(artists.values())
+        db.session.flush()
+        for name, offsets in hours.items():
+            replace_slots(artists[name].id, [anchor + timedelta(hours=offset) for offset in offsets])
+        db.session.commit()
+        ids = {name: artist.id for name, artist in artists.items()}
+    yield anchor, ids
+    with app.app_context():
+        Artist.query.filter(Artist.id.in_(ids.values())).delete()
+        db.session.commit()
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (0, 1, {'back_to_back', 'gap', 'past'}),
+    (0.5, 1.5, {'back_to_back'}),
+    (1, 2, {'back_to_back', 'single'}),
+    (0, 3, {'back_to_back'}),
+    (0.5, 3.5, set()),
+    (-0.5, 0.5, set()),
+], ids=['one_slot', 'straddling', 'second_slot', 'three_slots', 'past_the_end', 'before_the_start'])
+def test_available_artists(app, slotted, start, end, expected):
+    from availability import available_artists
+
+    anchor, ids = slotted
+    with app.app_context():
+        found = set(available_artists(anchor + timedelta(hours=start), anchor + timedelta(hours=end)))
+    assert {name for name, id in ids.items() if id in found} == expected
@@ -0,0 +1,105 @@
+"""
+Concurrent bookings: parallel submissions for overlapping slots commit exactly one show per overlap
+
+Each group is a set of bookings that pairwise overlap, either of one venue
+by different artists or of one artist at different venues. Every booking
+runs in its own thread and session, released together by a barrier.
+"""
+# Imports
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+GROUPS = 6
+PER_GROUP = 4
+
+
+@pytest.fixture
+def contenders(app):
+    """ Returns [(group, artist_id, venue_id, starts_at)] with PER_GROUP overlapping bookings per group
+
+    Even groups contend for one venue, odd groups for one artist. Bookings in
+    a group start 15 minutes apart and last two hours; groups are a day apart.
+    """
+    from models import db, Artist, Venue, Show
+
+    def artist(name):
+        return Artist(name=name, city='Austin', state='TX', phone='512-555-0000', genres=['Jazz'])
+
+    def venue(name):
+        return Venue(name=name, city='Austin', state='TX', address='1 Main St', phone='512-555-0001',
+                     genres=['Jazz'])
+
+    first = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=730)
+    with app.app_context():
+        bookings, rows = [], []
+        for group in range(GROUPS):
+            shared = venue(f'Contended Venue {group}') if group % 2 == 0 else artist(f'Contended Artist {group}')
+            others = [artist(f'Artist {group}.{index}') if group % 2 == 0 else venue(f'Venue {group}.{index}')
+                      for index in range(PER_GROUP)]
+            rows.append((group, shared, others))
+            db.session.add_all([shared, *others])
+        db.session.flush()
+        for group, shared, others in rows:
+            for index, other in enumerate(others):
+                artist_id, venue_id = (other.id, shared.id) if group % 2 == 0 else (shared.id, other.id)
+                bookings.append((group, artist_id, venue_id, first + timedelta(days=group, minutes=15 * index)))
+        db.session.commit()
+        artist_ids = {artist_id for _, artist_id, _, _ in bookings}
+        venue_ids = {venue_id for _, _, venue_id, _ in bookings}
+    yield bookings
+    with app.app_context():
+        Show.query.filter(Show.artist_id.in_(artist_ids)).delete()
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        Venue.query.filter(Venue.id.in_(venue_ids)).delete()
+        db.session.commit()
+
+
+def test_parallel_bookings(app, contenders):
+    from bookings import BookingConflict, book_show
+    from models import db, Show
+
+    barrier = threading.Barrier(len(contenders))
+    outcomes = [None] * len(contenders)
+
+    def book(index, artist_id, venue_id, starts_at):
+        with app.app_context():
+            barrier.wait()
+            try:
+                book_show(artist_id, venue_id, starts_at)
+                db.session.commit()
+                outcomes[index] = 'booked'
+            except BookingConflict:
+                db.session.rollback()
+                outcomes[index] = 'conflict'
+            except Exception as e:
+                db.session.rollback()
+                outcomes[index] = repr(e)
+
+    threads = [threading.Thread(target=book, args=(index, *booking[1:])) for index, booking in enumerate(contenders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+
+    assert set(outcomes) <= {'booked', 'conflict'}, outcomes
+    for group in range(GROUPS):
+        booked = [outcomes[index] for index, booking in enumerate(contenders) if booking[0] == group]
+        assert booked.count('booked') == 1, (group, booked)
+
+    with app.app_context():
+        shows = db.session.query(Show.artist_id, Show.venue_id, Show.start_time).filter(
+            Show.artist_id.in_({booking[1] for booking in contenders})).all()
+    assert len(shows) == GROUPS
+    assert {(show.artist_id, show.venue_id, show.start_time) for show in shows} == \
+        {booking[1:] for index, booking in enumerate(contenders) if outcomes[index] == 'booked'}
+
+
+@pytest.mark.parametrize('artist_id, venue_id', [('abc', '1'), ('1', 'x')])
+def test_non_numeric_ids(client, artist_id, venue_id):
+    response = client.post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_id,
+                                                  'start_time': '2030-01-01 20:00:00'})
+    assert response.status_code == 200
+    assert 'Artist and venue IDs must be numbers.' in response.get_data(as_text=True)
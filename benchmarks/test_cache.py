@@ -0,0 +1,62 @@
+"""
+The page cache: entries are valid for the tag versions read before rendering
+"""
+# Imports
+
+import time
+
+import pytest
+from flask import Flask, g, request
+
+from cache import PageCache, cached, page_cache
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """ A bare app whose page cache is an in-process LRU, and the render count of its one view """
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    monkeypatch.setattr(page_cache, 'backend', PageCache(app).backend)
+    renders = []
+
+    @app.route('/page')
+    @cached('listing')
+    def page():
+        renders.append(len(renders))
+        if len(renders) == 1:
+            # A write committing while this render is in flight
+            page_cache.invalidate('listing')
+        if request.args.get('replica'):
+            g.read_replica = True
+        return f'render {len(renders)}'
+
+    return app.test_client(), renders
+
+
+def test_write_during_render_is_not_cached(pages):
+    client, renders = pages
+    assert client.get('/page').get_data(as_text=True) == 'render 1'
+    assert client.get('/page').get_data(as_text=True) == 'render 2'
+    assert client.get('/page').get_data(as_text=True) == 'render 2'
+    assert len(renders) == 2
+
+
+def test_sticky_client_bypasses_cache(pages):
+    client, renders = pages
+    client.get('/page')
+    client.get('/page')
+    client.set_cookie('primary_until', f'{time.time() + 5:.3f}')
+    assert client.get('/page').get_data(as_text=True) == 'render 3'
+    client.delete_cookie('primary_until')
+    assert client.get('/page').get_data(as_text=True) == 'render 2'
+
+
+def test_replica_read_after_write_is_not_cached(pages):
+    client, renders = pages
+    client.get('/page')
+    page_cache.invalidate('listing')
+    # Read from the replica within DB_REPLICA_STICKY_SECONDS of the write: may lack it
+    assert client.get('/page?replica=1').get_data(as_text=True) == 'render 2'
+    assert client.get('/page?replica=1').get_data(as_text=True) == 'render 3'
+    assert client.get('/page').get_data(as_text=True) == 'render 4'
+    assert client.get('/page').get_data(as_text=True) == 'render 4'
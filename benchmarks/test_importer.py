@@ -0,0 +1,72 @@
+"""
+Show imports: the length limit and double-booking checks of book_show, and feed rows for the imported shows only
+"""
+# Imports
+
+import io
+import json
+from datetime import timedelta
+
+import pytest
+
+from benchmarks import datagen
+
+
+@pytest.fixture
+def parties(app):
+    """ An artist and a venue, with one show at the venue two days from now and left out of the feed """
+    from models import db, Artist, Venue, Show
+
+    with app.app_context():
+        artist = Artist(name='Import Artist', city='Austin', state='TX', phone='512-555-0000', genres=['Jazz'])
+        venues = [Venue(name=f'Import Venue {index}', city='Austin', state='TX', address='1 Main St',
+                        phone='512-555-0001', genres=['Jazz']) for index in range(2)]
+        db.session.add_all([artist, *venues])
+        db.session.flush()
+        other = Artist(name='Import Other', city='Austin', state='TX', phone='512-555-0002', genres=['Jazz'])
+        db.session.add(other)
+        db.session.flush()
+        first = datagen.anchor().replace(hour=20) + timedelta(days=2)
+        stored = Show(artist_id=other.id, venue_id=venues[0].id, start_time=first, ends_at=first + timedelta(hours=2))
+        db.session.add(stored)
+        db.session.commit()
+        parties = {'artist_id': artist.id, 'other_id': other.id, 'venue_ids': [venue.id for venue in venues],
+                   'stored_id': stored.id, 'first': first}
+    yield parties
+    with app.app_context():
+        artist_ids = [parties['artist_id'], parties['other_id']]
+        Show.query.filter(Show.artist_id.in_(artist_ids)).delete()
+        Artist.query.filter(Artist.id.in_(artist_ids)).delete()
+        Venue.query.filter(Venue.id.in_(parties['venue_ids'])).delete()
+        db.session.commit()
+
+
+def test_import_shows(app, parties, tmp_path):
+    from importer import import_file
+    from models import db, Show, UpcomingShow
+
+    first, (venue, free_venue) = parties['first'], parties['venue_ids']
+
+    def row(venue_id, starts_at, hours=2):
+        return {'artist_id': parties['artist_id'], 'venue_id': venue_id, 'start_time': starts_at.isoformat(),
+                'ends_at': (starts_at + timedelta(hours=hours)).isoformat()}
+
+    rows = [
+        row(free_venue, first + timedelta(days=1)),
+        row(venue, first + timedelta(hours=1)),  # overlaps the stored show at the venue
+        row(free_venue, first + timedelta(days=1, hours=1)),  # overlaps the first row, by the artist
+        row(free_venue, first - timedelta(days=5), hours=48),  # longer than SHOW_MAX_MINUTES
+    ]
+    path = tmp_path / 'shows.jsonl'
+    path.write_text(''.join(json.dumps(record) + '\n' for record in rows))
+    rejects = io.StringIO()
+    with app.app_context():
+        report = import_file('shows', str(path), rejects=rejects)
+        assert (report.imported, report.rejected) == (1, 3), rejects.getvalue()
+        imported = db.session.query(Show.id).filter(Show.artist_id == parties['artist_id']).all()
+        feed = {id for id, in db.session.query(UpcomingShow.show_id).filter(
+            UpcomingShow.show_id.in_([imported[0].id, parties['stored_id']]))}
+    assert 'line 2: the artist or venue already has a show' in rejects.getvalue()
+    assert 'line 3: the artist or venue already has a show' in rejects.getvalue()
+    assert 'line 4: a show cannot last over' in rejects.getvalue()
+    assert feed == {imported[0].id}
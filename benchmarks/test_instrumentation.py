@@ -0,0 +1,30 @@
+"""
+Request metrics: statements of the async read path count for the request that ran them
+"""
+# Imports
+
+import pytest
+from sqlalchemy import select
+
+
+@pytest.fixture
+def reader(app):
+    pytest.importorskip('asyncpg')
+    from async_mode import AsyncReader, async_uri
+
+    reader = AsyncReader(async_uri(app.config['SQLALCHEMY_DATABASE_URI']))
+    yield reader
+    reader.loop.call_soon_threadsafe(reader.loop.stop)
+
+
+def test_async_statements_are_counted(app, reader):
+    from flask import g
+
+    from instrumentation import RequestMetrics
+
+    with app.test_request_context('/'):
+        g._metrics = RequestMetrics()
+        one, two = reader.gather(select(1), select(2))
+        assert (one, two) == ([(1,)], [(2,)])
+        assert g._metrics.sql_count == 2
+        assert g._metrics.sql_rows == 2
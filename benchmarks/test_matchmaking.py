@@ -0,0 +1,59 @@
+"""
+The match index rebuild: a stale index keeps serving while its replacement is built in the background
+"""
+# Imports
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def stale(app, monkeypatch):
+    """ Makes every index stale at once; builds set the first event once read and finish on the second """
+    import matchmaking
+
+    read, release = threading.Event(), threading.Event()
+    build_index = matchmaking.build_index
+
+    def slow_build():
+        index = build_index()
+        read.set()
+        assert release.wait(30)
+        return index
+
+    with app.app_context():
+        matchmaking.invalidate()
+        matchmaking.get_index()
+    monkeypatch.setitem(app.config, 'MATCH_INDEX_TTL', 0)
+    monkeypatch.setattr(matchmaking, 'build_index', slow_build)
+    yield read, release
+    release.set()
+    with matchmaking._build_lock:
+        matchmaking.invalidate()
+
+
+def test_stale_index_served_during_rebuild(app, stale):
+    import matchmaking
+    from models import db, Artist
+
+    read, release = stale
+    with app.app_context():
+        old = matchmaking.get_index()
+        assert read.wait(30)
+        assert matchmaking.get_index() is old
+        # Added after the new index was read, so only the refresh can put it there
+        artist = Artist(name='Rebuild Artist', city='Austin', state='TX', phone='512-555-0000', genres=['Jazz'],
+                        seeking_venue=True)
+        db.session.add(artist)
+        db.session.commit()
+        matchmaking.refresh(Artist, artist.id)
+        assert artist.id in old.postings[Artist].rows
+        release.set()
+        with matchmaking._build_lock:
+            pass
+        new = matchmaking._index[1]
+        assert new is not old
+        assert artist.id in new.postings[Artist].rows
+        Artist.query.filter(Artist.id == artist.id).delete()
+        db.session.commit()
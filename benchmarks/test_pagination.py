@@ -0,0 +1,39 @@
+"""
+Keyset pages: malformed cursors are rejected with 400, and walking the pages visits every row once
+"""
+# Imports
+
+import pytest
+
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize('url, values', [
+    ('/api/v1/venues', ['TX', 'Austin', 'abc']),
+    ('/api/v1/venues', [1, 2, 3]),
+    ('/api/v1/venues', ['TX', None, 3]),
+    ('/api/v1/artists', ['2030-01-01T00:00:00', '7']),
+    ('/api/v1/artists', ['yesterday', 7]),
+    ('/api/v1/artists', [0, 7]),
+    ('/api/v1/artists', ['2030-01-01T00:00:00', True]),
+    ('/venues', ['TX', 'Austin', 'abc']),
+])
+def test_malformed_cursor(client, url, values):
+    response = client.get(url, query_string={'cursor': encode_cursor('next', values)})
+    assert response.status_code == 400
+
+
+def test_venue_pages(client, app):
+    from models import db, Venue
+
+    with app.app_context():
+        expected = {id for id, in db.session.query(Venue.id)}
+    seen, cursor = [], None
+    while True:
+        body = client.get('/api/v1/venues', query_string={'cursor': cursor} if cursor else {}).get_json()
+        seen.extend(venue['id'] for venue in body['data'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == len(expected)
+    assert set(seen) == expected
@@ -0,0 +1,151 @@
+"""
+Query budgets: the SQL statements, fetched rows and ORM objects of each listing and detail route
+
+The detail routes are checked against an artist and venue of their own with
+more shows than a page holds, so loading every show instead of a page (or a
+query per show) exceeds the budget.
+"""
+# Imports
+
+import pytest
+
+from benchmarks import datagen
+from benchmarks.conftest import counted
+
+SHOWS = 200
+SLOTS = 8
+# No generated artist or venue is in it, so a search of the city finds only the fixture's
+CITY = 'Budgetville'
+
+
+@pytest.fixture(scope='module')
+def listed(app):
+    """ An artist and venue with SHOWS shows between them, half past, and SLOTS upcoming slots """
+    import feed
+    from models import db, Artist, ArtistAvailability, Venue, Show
+
+    with app.app_context():
+        artist = Artist(name='Budget Artist', city=CITY, state='TX', phone='512-555-0000', genres=['Jazz'])
+        venue = Venue(name='Budget Venue', city=CITY, state='TX', address='1 Main St', phone='512-555-0001',
+                      genres=['Jazz'])
+        db.session.add_all([artist, venue])
+        db.session.flush()
+        now = datagen.anchor()
+        datagen.insert_rows(Show, datagen.show_rows(SHOWS, [artist.id], [venue.id], now))
+        datagen.insert_rows(ArtistAvailability, datagen.slot_rows([artist.id], SLOTS, now))
+        feed.refresh(Show.artist_id == artist.id)
+        show_id = db.session.query(Show.id).filter(Show.artist_id == artist.id).order_by(Show.id).first()[0]
+        db.session.commit()
+        listed = {'artist_id': artist.id, 'venue_id': venue.id, 'show_id': show_id}
+    yield listed
+    with app.app_context():
+        Show.query.filter(Show.artist_id == listed['artist_id']).delete()
+        Artist.query.filter(Artist.id == listed['artist_id']).delete()
+        Venue.query.filter(Venue.id == listed['venue_id']).delete()
+        db.session.commit()
+
+
+# (name, path, SQL statements); conditional routes run their version query first
+ROUTES = [
+    ('home', '/', 2),
+    ('artists', '/artists', 2),
+    ('venues', '/venues', 2),
+    ('shows', '/shows', 2),
+    ('show_artist', '/artists/{artist_id}', 4),
+    ('show_venue', '/venues/{venue_id}', 3),
+    ('api_artists', '/api/v1/artists', 1),
+    ('api_venues', '/api/v1/venues', 1),
+    ('api_shows', '/api/v1/shows', 2),
+    ('api_past_shows', '/api/v1/shows?past=1', 2),
+    ('api_artist', '/api/v1/artists/{artist_id}', 4),
+    ('api_venue', '/api/v1/venues/{venue_id}', 3),
+    ('api_show', '/api/v1/shows/{show_id}', 1),
+]
+
+# (name, path, form, SQL statements) of the searches, which are POSTed
+SEARCHES = [
+    ('search_artists', '/artists/search', {'search_term': 'Budget'}, 1),
+    ('search_venues', '/venues/search', {'search_term': 'Budget'}, 2),
+    ('search', '/search', {'city': CITY, 'state': 'TX'}, 4),
+]
+
+
+def row_budgets(config):
+    """ Returns {name: (max rows fetched, max ORM objects loaded)} for each route
+
+    A listing page fetches one row past the page to know if there is a next
+    one, and the HTML listings count the genres for their facets. The area
+    search lists every artist and venue of the city, just the fixture's.
+    """
+    from enums import Genre
+
+    page = config['PAGE_SIZE'] + 1
+    shows = config['PAST_SHOWS_PER_PAGE'] + config['UPCOMING_SHOWS_LIMIT']
+    results = config.get('SEARCH_PAGE_SIZE', 20)
+    return {
+        'home': (20, 20),
+        'artists': (page + len(Genre), page),
+        'venues': (page + len(Genre), 0),
+        'shows': (1 + page, 0),
+        'show_artist': (2 + shows + SLOTS, SLOTS),
+        'show_venue': (2 + shows, 0),
+        'api_artists': (page, 0),
+        'api_venues': (page, 0),
+        'api_shows': (1 + page, 0),
+        'api_past_shows': (1 + page, 0),
+        'api_artist': (2 + shows + SLOTS, SLOTS),
+        'api_venue': (2 + shows, 0),
+        'api_show': (1, 0),
+        'search_artists': (results, 0),
+        'search_venues': (2 * results, 0),
+        'search': (2 + 2 * len(Genre), 2),
+    }
+
+
+@pytest.mark.parametrize('name, path, statements', ROUTES, ids=[route[0] for route in ROUTES])
+def test_query_budget(app, client, listed, name, path, statements):
+    rows, objects = row_budgets(app.config)[name]
+    with counted() as counts:
+        response = client.get(path.format(**listed))
+    assert response.status_code == 200
+    assert counts['statements'] == statements, counts
+    assert counts['rows'] <= rows, counts
+    assert counts['objects'] <= objects, counts
+
+
+@pytest.mark.parametrize('name, path, form, statements', SEARCHES, ids=[search[0] for search in SEARCHES])
+def test_search_budget(app, client, listed, name, path, form, statements):
+    import search_index
+
+    with app.app_context():
+        search_index.backend()  # checks for pg_trgm once per engine
+    rows, objects = row_budgets(app.config)[name]
+    with counted() as counts:
+        response = client.post(path, data=form)
+    assert response.status_code == 200
+    assert 'Budget' in response.get_data(as_text=True)
+    assert counts['statements'] == statements, counts
+    assert counts['rows'] <= rows, counts
+    assert counts['objects'] <= objects, counts
+
+
+def test_detail_pages_are_windowed(app, client, listed):
+    """ The detail pages show a page of the fixture's shows, with counts covering all of them """
+    data = client.get(f"/api/v1/venues/{listed['venue_id']}").get_json()
+    assert len(data['past_shows']) == app.config['PAST_SHOWS_PER_PAGE']
+    assert len(data['upcoming_shows']) == app.config['UPCOMING_SHOWS_LIMIT']
+    assert data['past_shows_count'] + data['upcoming_shows_count'] == SHOWS
+
+
+def test_api_shows_follow_the_feed(app, client, listed):
+    """ /api/v1/shows lists the upcoming shows of the /shows page, and with ?past=1 every show """
+    from datetime import datetime
+
+    upcoming = client.get('/api/v1/shows').get_json()
+    assert upcoming['data'] and all(datetime.fromisoformat(show['start_time']) > datetime.now()
+                                    for show in upcoming['data'])
+    following = client.get('/api/v1/shows', query_string={'cursor': upcoming['next_cursor']}).get_json()
+    assert following['data'][0]['start_time'] >= upcoming['data'][-1]['start_time']
+
+    every = client.get('/api/v1/shows', query_string={'past': '1'}).get_json()
+    assert datetime.fromisoformat(every['data'][0]['start_time']) < datetime.now()
@@ -0,0 +1,91 @@
+"""
+Replica routing: which bind each statement of a request runs on
+
+A second engine on the benchmark database stands in for the replica, so
+the statements can be told apart by the engine that ran them.
+"""
+# Imports
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, insert, select, text
+
+
+@pytest.fixture
+def binds(app):
+    """ Adds the replica bind and yields the list of 'primary' / 'replica' each statement ran on """
+    from models import db
+
+    ran = []
+    with app.app_context():
+        engines = db._app_engines[app]
+        primary, replica = engines[None], create_engine(engines[None].url)
+        listeners = [(engine, lambda *args, name=name: ran.append(name))
+                     for engine, name in ((primary, 'primary'), (replica, 'replica'))]
+        for engine, listener in listeners:
+            event.listen(engine, 'before_cursor_execute', listener)
+        engines[app.config['REPLICA_BIND']] = replica
+    yield ran
+    with app.app_context():
+        for engine, listener in listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+        del engines[app.config['REPLICA_BIND']]
+        replica.dispose()
+
+
+def run(statements, method='GET', cookie=None):
+    """ Runs statements in one request and rolls back """
+    from app import app
+    from models import db
+
+    headers = {'Cookie': cookie} if cookie else {}
+    with app.test_request_context('/', method=method, headers=headers):
+        try:
+            for statement in statements:
+                db.session.execute(statement)
+        finally:
+            db.session.rollback()
+
+
+def test_reads_then_writes(binds):
+    run([select(1), text('SELECT 1'), text("UPDATE artists SET name = name WHERE id = -1"), select(1)])
+    assert binds == ['replica', 'replica', 'primary', 'primary']
+
+
+@pytest.mark.parametrize('statement', [
+    text("UPDATE artists SET name = name WHERE id = -1"),
+    text('WITH moved AS (DELETE FROM shows WHERE id = -1 RETURNING id) SELECT id FROM moved'),
+    text('SELECT id FROM artists WHERE id = -1 FOR UPDATE'),
+    text('select id from artists where id = -1 for no key update'),
+], ids=['update', 'cte_delete', 'for_update', 'for_no_key_update'])
+def test_text_writes_go_to_primary(binds, statement):
+    run([statement])
+    assert binds == ['primary']
+
+
+def test_core_write_goes_to_primary(binds):
+    from models import Artist
+    run([insert(Artist).from_select(['name'], select(Artist.name).where(Artist.id == -1))])
+    assert binds == ['primary']
+
+
+def test_writes_stick_to_primary(app, binds):
+    from models import db, Artist
+
+    with app.test_request_context('/', method='POST'):
+        db.session.execute(text('UPDATE artists SET name = name WHERE id = :id'),
+                           {'id': db.session.scalar(select(Artist.id).limit(1))})
+        db.session.commit()
+        response = app.process_response(app.response_class())
+    cookie = response.headers['Set-Cookie'].split(';')[0]
+    assert float(cookie.split('=')[1]) > time.time()
+    binds.clear()
+    run([select(1)], cookie=cookie)
+    run([select(1)])
+    assert binds == ['primary', 'replica']
+
+
+def test_post_reads_from_primary(binds):
+    run([select(1)], method='POST')
+    assert binds == ['primary']
@@ -0,0 +1,72 @@
+"""
+Search backends: ILIKE on Postgres without pg_trgm, and n-gram indexes rebuilt in the background
+"""
+# Imports
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def searched(app):
+    """ Two artists named after a word no generated name has """
+    from models import db, Artist
+
+    with app.app_context():
+        artists = [Artist(name=name, city='Austin', state='TX', phone='512-555-0000', genres=['Jazz'])
+                   for name in ('Quokka Quartet', 'The Quokka')]
+        db.session.add_all(artists)
+        db.session.commit()
+        ids = [artist.id for artist in artists]
+    yield ids
+    with app.app_context():
+        Artist.query.filter(Artist.id.in_(ids)).delete()
+        db.session.commit()
+
+
+def test_auto_backend(app):
+    import search_index
+    from models import db
+
+    with app.app_context():
+        trgm = db.session.execute(db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+        assert search_index.backend() == ('trigram' if trgm else 'ilike')
+
+
+@pytest.mark.parametrize('method', ['ilike', 'ngram'])
+def test_ranked(app, searched, monkeypatch, method):
+    import search_index
+    from models import Artist
+
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', method)
+    with app.app_context():
+        search_index.build(Artist)
+        total, rows = search_index.ranked(Artist, 'quokka')
+    assert total == 2
+    assert {row.id for row in rows} == set(searched)
+
+
+def test_stale_index_served_during_rebuild(app, searched, monkeypatch):
+    import search_index
+    from models import Artist
+
+    release = threading.Event()
+    ngram_index = search_index.NgramIndex
+
+    def slow_index(rows):
+        assert release.wait(30)
+        return ngram_index(rows)
+
+    with app.app_context():
+        old = search_index.build(Artist)
+        monkeypatch.setattr(search_index, 'NgramIndex', slow_index)
+        search_index.invalidate(Artist)
+        assert search_index.get_index(Artist) is old
+        assert search_index.get_index(Artist) is old
+        release.set()
+        for _ in range(300):
+            if search_index.get_index(Artist) is not old:
+                break
+            threading.Event().wait(0.1)
+        assert search_index.get_index(Artist) is not old
@@ -0,0 +1,40 @@
+"""
+The /_stats endpoints: hidden unless EXPOSE_STATS, JSON when exposed
+"""
+# Imports
+
+import pytest
+
+
+@pytest.fixture
+def exposed(app):
+    expose = app.config.get('EXPOSE_STATS')
+    app.config['EXPOSE_STATS'] = True
+    yield
+    app.config['EXPOSE_STATS'] = expose
+
+
+def test_stats_hidden(app, client):
+    expose = app.config.get('EXPOSE_STATS')
+    app.config['EXPOSE_STATS'] = False
+    try:
+        assert client.get('/_stats/cache').status_code == 404
+        assert client.get('/_stats/db').status_code == 404
+    finally:
+        app.config['EXPOSE_STATS'] = expose
+
+
+def test_cache_stats(client, exposed):
+    response = client.get('/_stats/cache')
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert {'hits', 'misses'} <= set(stats)
+    assert {'hits', 'misses', 'evictions', 'directory'} <= set(stats['images'])
+
+
+def test_db_stats(client, exposed):
+    response = client.get('/_stats/db')
+    assert response.status_code == 200
+    stats = response.get_json()
+    assert 'default' in stats['pools']
+    assert 'leaked_sessions' in stats
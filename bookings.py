@@ -0,0 +1,119 @@
+"""
+Show bookings with double-booking detection
+"""
+# Imports
+
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Artist, Venue, Show
+
+
+class BookingError(Exception):
+    """ Raised when a show cannot be booked """
+
+
+class BookingConflict(BookingError):
+    """ Raised when a show overlaps another show of its artist or venue """
+
+
+def find_conflicts(artist_id, venue_id, starts_at, ends_at):
+    """ Returns the shows of the artist or at the venue overlapping [starts_at, ends_at)
+
+    Shows are at most SHOW_MAX_MINUTES long, so only shows starting after
+    starts_at minus that can overlap; with the (artist_id, start_time) and
+    (venue_id, start_time) indexes each side is a short index range scan.
+    """
+    earliest = starts_at - timedelta(minutes=current_app.config.get('SHOW_MAX_MINUTES', 24 * 60))
+    overlapping = (Show.start_time > earliest, Show.start_time < ends_at, Show.ends_at > starts_at)
+    by_artist = Show.query.filter(Show.artist_id == artist_id, *overlapping)
+    by_venue = Show.query.filter(Show.venue_id == venue_id, *overlapping)
+    return by_artist.union(by_venue).order_by(Show.start_time).all()
+
+
+def find_batch_conflicts(shows):
+    """ Returns, for each of shows in order, the start time of a show it overlaps, or None
+
+    shows are dicts with artist_id, venue_id, start_time and ends_at. Each is
+    checked against the stored shows, as find_conflicts does but with one
+    query for the lot, and against the shows before it. The artists and then
+    the venues are locked first, in id order, so concurrent bookings of them
+    wait as they do for book_show. The caller commits.
+    """
+    if not shows:
+        return []
+    artist_ids = sorted({show['artist_id'] for show in shows})
+    venue_ids = sorted({show['venue_id'] for show in shows})
+    db.session.query(Artist.id).filter(Artist.id.in_(artist_ids)).order_by(Artist.id).with_for_update().all()
+    db.session.query(Venue.id).filter(Venue.id.in_(venue_ids)).order_by(Venue.id).with_for_update().all()
+
+    earliest = min(show['start_time'] for show in shows) \
+        - timedelta(minutes=current_app.config.get('SHOW_MAX_MINUTES', 24 * 60))
+    stored = db.session.query(Show.artist_id, Show.venue_id, Show.start_time, Show.ends_at).filter(
+        or_(Show.artist_id.in_(artist_ids), Show.venue_id.in_(venue_ids)),
+        Show.start_time > earliest, Show.start_time < max(show['ends_at'] for show in shows)
+    ).all()
+    booked = defaultdict(list)
+    for artist_id, venue_id, starts_at, ends_at in stored:
+        booked['artist', artist_id].append((starts_at, ends_at))
+        booked['venue', venue_id].append((starts_at, ends_at))
+
+    found = []
+    for show in shows:
+        keys = (('artist', show['artist_id']), ('venue', show['venue_id']))
+        found.append(next((starts_at for key in keys for starts_at, ends_at in booked[key]
+                           if starts_at < show['ends_at'] and ends_at > show['start_time']), None))
+        if found[-1] is None:
+            for key in keys:
+                booked[key].append((show['start_time'], show['ends_at']))
+    return found
+
+
+def parse_ids(artist_id, venue_id):
+    """ Returns the artist and venue IDs of a form as integers """
+    try:
+        return int(artist_id), int(venue_id)
+    except (TypeError, ValueError):
+        raise BookingError('Artist and venue IDs must be numbers.')
+
+
+def book_show(artist_id, venue_id, starts_at, ends_at=None):
+    """ Adds a show unless it overlaps another show of the artist or at the venue
+
+    The artist and venue rows are locked (always in that order) before
+    checking, so concurrent bookings for either are checked one at a time;
+    where btree_gist is available, the exclusion constraints on shows reject
+    any overlap that slips past.
+    The caller commits.
+    """
+    artist_id, venue_id = parse_ids(artist_id, venue_id)
+
+    config = current_app.config
+    ends_at = ends_at or starts_at + timedelta(minutes=config.get('SHOW_DEFAULT_MINUTES', 120))
+    if ends_at <= starts_at:
+        raise BookingError('A show must end after it starts.')
+    if ends_at - starts_at > timedelta(minutes=config.get('SHOW_MAX_MINUTES', 24 * 60)):
+        raise BookingError('A show cannot be that long.')
+
+    if db.session.query(Artist.id).filter(Artist.id == artist_id).with_for_update().scalar() is None:
+        raise BookingError(f'There is no artist with ID {artist_id}.')
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).with_for_update().scalar() is None:
+        raise BookingError(f'There is no venue with ID {venue_id}.')
+
+    for show in find_conflicts(artist_id, venue_id, starts_at, ends_at):
+        who = 'The artist' if show.artist_id == artist_id else 'The venue'
+        raise BookingConflict(f'{who} already has a show at {show.start_time:%Y-%m-%d %H:%M}.')
+
+    show = Show(artist_id=artist_id, venue_id=venue_id, start_time=starts_at, ends_at=ends_at)
+    db.session.add(show)
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        if 'ex_shows_' in str(e.orig):
+            raise BookingConflict('The artist or venue already has a show at that time.') from e
+        raise
+    return show
@@ -0,0 +1,283 @@
+"""
+Rendered page cache with tag-based invalidation
+"""
+# Imports
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from flask import Response, current_app, g, make_response, request, session
+
+from replicas import sticky
+
+# Backends.
+
+
+def entry_size(value):
+    """ Returns the approximate size in bytes of a cached value """
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class LRUCache:
+    """ In-process cache bounded by entry count and total bytes, with per-entry TTL """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                if entry is not None:
+                    self._remove(key)
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None, expires=True):
+        ttl = self.default_ttl if ttl is None else ttl
+        size = entry_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl if expires else None, value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def info(self):
+        return dict(self.stats, entries=len(self.entries), bytes=self.size)
+
+
+class FileSystemCache:
+    """ Cache stored as one file per key, shared by every worker on the host """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, default_ttl=60, prune_every=100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.prune_every = prune_every
+        self.writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.stats['misses'] += 1
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            self.stats['misses'] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.stats['hits'] += 1
+        return value
+
+    def set(self, key, value, ttl=None, expires=True):
+        ttl = self.default_ttl if ttl is None else ttl
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + ttl if expires else None, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path(key))
+        self.writes += 1
+        if self.writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """ Removes least recently used files until the directory fits in max_bytes """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.tmp'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+
+    def info(self):
+        return dict(self.stats, directory=self.directory)
+
+
+class NullCache:
+    """ Cache that stores nothing """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None, expires=True):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def info(self):
+        return {}
+
+# Page cache.
+
+
+class PageCache:
+    """ Caches rendered responses; entries remember the version of each tag they depend on """
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.stats = {'hits': 0, 'misses': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_TYPE', 'lru')
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        max_bytes = app.config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        if kind == 'lru':
+            self.backend = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1000), max_bytes, ttl)
+        elif kind == 'filesystem':
+            self.backend = FileSystemCache(app.config['CACHE_DIR'], max_bytes, ttl)
+        elif kind == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'Unknown CACHE_TYPE: {kind}')
+        app.extensions['page_cache'] = self
+
+    def tag_version(self, tag):
+        """ Returns the tag's version: when it was last invalidated (0 if never) and a random part """
+        version = self.backend.get(f'tag:{tag}')
+        if version is None:
+            version = f'0:{uuid.uuid4().hex}'
+            self.backend.set(f'tag:{tag}', version, expires=False)
+        return version
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is None or any(self.tag_version(tag) != version for tag, version in entry['tags'].items()):
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry['value']
+
+    def versions(self, tags):
+        """ Returns {tag: current version}; read before computing a value, so a write meanwhile makes it stale """
+        return {tag: self.tag_version(tag) for tag in tags}
+
+    def changed_within(self, versions, seconds):
+        """ Returns True if any of versions was invalidated less than seconds ago """
+        since = time.time() - seconds
+        for version in versions.values():
+            stamp, _, rest = version.partition(':')
+            if rest and float(stamp) > since:
+                return True
+        return False
+
+    def set(self, key, value, versions, ttl=None):
+        """ Stores value as valid for the tag versions it was computed from """
+        self.backend.set(key, {'tags': versions, 'value': value}, ttl)
+
+    def invalidate(self, *tags):
+        """ Makes every entry that depends on one of tags stale """
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', f'{time.time():.3f}:{uuid.uuid4().hex}', expires=False)
+
+    def info(self):
+        """ Returns page hit/miss counters plus the backend's eviction counters """
+        return dict(self.backend.info(), **self.stats)
+
+
+page_cache = PageCache()
+
+
+def fillable(versions):
+    """ Returns False when a value computed in this request may miss a write made under versions
+
+    That is when the request read from the replica less than
+    DB_REPLICA_STICKY_SECONDS after one of the tags was invalidated: the
+    replica may not have the write yet.
+    """
+    seconds = current_app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+    return not (g.get('read_replica') and page_cache.changed_within(versions, seconds))
+
+
+def cached(*tags, ttl=None):
+    """ Caches a GET view's 200 responses by path and query string
+
+    Tags may use the view arguments, e.g. 'artist:{artist_id}'. Requests with
+    pending flash messages bypass the cache since the page would show them,
+    and so do a client's requests shortly after its own writes, which must
+    read them (see replicas.sticky).
+    Under conditional(), the key includes the page's version, so a change
+    that bumps no tag (a show starting, a write in another worker) still
+    misses the cache.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes') or sticky():
+                return view(*args, **kwargs)
+
+            key = f'page:{request.endpoint}:{request.full_path}'
+            if g.get('page_version'):
+                key = f'{key}:{g.page_version}'
+            hit = page_cache.get(key)
+            if hit is not None:
+                return Response(hit['body'], status=200, mimetype=hit['mimetype'])
+
+            versions = page_cache.versions([tag.format(**kwargs) for tag in tags])
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and fillable(versions):
+                page_cache.set(key, {
+                    'body': response.get_data(),
+                    'mimetype': response.mimetype
+                }, versions, ttl)
+            return response
+        return wrapper
+    return decorator
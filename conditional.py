@@ -0,0 +1,48 @@
+"""
+Conditional GET (ETag / Last-Modified) for read pages
+"""
+# Imports
+
+import hashlib
+from functools import wraps
+
+from flask import Response, current_app, g, make_response, request, session
+from werkzeug.http import is_resource_modified
+
+
+def conditional(version):
+    """ Answers If-None-Match / If-Modified-Since with 304 before running the view
+
+    version(**view_args) returns (last_modified, parts) or None when the
+    resource does not exist; the ETag is a hash of parts and ETAG_SALT.
+    Requests with pending flash messages always get a fresh, unversioned page.
+    The ETag is left in g.page_version, so a cached() view below keeps one
+    entry per version and never serves a body older than its ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            last_modified, parts = current
+            salt = current_app.config.get('ETAG_SALT', '')
+            etag = hashlib.sha1(repr((salt, parts)).encode()).hexdigest()
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = Response(status=304)
+            else:
+                g.page_version = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
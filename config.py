@@ -3,8 +3,99 @@ SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Debug mode, off unless FLASK_DEBUG=1.
+DEBUG = os.environ.get('FLASK_DEBUG') == '1'
 
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres:@localhost:5432/project_udacity'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres:@localhost:5432/project_udacity')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool and per-statement limits; the pool is instrumented in pool_metrics.py.
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000))
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),  # seconds to wait for a connection
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds before a connection is replaced
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    'connect_args': {
+        'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS} '
+                   f'-c idle_in_transaction_session_timeout={DB_IDLE_IN_TRANSACTION_TIMEOUT_MS}'
+    },
+}
+
+# Read replica; GET requests read from it, except for DB_REPLICA_STICKY_SECONDS
+# after the same client wrote something (see replicas.py).
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+REPLICA_BIND = 'replica'
+SQLALCHEMY_BINDS = {REPLICA_BIND: dict(SQLALCHEMY_ENGINE_OPTIONS, url=DATABASE_REPLICA_URL)} if DATABASE_REPLICA_URL else {}
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+# Serve the home, artist and venue pages through asyncpg (requires asyncpg).
+ASYNC_MODE = os.environ.get('ASYNC_MODE') == '1'
+ASYNC_DATABASE_URI = None  # defaults to SQLALCHEMY_DATABASE_URI with the asyncpg driver
+ASYNC_POOL_SIZE = 20
+ASYNC_MAX_OVERFLOW = 10
+
+# Page cache.
+CACHE_TYPE = 'lru'  # 'lru' (per process), 'filesystem' (shared by workers) or 'null'
+CACHE_DIR = os.path.join(basedir, '.cache')
+CACHE_DEFAULT_TTL = 60
+CACHE_MAX_ENTRIES = 1000
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+FACET_CACHE_TTL = 30  # seconds genre facet counts are reused
+
+# Expose /_stats/* counters; off unless EXPOSE_STATS=1.
+EXPOSE_STATS = os.environ.get('EXPOSE_STATS') == '1'
+
+# Request instrumentation: Server-Timing headers and one JSON log line per request.
+INSTRUMENTATION = True
+N_PLUS_ONE_THRESHOLD = 5  # identical statements in one request before warning
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'  # allow ?_profile=1 / X-Profile: 1
+
+# Changing ETAG_SALT (e.g. per release) invalidates every client's ETags.
+ETAG_SALT = os.environ.get('ETAG_SALT', '')
+
+# Listing pages.
+PAGE_SIZE = 50
+
+# Serve the bundles built by `flask assets build`; off in debug mode unless ASSET_BUNDLES=1.
+ASSET_BUNDLES = os.environ.get('ASSET_BUNDLES', '0' if DEBUG else '1') == '1'
+
+# Offline city -> coordinates file for artists and venues, and /venues/near.
+GAZETTEER_PATH = os.path.join(basedir, 'data', 'gazetteer.csv')
+NEAR_DEFAULT_RADIUS_KM = 50
+NEAR_MAX_RADIUS_KM = 500
+NEAR_PAGE_SIZE = 50
+
+# Image proxy: resized artist and venue images, cached on disk under a size cap.
+# IMAGE_FETCHER is 'http' or any callable from URL to bytes, e.g. images.FileFetcher(directory).
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, 'images')
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_FETCHER = 'http'
+IMAGE_FETCH_TIMEOUT = 5
+IMAGE_FETCH_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_FAILURE_TTL = 300  # seconds before a source that failed is fetched again
+
+# Detail pages.
+PAST_SHOWS_PER_PAGE = 12
+UPCOMING_SHOWS_LIMIT = 50
+
+# Length of an availability slot; a show can be booked at any time inside one.
+AVAILABILITY_SLOT_MINUTES = 60
+
+# Show lengths; shows of one artist or at one venue may not overlap.
+SHOW_DEFAULT_MINUTES = 120
+SHOW_MAX_MINUTES = 24 * 60
+
+# Rows fetched per round trip by flask export and /export/<entity>.
+EXPORT_BATCH_SIZE = 5000
+
+# Search.
+SEARCH_BACKEND = 'auto'  # 'trigram' (pg_trgm), 'ilike', 'ngram' (in-process) or 'auto'
+SEARCH_PAGE_SIZE = 20
+SEARCH_INDEX_TTL = 60  # seconds an in-process n-gram index is reused
+
+# Artist-venue matchmaking.
+MATCH_LIMIT = 20
+MATCH_INDEX_TTL = 300  # seconds the in-process match index is reused; this process's edits update it at once
@@ -0,0 +1,116 @@
+"""
+Streaming export of artists, venues and shows as CSV, JSONL or columnar JSON
+"""
+# Imports
+
+import csv
+import io
+import json
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Artist, Venue, Show
+
+ENTITIES = {'artists': Artist, 'venues': Venue, 'shows': Show}
+
+# Formats.
+
+
+def plain(value):
+    """ Returns value as a JSON-friendly value """
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_chunks(names, batches):
+    """ Yields a header line, then one CSV chunk per batch; arrays are comma-joined """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(
+            [','.join(value) if isinstance(value, list) else plain(value) for value in row] for row in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def jsonl_chunks(names, batches):
+    """ Yields one chunk of JSON lines (one object per row) per batch """
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(names, map(plain, row)))) + '\n' for row in rows)
+
+
+def columns_chunks(names, batches):
+    """ Yields one JSON line per batch mapping each column name to its values
+
+    Column names are written once per batch rather than once per row, which
+    makes the output much smaller than JSONL for wide tables.
+    """
+    for rows in batches:
+        yield json.dumps({name: [plain(value) for value in values] for name, values in zip(names, zip(*rows))}) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv'),
+    'jsonl': (jsonl_chunks, 'application/x-ndjson'),
+    'columns': (columns_chunks, 'application/x-ndjson'),
+}
+
+# Export.
+
+
+def batches(model, columns, batch_size):
+    """ Yields the model's rows as plain tuples in id order, batch_size at a time
+
+    Each batch is one keyset query on the primary key in its own short
+    transaction, ended before the batch is handed on. A server-side cursor
+    would hold a transaction open for the whole download, and a slow client
+    would be cut off by idle_in_transaction_session_timeout. Rows committed
+    during the export are included if they sort after the last batch read.
+    """
+    position = [column.name for column in columns].index('id')
+    last = None
+    while True:
+        query = select(*columns).order_by(model.id).limit(batch_size)
+        if last is not None:
+            query = query.where(model.id > last)
+        rows = db.session.execute(query).all()
+        db.session.commit()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][position]
+
+
+def export_chunks(entity, fmt='csv', batch_size=None):
+    """ Yields the entity's table as text chunks, one per batch of rows
+
+    Only one batch is in memory at a time, so memory use does not grow with
+    the size of the table.
+    """
+    model = ENTITIES[entity]
+    write, _ = FORMATS[fmt]
+    batch_size = batch_size or current_app.config.get('EXPORT_BATCH_SIZE', 5000)
+    columns = list(model.__table__.columns)
+    yield from write([column.name for column in columns], batches(model, columns, batch_size))
+
+
+def mimetype(fmt):
+    return FORMATS[fmt][1]
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv', show_default=True)
+@click.option('--batch-size', type=int, help='Rows fetched per round trip; defaults to EXPORT_BATCH_SIZE.')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+def export_command(entity, fmt, batch_size, output):
+    """ Exports artists, venues or shows as CSV, JSONL or columnar JSON """
+    for chunk in export_chunks(entity, fmt, batch_size):
+        output.write(chunk)
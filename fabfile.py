@@ -7,12 +7,16 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest benchmarks -q --benchmark-disable", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def assets():
+    local("flask --app app assets build")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -24,6 +28,7 @@ def push():
 
 def prepare():
     test()
+    assets()
     commit()
     push()
 
@@ -40,13 +45,14 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python -m pytest benchmarks -q --benchmark-disable"
     )
 
 
 def deploy():
     pull()
     test()
+    assets()
     commit()
     heroku()
     heroku_test()
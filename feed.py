@@ -0,0 +1,79 @@
+"""
+Upcoming shows feed, kept in the upcoming_shows table
+
+Writes that change a listed show, artist or venue refresh its rows in the
+same transaction; `flask feed expire`, run on a schedule (cron or Heroku
+Scheduler, every few minutes), deletes the rows of shows that have started.
+"""
+# Imports
+
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Artist, Venue, Show, UpcomingShow
+
+COLUMNS = ('show_id', 'artist_id', 'venue_id', 'start_time', 'ends_at',
+           'artist_name', 'artist_image_link', 'venue_name', 'venue_image_link')
+
+# Writes.
+
+
+def feed_rows(*criteria, now):
+    """ Returns the select of the feed rows for the shows matching criteria that start after now """
+    return db.select(
+        Show.id, Show.artist_id, Show.venue_id, Show.start_time, Show.ends_at,
+        Artist.name, Artist.image_link, Venue.name, Venue.image_link
+    ).join(Artist, Artist.id == Show.artist_id) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .where(Show.start_time > now, *criteria)
+
+
+def refresh(*criteria, now=None):
+    """ Upserts the feed rows of the upcoming shows matching criteria; the caller commits
+
+    refresh(Show.id == id) after a booking, refresh(Show.artist_id == id) after
+    an artist edit, refresh() to load everything.
+    """
+    db.session.flush()
+    statement = insert(UpcomingShow).from_select(COLUMNS, feed_rows(*criteria, now=now or datetime.now()))
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[UpcomingShow.show_id],
+        set_={column: statement.excluded[column] for column in COLUMNS[1:]}
+    ))
+
+
+def expire(now=None):
+    """ Deletes the rows of shows that started by now and returns how many; the caller commits """
+    return db.session.execute(
+        db.delete(UpcomingShow).where(UpcomingShow.start_time <= (now or datetime.now()))
+    ).rowcount
+
+
+def rebuild(now=None):
+    """ Replaces the feed with the upcoming shows; the caller commits """
+    db.session.execute(db.delete(UpcomingShow))
+    refresh(now=now)
+
+# Commands.
+
+
+feed_command = AppGroup('feed', help='Maintain the upcoming shows feed.')
+
+
+@feed_command.command('expire')
+def expire_command():
+    """ Removes shows that have started from the feed """
+    removed = expire()
+    db.session.commit()
+    click.echo(f'Removed {removed} started shows from the feed.')
+
+
+@feed_command.command('rebuild')
+def rebuild_command():
+    """ Rebuilds the feed from the shows table """
+    rebuild()
+    db.session.commit()
+    click.echo(f'The feed lists {db.session.query(UpcomingShow).count()} upcoming shows.')
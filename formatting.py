@@ -0,0 +1,54 @@
+"""
+Date formatting for the templates
+"""
+# Imports
+
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+FORMATS = {
+    'full': "EEEE MMMM d, y 'at' h:mma",
+    'medium': "EE MM dd, y h:mma"
+}
+
+# babel's own named formats, resolved per locale by babel itself
+BABEL_FORMATS = ('long', 'short')
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(format, locale):
+    """ Returns the parsed babel pattern and Locale for a format name or pattern """
+    return babel.dates.parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=4096)
+def format_cached(value, format, locale):
+    if format in BABEL_FORMATS:
+        return babel.dates.format_datetime(value, format, locale=locale)
+    pattern, locale = compiled_pattern(format, locale)
+    # babel treats naive datetimes as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return pattern.apply(value, locale)
+
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale=None):
+    """ Formats a datetime (or a date string) like babel.dates.format_datetime
+
+    Patterns are parsed once per format and locale, and the output for
+    recently formatted timestamps is reused.
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    return format_cached(value, format, locale or babel.dates.LC_TIME)
@@ -2,7 +2,7 @@ from datetime import datetime
 import re
 from flask_wtf import FlaskForm
 from wtforms import DateField, FieldList, FormField, StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, SubmitField, TimeField, ValidationError
-from wtforms.validators import DataRequired, URL
+from wtforms.validators import DataRequired, Optional, URL
 from enums import State,Genre
 
 
@@ -24,12 +24,21 @@ def validate_phone(self,field):
     if not is_valid_phone(field.data):
         raise ValidationError('Invalid phone number.')
 
+GENRE_NAMES = frozenset(dict(Genre.choices()))
+STATE_NAMES = frozenset(dict(State.choices()))
+
+def is_valid_genres(genres):
+    return GENRE_NAMES.issuperset(genres)
+
+def is_valid_state(state):
+    return state in STATE_NAMES
+
 def validate_genres(self,field):
-    if not set(field.data).issubset(dict(Genre.choices()).keys()):
+    if not is_valid_genres(field.data):
        raise ValidationError('Invalid genres.')
 
 def validate_state(self,field):
-    if field.data not in dict(State.choices()).keys():
+    if not is_valid_state(field.data):
        raise ValidationError('Invalid State.')
 
 def validate(self, **Kwargs):
@@ -50,6 +59,10 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    ends_at = DateTimeField(
+        'ends_at',
+        validators=[Optional()]
+    )
 
 class VenueForm(FlaskForm):
     name = StringField(
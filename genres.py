@@ -0,0 +1,93 @@
+"""
+Genre filters and facet counts over the ARRAY genres columns
+"""
+# Imports
+
+from flask import current_app
+from sqlalchemy import func, type_coerce
+
+from cache import fillable, page_cache
+from replicas import sticky
+from enums import Genre
+from models import db, Artist, Venue
+
+MATCHES = ('any', 'all')
+
+# Filters.
+
+
+def genre_filter(model, genres, match='any'):
+    """ Returns the criterion for rows with any (&&) or all (@>) of genres
+
+    Both operators are served by the GIN index on the genres column, where
+    a genre = ANY(genres) test would scan the table.
+    """
+    operator = '@>' if match == 'all' else '&&'
+    return model.genres.op(operator)(type_coerce(list(genres), model.genres.type))
+
+
+def matches_genres(row_genres, genres, match='any'):
+    """ Returns True if row_genres has any or all of genres, like genre_filter """
+    row_genres = set(row_genres or ())
+    return set(genres) <= row_genres if match == 'all' else bool(row_genres.intersection(genres))
+
+
+def selected_genres(values):
+    """ Returns (genres, match) from request args or form values; unknown genres are dropped """
+    names = set(values.getlist('genre'))
+    match = values.get('match')
+    return [genre.name for genre in Genre if genre.name in names], match if match in MATCHES else 'any'
+
+
+def area_criteria(model, city=None, state=None):
+    """ Returns the criteria for rows in city and state; either may be empty """
+    criteria = []
+    if city:
+        criteria.append(model.city == city)
+    if state:
+        criteria.append(model.state == state)
+    return criteria
+
+
+def listing_criteria(model, city=None, state=None, genres=(), match='any'):
+    """ Returns the area and genre criteria of a filtered listing """
+    criteria = area_criteria(model, city, state)
+    if genres:
+        criteria.append(genre_filter(model, genres, match))
+    return criteria
+
+# Facets.
+
+
+def facet_counts(model, *criteria):
+    """ Returns {genre: count} over the rows matching criteria, in one aggregate query """
+    tagged = db.session.query(func.unnest(model.genres).label('genre')).filter(*criteria).subquery()
+    return dict(db.session.query(tagged.c.genre, func.count()).group_by(tagged.c.genre).all())
+
+
+def facets(model, city=None, state=None):
+    """ Returns (genre, label, count) for every genre in the area
+
+    Counts are cached for FACET_CACHE_TTL seconds, and dropped sooner when
+    the model's listings are invalidated. A client that has just written
+    counts afresh, as cached() pages do.
+    """
+    key = f'facets:{model.__tablename__}:{city or ""}:{state or ""}'
+    counts = None if sticky() else page_cache.get(key)
+    if counts is None:
+        versions = page_cache.versions([model.__tablename__])
+        counts = facet_counts(model, *area_criteria(model, city, state))
+        if not sticky() and fillable(versions):
+            page_cache.set(key, counts, versions, current_app.config.get('FACET_CACHE_TTL', 30))
+    return [(genre.name, genre.value, counts.get(genre.name, 0)) for genre in Genre]
+
+
+def area_facets(city, state):
+    """ Returns (genre, label, 'n artists, m venues') for every genre in the area """
+    return [(genre, label, f'{artists} artists, {venues} venues')
+            for (genre, label, artists), (_, _, venues) in zip(facets(Artist, city, state), facets(Venue, city, state))]
+
+
+def genre_choices():
+    """ Returns (genre, label, None) for every genre, for filters shown without counts """
+    return [(genre.name, genre.value, None) for genre in Genre]
@@ -0,0 +1,144 @@
+"""
+Coordinates from the offline gazetteer, and venues near a point
+"""
+# Imports
+
+import csv
+import math
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, or_
+
+from models import db, Artist, Venue
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Gazetteer.
+
+
+def place_key(city, state):
+    return ' '.join((city or '').split()).casefold(), (state or '').strip().upper()
+
+
+@lru_cache(maxsize=4)
+def gazetteer(path):
+    """ Returns {(city, state): (latitude, longitude)} read once from the CSV at path """
+    with open(path, newline='', encoding='utf-8') as f:
+        return {place_key(row['city'], row['state']): (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(f)}
+
+
+def geocode(city, state):
+    """ Returns (latitude, longitude) of a gazetteer city, or None """
+    return gazetteer(current_app.config['GAZETTEER_PATH']).get(place_key(city, state))
+
+
+def coordinates(city, state):
+    """ Returns the latitude and longitude columns for a city, None when it is unknown """
+    latitude, longitude = geocode(city, state) or (None, None)
+    return {'latitude': latitude, 'longitude': longitude}
+
+
+@event.listens_for(Artist, 'before_insert')
+@event.listens_for(Artist, 'before_update')
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+def locate(mapper, connection, target):
+    """ Geocodes artists and venues written through the ORM when their city or state changes
+
+    Core inserts (the importer, datagen) set the columns with coordinates().
+    """
+    attrs = inspect(target).attrs
+    if attrs.city.history.has_changes() or attrs.state.history.has_changes():
+        for column, value in coordinates(target.city, target.state).items():
+            setattr(target, column, value)
+
+# Queries.
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Returns the great-circle distance in km between two points """
+    dlat, dlon = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_km(model, latitude, longitude):
+    """ Returns the SQL haversine distance in km from the model's coordinates to a point """
+    dlat = func.radians(model.latitude - latitude)
+    dlon = func.radians(model.longitude - longitude)
+    a = func.power(func.sin(dlat / 2), 2) + \
+        math.cos(math.radians(latitude)) * func.cos(func.radians(model.latitude)) * func.power(func.sin(dlon / 2), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def bounding_boxes(latitude, longitude, radius_km):
+    """ Returns the (west, south, east, north) boxes covering radius_km around a point
+
+    A box crossing the antimeridian is split in two; near a pole every
+    longitude is covered. The half-width in longitude is the circle's widest
+    point, asin(sin(r / R) / cos(latitude)), which lies poleward of the
+    centre's latitude, so the box holds the whole circle at any latitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    ratio = math.sin(angle) / math.cos(math.radians(latitude)) if abs(latitude) < 90.0 else math.inf
+    if north == 90.0 or south == -90.0 or angle >= math.pi / 2 or ratio >= 1.0:
+        return [(-180.0, south, 180.0, north)]
+    dlon = math.degrees(math.asin(ratio))
+    west, east = longitude - dlon, longitude + dlon
+    if west < -180.0:
+        return [(west + 360.0, south, 180.0, north), (-180.0, south, east, north)]
+    if east > 180.0:
+        return [(west, south, 180.0, north), (-180.0, south, east - 360.0, north)]
+    return [(west, south, east, north)]
+
+
+def within_boxes(model, boxes):
+    """ Returns the criterion for rows inside any of boxes, served by the model's GiST location index """
+    location = func.point(model.longitude, model.latitude)
+    return or_(*(location.op('<@')(func.box(func.point(west, south), func.point(east, north)))
+                 for west, south, east, north in boxes))
+
+
+def requested_point(values):
+    """ Returns (latitude, longitude, radius_km) from lat and lon, or city and state, request values
+
+    The radius defaults to NEAR_DEFAULT_RADIUS_KM and is capped at
+    NEAR_MAX_RADIUS_KM. Raises ValueError when the values are invalid or the
+    city is not in the gazetteer.
+    """
+    config = current_app.config
+    radius_km = values.get('radius', config['NEAR_DEFAULT_RADIUS_KM'], type=float)
+    if radius_km is None or not 0 < radius_km < math.inf:
+        raise ValueError('The radius must be a positive number of kilometres.')
+    radius_km = min(radius_km, config['NEAR_MAX_RADIUS_KM'])
+
+    if values.get('lat') or values.get('lon'):
+        latitude, longitude = values.get('lat', type=float), values.get('lon', type=float)
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('The latitude and longitude must be valid coordinates.')
+        return latitude, longitude, radius_km
+
+    point = geocode(values.get('city'), values.get('state'))
+    if point is None:
+        raise ValueError('Enter a known city and state, or a latitude and longitude.')
+    return (*point, radius_km)
+
+
+def venues_near(latitude, longitude, radius_km, limit=None):
+    """ Returns the venues within radius_km of a point, nearest first, with distance_km
+
+    The bounding boxes narrow the candidates through the GiST index; the
+    exact distance then filters and orders them.
+    """
+    limit = limit or current_app.config.get('NEAR_PAGE_SIZE', 50)
+    distance = distance_km(Venue, latitude, longitude).label('distance_km')
+    return db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link, distance) \
+        .filter(within_boxes(Venue, bounding_boxes(latitude, longitude, radius_km))) \
+        .filter(distance <= radius_km) \
+        .order_by(distance, Venue.id) \
+        .limit(limit) \
+        .all()
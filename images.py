@@ -0,0 +1,375 @@
+"""
+Resized artist and venue images, fetched once and kept in a content-addressed disk cache
+"""
+# Imports
+
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from io import BytesIO
+from threading import Lock
+from urllib.parse import urlsplit
+
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+
+from models import Artist, Venue
+
+KINDS = {'artist': Artist, 'venue': Venue}
+
+# Bounding box of each size, in pixels: twice the CSS size of the card, tile and detail images
+SIZES = {'sm': 200, 'md': 400, 'lg': 1000}
+
+DEFAULT_IMAGE = 'img/default-venue.jpg'
+
+# Part of every cache key, so changing the encoding below re-renders everything
+RENDER_VERSION = 1
+JPEG_QUALITY = 82
+MAX_PIXELS = 40 * 1000 * 1000
+
+
+class FetchError(Exception):
+    """ Raised when a source image cannot be fetched or decoded """
+
+# Fetchers.
+
+
+def check_public_url(url):
+    """ Raises FetchError unless url is http(s) with a host; its addresses are checked on connecting """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError(f'unsupported image URL: {url!r}')
+
+
+def public_addresses(host, port):
+    """ Returns the getaddrinfo entries of host, raising FetchError unless every address is public """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise FetchError(f'cannot resolve {host}: {e}') from e
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split('%')[0]).is_global:
+            raise FetchError(f'{host} resolves to a non-public address')
+    return infos
+
+
+def connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, *args, **kwargs):
+    """ Like socket.create_connection, but only to the addresses checked by public_addresses
+
+    Resolving once and connecting to the checked address leaves no window
+    for the name to be rebound to a private address in between.
+    """
+    host, port = address
+    error = None
+    for family, type_, proto, _, sockaddr in public_addresses(host, port):
+        sock = socket.socket(family, type_, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f'cannot connect to {host}')
+
+
+class PublicHTTPConnection(http.client.HTTPConnection):
+    """ HTTPConnection connecting only to public addresses """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPSConnection(http.client.HTTPSConnection):
+    """ HTTPSConnection connecting only to public addresses; SNI and the certificate still use the host name """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect_public
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(PublicHTTPSConnection, req, context=self._context)
+
+
+class CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    """ Follows redirects only to http(s) URLs """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_public_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class HTTPFetcher:
+    """ Downloads source images over http(s), refusing private hosts and oversized bodies
+
+    Proxies are not used: the address checks must apply to the image host
+    itself, not to a proxy.
+    """
+
+    def __init__(self, timeout=5, max_bytes=10 * 1024 * 1024):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), PublicHTTPHandler,
+                                                  PublicHTTPSHandler, CheckedRedirects)
+
+    def __call__(self, url):
+        check_public_url(url)
+        request = urllib.request.Request(url, headers={'User-Agent': 'Fyyur image proxy', 'Accept': 'image/*'})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                content = response.read(self.max_bytes + 1)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise FetchError(f'cannot fetch {url}: {e}') from e
+        if len(content) > self.max_bytes:
+            raise FetchError(f'{url} is larger than {self.max_bytes} bytes')
+        return content
+
+
+class FileFetcher:
+    """ Reads source images from a local directory, by URL path; for tests and offline development """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def __call__(self, url):
+        path = os.path.abspath(os.path.join(self.root, urlsplit(url).path.lstrip('/')))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise FetchError(f'{url} is outside {self.root}')
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise FetchError(f'cannot read {path}: {e}') from e
+
+# Rendering.
+
+
+def resize(content, size):
+    """ Returns content scaled to fit in size x size pixels, as a JPEG """
+    try:
+        with Image.open(BytesIO(content)) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise FetchError(f'image of {image.width}x{image.height} pixels is too large')
+            # Lets the JPEG decoder scale down while decoding
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise FetchError(f'not a usable image: {e}') from e
+
+
+def link_version(link):
+    """ Returns a short digest of an image link, so a changed link gets a new URL """
+    return hashlib.sha256(link.encode()).hexdigest()[:12]
+
+# Store.
+
+
+class ImageStore:
+    """ Rendered images on disk, named by the SHA-256 of their bytes, with an LRU size cap
+
+    keys/ maps a (source, size) key to a digest; blobs/ holds one file per
+    distinct image. Reads refresh a blob's mtime, and pruning removes the
+    least recently used blobs until the total fits in max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, prune_every=100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.writes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        os.makedirs(os.path.join(directory, 'keys'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+
+    def key_path(self, key):
+        return os.path.join(self.directory, 'keys', hashlib.sha1(key.encode()).hexdigest())
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest[:2], digest + '.jpg')
+
+    def get(self, key):
+        """ Returns the digest stored for key, or None if it (or its blob) is missing """
+        try:
+            with open(self.key_path(key), encoding='ascii') as f:
+                digest = f.read().strip()
+            os.utime(self.blob_path(digest))
+        except OSError:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return digest
+
+    def put(self, key, content):
+        """ Stores content for key and returns its digest; identical images share one blob """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.write(path, content)
+        self.write(self.key_path(key), digest.encode())
+        self.writes += 1
+        if self.writes % self.prune_every == 0:
+            self.prune()
+        return digest
+
+    def write(self, path, content):
+        # Written beside the target and renamed, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def prune(self):
+        """ Removes least recently used blobs, then the keys left pointing at nothing """
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if not filename.startswith('.tmp'):
+                    blobs.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        removed = False
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed = True
+            self.stats['evictions'] += 1
+        if removed:
+            for entry in os.scandir(os.path.join(self.directory, 'keys')):
+                try:
+                    with open(entry.path, encoding='ascii') as f:
+                        if not os.path.exists(self.blob_path(f.read().strip())):
+                            os.remove(entry.path)
+                except OSError:
+                    continue
+
+    def info(self):
+        return dict(self.stats, directory=self.directory)
+
+# Extension.
+
+
+class Thumbnails:
+    """ Renders each (source, size) once, deduplicating concurrent requests for a cold key
+
+    The fetcher is any callable from URL to bytes: IMAGE_FETCHER may be one,
+    or 'http' for HTTPFetcher. Sources that fail are not retried for
+    IMAGE_FAILURE_TTL seconds.
+    """
+
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.flights = {}
+        self.failures = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.store = ImageStore(config['IMAGE_CACHE_DIR'], config['IMAGE_CACHE_MAX_BYTES'])
+        fetcher = config.get('IMAGE_FETCHER', 'http')
+        self.fetcher = HTTPFetcher(config['IMAGE_FETCH_TIMEOUT'], config['IMAGE_FETCH_MAX_BYTES']) \
+            if fetcher == 'http' else fetcher
+        self.failure_ttl = config.get('IMAGE_FAILURE_TTL', 300)
+        app.add_template_global(image_url, 'image_url')
+        app.extensions['thumbnails'] = self
+
+    @contextmanager
+    def single_flight(self, key):
+        """ Holds a lock per key, so one caller renders it while the others wait for the result """
+        with self.lock:
+            lock, waiters = self.flights.get(key, (Lock(), 0))
+            self.flights[key] = (lock, waiters + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                lock, waiters = self.flights[key]
+                if waiters == 1:
+                    del self.flights[key]
+                else:
+                    self.flights[key] = (lock, waiters - 1)
+
+    def failed(self, key):
+        with self.lock:
+            expires = self.failures.get(key)
+            if expires is not None and expires < time.monotonic():
+                del self.failures[key]
+                return False
+            return expires is not None
+
+    def remember_failure(self, key):
+        with self.lock:
+            now = time.monotonic()
+            if len(self.failures) > 1000:
+                self.failures = {key: expires for key, expires in self.failures.items() if expires > now}
+            self.failures[key] = now + self.failure_ttl
+
+    def thumbnail(self, link, size):
+        """ Returns (path, digest) of link rendered at size, fetching it on the first request
+
+        Raises FetchError when the source cannot be fetched or decoded.
+        """
+        key = f'{RENDER_VERSION}:{size}:{link}'
+        digest = self.store.get(key)
+        if digest is None:
+            with self.single_flight(key):
+                # Another request may have rendered it while this one waited
+                digest = self.store.get(key)
+                if digest is None:
+                    if self.failed(key):
+                        raise FetchError(f'{link} failed recently')
+                    try:
+                        digest = self.store.put(key, resize(self.fetcher(link), SIZES[size]))
+                    except FetchError:
+                        self.remember_failure(key)
+                        raise
+        return self.store.blob_path(digest), digest
+
+
+def image_url(kind, entity_id, link, size):
+    """ Returns the proxied URL of an artist or venue image, or the default image when there is none """
+    if not link:
+        return current_app.extensions['assets'].asset_url(DEFAULT_IMAGE)
+    return url_for('image', kind=kind, entity_id=entity_id, size=size, v=link_version(link))
@@ -0,0 +1,283 @@
+"""
+Bulk import of artists, venues and shows from CSV or JSONL files
+"""
+# Imports
+
+import csv
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+import feed
+from bookings import find_batch_conflicts
+import matchmaking
+import search_index
+from cache import page_cache
+from forms import is_valid_genres, is_valid_phone, is_valid_state
+from geo import coordinates
+from models import db, Artist, Venue, Show
+
+
+class RowError(ValueError):
+    """ Raised when a row cannot be imported """
+
+# Readers.
+
+
+def read_rows(path, fmt=None):
+    """ Yields (line number, dict) for each record of a CSV or JSONL file """
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield f'line {reader.line_num}', row
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield f'line {number}', json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield f'line {number}', RowError(f'invalid JSON: {e.msg}')
+
+# Row converters.
+
+
+def text(row, name, required=False):
+    value = row.get(name)
+    value = value.strip() if isinstance(value, str) else value
+    if required and not value:
+        raise RowError(f'{name} is required')
+    return value or None
+
+
+def flag(row, name):
+    value = row.get(name)
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def genre_list(row):
+    value = row.get('genres') or []
+    genres = [genre.strip() for genre in value.split(',')] if isinstance(value, str) else list(value)
+    genres = [genre for genre in genres if genre]
+    if not genres or not is_valid_genres(genres):
+        raise RowError(f'invalid genres: {value!r}')
+    return genres
+
+
+def timestamp(row, name, required=False):
+    value = text(row, name, required)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError(f'invalid {name}: {value!r}')
+
+
+def listing(row):
+    """ Returns the columns shared by artists and venues, validated like the forms """
+    state, phone = text(row, 'state', True), text(row, 'phone', True)
+    if not is_valid_state(state):
+        raise RowError(f'invalid state: {state!r}')
+    if not is_valid_phone(phone):
+        raise RowError(f'invalid phone: {phone!r}')
+    city = text(row, 'city', True)
+    return {
+        'name': text(row, 'name', True),
+        'city': city,
+        'state': state,
+        **coordinates(city, state),
+        'phone': phone,
+        'genres': genre_list(row),
+        'image_link': text(row, 'image_link'),
+        'facebook_link': text(row, 'facebook_link'),
+        'website_link': text(row, 'website_link'),
+        'seeking_description': text(row, 'seeking_description'),
+    }
+
+
+def artist_values(row, lookups):
+    return dict(listing(row), seeking_venue=flag(row, 'seeking_venue'))
+
+
+def venue_values(row, lookups):
+    return dict(listing(row), address=text(row, 'address', True), seeking_talent=flag(row, 'seeking_talent'))
+
+
+def show_values(row, lookups):
+    values = {
+        'artist_id': lookups.resolve(Artist, row, 'artist'),
+        'venue_id': lookups.resolve(Venue, row, 'venue'),
+        'start_time': timestamp(row, 'start_time', True),
+    }
+    config = current_app.config
+    ends_at = timestamp(row, 'ends_at') \
+        or values['start_time'] + timedelta(minutes=config.get('SHOW_DEFAULT_MINUTES', 120))
+    if ends_at <= values['start_time']:
+        raise RowError('ends_at must be after start_time')
+    if ends_at - values['start_time'] > timedelta(minutes=config.get('SHOW_MAX_MINUTES', 24 * 60)):
+        raise RowError(f"a show cannot last over {config.get('SHOW_MAX_MINUTES', 24 * 60)} minutes")
+    values['ends_at'] = ends_at
+    return values
+
+
+ENTITIES = {
+    'artists': (Artist, artist_values, ('artists',)),
+    'venues': (Venue, venue_values, ('venues',)),
+    'shows': (Show, show_values, ('shows',)),
+}
+
+# Foreign keys.
+
+
+class Lookups:
+    """ In-memory id and name -> id maps used to resolve the artists and venues of shows """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+
+    def load(self, model):
+        if model not in self.ids:
+            ids, names = set(), {}
+            for id, name in db.session.query(model.id, model.name).yield_per(10000):
+                ids.add(id)
+                key = (name or '').strip().lower()
+                names[key] = None if key in names else id
+            self.ids[model], self.names[model] = ids, names
+        return self.ids[model], self.names[model]
+
+    def resolve(self, model, row, prefix):
+        """ Returns the id given as <prefix>_id, or the id of the one record named <prefix>_name """
+        ids, names = self.load(model)
+        id = text(row, f'{prefix}_id')
+        if id is not None:
+            try:
+                id = int(id)
+            except ValueError:
+                raise RowError(f'invalid {prefix}_id: {id!r}')
+            if id not in ids:
+                raise RowError(f'unknown {prefix}_id: {id}')
+            return id
+        name = text(row, f'{prefix}_name')
+        if name is None:
+            raise RowError(f'{prefix}_id or {prefix}_name is required')
+        key = name.lower()
+        if key not in names:
+            raise RowError(f'unknown {prefix}_name: {name!r}')
+        if names[key] is None:
+            raise RowError(f'ambiguous {prefix}_name: {name!r}')
+        return names[key]
+
+# Import.
+
+
+class Report:
+    """ Counts imported and rejected rows and writes each reject as it happens """
+
+    def __init__(self, rejects):
+        self.rejects = rejects
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    def reject(self, where, reason):
+        self.rejected += 1
+        self.rejects.write(f'{where}: {reason}\n')
+
+    def rate(self):
+        return self.imported / max(time.monotonic() - self.started, 1e-9)
+
+
+def without_conflicts(batch, report):
+    """ Rejects the shows of batch overlapping a stored show or an earlier one of the batch """
+    kept = []
+    for (where, values), clash in zip(batch, find_batch_conflicts([values for _, values in batch])):
+        if clash is None:
+            kept.append((where, values))
+        else:
+            report.reject(where, f'the artist or venue already has a show at {clash:%Y-%m-%d %H:%M}')
+    return kept
+
+
+def write_batch(model, batch, report):
+    """ Inserts a batch with one round trip; on failure retries it row by row to isolate rejects
+
+    Shows are checked for double bookings first, and the inserted ones are
+    added to the upcoming shows feed in the same transaction.
+    """
+    if model is Show:
+        batch = without_conflicts(batch, report)
+        if not batch:
+            db.session.commit()
+            return
+    statement = insert(model).returning(model.id)
+    try:
+        with db.session.begin_nested():
+            ids = db.session.scalars(statement, [values for _, values in batch]).all()
+        report.imported += len(batch)
+    except (DataError, IntegrityError):
+        ids = []
+        for where, values in batch:
+            try:
+                with db.session.begin_nested():
+                    ids.append(db.session.scalars(statement, [values]).one())
+                report.imported += 1
+            except (DataError, IntegrityError) as e:
+                report.reject(where, str(e.orig).strip().splitlines()[0])
+    if model is Show and ids:
+        feed.refresh(Show.id.in_(ids))
+    db.session.commit()
+
+
+def import_file(entity, path, fmt=None, batch_size=1000, rejects=sys.stderr, progress=None):
+    """ Streams records from path into the entity's table; returns the Report """
+    model, convert, tags = ENTITIES[entity]
+    lookups, report, batch = Lookups(), Report(rejects), []
+    for where, row in read_rows(path, fmt):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError('record is not an object')
+            batch.append((where, convert(row, lookups)))
+        except RowError as e:
+            report.reject(where, e)
+            continue
+        if len(batch) >= batch_size:
+            write_batch(model, batch, report)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        write_batch(model, batch, report)
+
+    search_index.invalidate(model)
+    matchmaking.invalidate()
+    page_cache.invalidate(*tags)
+    return report
+
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT round trip.')
+@click.option('--rejects', type=click.File('w'), default='-', help='Where rejected rows are reported.')
+def import_command(entity, path, fmt, batch_size, rejects):
+    """ Imports artists, venues or shows from a CSV or JSONL file """
+    def progress(report):
+        click.echo(f'{report.imported} rows imported ({report.rate():.0f} rows/s)', err=True)
+
+    report = import_file(entity, path, fmt, batch_size, rejects, progress)
+    click.echo(f'Imported {report.imported} {entity}, rejected {report.rejected} '
+               f'in {time.monotonic() - report.started:.1f}s ({report.rate():.0f} rows/s).', err=True)
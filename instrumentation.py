@@ -0,0 +1,186 @@
+"""
+Per-request timing, SQL instrumentation and opt-in profiling
+"""
+# Imports
+
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+# Metrics.
+
+
+class RequestMetrics:
+    """ What one request spent its time on """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.sql_rows = 0
+        self.slowest = (0.0, None)
+        self.statements = Counter()
+        self.objects = 0
+        self.render_time = 0.0
+        self.render_started = None
+
+    def record_query(self, statement, duration, rows):
+        self.sql_count += 1
+        self.sql_time += duration
+        self.sql_rows += max(rows, 0)
+        self.statements[statement] += 1
+        if duration > self.slowest[0]:
+            self.slowest = (duration, statement)
+
+    def repeated(self, threshold):
+        """ Returns (count, statement) for statements run at least threshold times, most first """
+        return [(count, statement) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+# Metrics of the request a statement runs for where there is no request
+# context: the async read path's event loop thread (see async_mode.AsyncReader)
+request_metrics = ContextVar('request_metrics', default=None)
+
+
+def current_metrics():
+    return g.get('_metrics') if has_request_context() else request_metrics.get()
+
+
+def record_query(statement, duration, rows=-1):
+    """ Adds a statement to the current request's metrics, if it is being measured """
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.record_query(statement, duration, rows)
+
+# SQL and ORM events.
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    record_query(statement, time.perf_counter() - started, cursor.rowcount)
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+@event.listens_for(Mapper, 'load')
+def instance_loaded(target, context):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.objects += 1
+
+# Templates.
+
+
+def render_started(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.render_started = time.perf_counter()
+
+
+def render_finished(sender, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics.render_started is not None:
+        metrics.render_time += time.perf_counter() - metrics.render_started
+        metrics.render_started = None
+
+# Requests.
+
+
+def profile_requested(app):
+    if not app.config.get('PROFILING_ENABLED'):
+        return False
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def profile_report(profile, limit=40):
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+class Instrumentation:
+    """ Measures every request and reports it as Server-Timing headers and a JSON log line
+
+    With PROFILING_ENABLED, ?_profile=1 or an X-Profile: 1 header runs the
+    request under cProfile and returns the profile instead of the page.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.logger = app.logger.getChild('requests')
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        before_render_template.connect(render_started, app)
+        template_rendered.connect(render_finished, app)
+        app.extensions['instrumentation'] = self
+
+    def start(self):
+        if not self.app.config.get('INSTRUMENTATION', True):
+            return
+        g._metrics = RequestMetrics()
+        if profile_requested(self.app):
+            g._profile = cProfile.Profile()
+            g._profile.enable()
+
+    def finish(self, response):
+        metrics = g.pop('_metrics', None)
+        if metrics is None:
+            return response
+        profile = g.pop('_profile', None)
+        if profile is not None:
+            profile.disable()
+            response = Response(profile_report(profile), mimetype='text/plain')
+
+        total = time.perf_counter() - metrics.started
+        response.headers['Server-Timing'] = ', '.join((
+            f'app;dur={total * 1000:.1f}',
+            f'sql;dur={metrics.sql_time * 1000:.1f};desc="{metrics.sql_count} queries"',
+            f'render;dur={metrics.render_time * 1000:.1f}',
+        ))
+
+        threshold = self.app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+        repeated = metrics.repeated(threshold)
+        for count, statement in repeated:
+            self.logger.warning('Possible N+1 in %s: %d x %s', request.endpoint, count, statement[:200])
+
+        slowest_time, slowest = metrics.slowest
+        self.logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'sql_count': metrics.sql_count,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'sql_rows': metrics.sql_rows,
+            'slowest_sql_ms': round(slowest_time * 1000, 2),
+            'slowest_sql': slowest[:200] if slowest else None,
+            'render_ms': round(metrics.render_time * 1000, 2),
+            'orm_objects': metrics.objects,
+            'repeated_statements': len(repeated),
+        }))
+        return response
@@ -0,0 +1,276 @@
+"""
+Artist and venue matchmaking: seeking counterparts ranked by genre, location and availability
+"""
+# Imports
+
+import heapq
+import time
+from collections import defaultdict
+from datetime import datetime
+from threading import Lock, Thread
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from geo import place_key
+from models import db, Artist, ArtistAvailability, Venue
+
+_index = None  # (built at, MatchIndex)
+_index_lock = Lock()
+# Held by whichever build runs; _pending collects the rows refreshed meanwhile,
+# and _generation counts invalidations so a build started before one is dropped
+_build_lock = Lock()
+_pending = None
+_rebuilding = False
+_generation = 0
+
+# A candidate covering all of the subject's genres earns GENRE_WEIGHT, in the
+# subject's city CITY_WEIGHT + STATE_WEIGHT, and an artist with
+# AVAILABILITY_CAP or more upcoming slots AVAILABILITY_WEIGHT
+GENRE_WEIGHT = 3.0
+CITY_WEIGHT = 2.0
+STATE_WEIGHT = 1.0
+AVAILABILITY_WEIGHT = 1.0
+AVAILABILITY_CAP = 5
+
+# Rows.
+
+
+def seeking(model):
+    return Artist.seeking_venue if model is Artist else Venue.seeking_talent
+
+
+def listing_select(model, *criteria):
+    return select(
+        model.id, model.name, model.city, model.state, model.genres, model.image_link, seeking(model).label('seeking')
+    ).where(*criteria)
+
+
+def listing_rows(model, *criteria):
+    return db.session.execute(listing_select(model, *criteria)).all()
+
+
+def slot_select(*criteria, now=None):
+    return select(ArtistAvailability.artist_id, func.count()) \
+        .where(ArtistAvailability.starts_at > (now or datetime.now()), *criteria) \
+        .group_by(ArtistAvailability.artist_id)
+
+
+def slot_counts(*criteria, now=None):
+    """ Returns {artist_id: number of slots starting after now} """
+    return dict(db.session.execute(slot_select(*criteria, now=now)).all())
+
+# Index.
+
+
+class Postings:
+    """ Inverted index of the seeking artists or venues: genre, state and city -> ids
+
+    Updates after the build replace a posting set rather than change it, so
+    a request iterating the old set while another re-indexes a row is
+    unaffected.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = {}
+        self.genres = {}
+        self.states = {}
+        self.cities = {}
+        for row in rows:
+            if row.seeking:
+                self.rows[row.id] = row
+                for postings, key in self.keys(row):
+                    postings.setdefault(key, set()).add(row.id)
+
+    def keys(self, row):
+        yield from ((self.genres, genre) for genre in row.genres or ())
+        city, state = place_key(row.city, row.state)
+        yield self.states, state
+        yield self.cities, (city, state)
+
+    def add(self, row):
+        self.remove(row.id)
+        if row.seeking:
+            self.rows[row.id] = row
+            for postings, key in self.keys(row):
+                postings[key] = postings.get(key, set()) | {row.id}
+
+    def remove(self, id):
+        row = self.rows.pop(id, None)
+        if row is not None:
+            for postings, key in self.keys(row):
+                remaining = postings[key] - {id}
+                if remaining:
+                    postings[key] = remaining
+                else:
+                    del postings[key]
+
+
+class MatchIndex:
+    """ Postings for seeking artists and venues, plus each artist's upcoming slot count """
+
+    def __init__(self, artists, venues, slots):
+        self.postings = {Artist: Postings(artists), Venue: Postings(venues)}
+        self.slots = slots
+
+    def update(self, model, id, row):
+        """ Re-indexes one artist or venue; row None removes it """
+        if row is None:
+            self.postings[model].remove(id)
+        else:
+            self.postings[model].add(row)
+
+    def scores(self, subject, model):
+        """ Returns {id: score} of the seeking model rows sharing a genre or the state with subject
+
+        Scores are accumulated posting by posting, so only candidates are
+        touched rather than every row.
+        """
+        postings = self.postings[model]
+        scores = defaultdict(float)
+        genres = set(subject.genres or ())
+        for genre in genres:
+            weight = GENRE_WEIGHT / len(genres)
+            for id in postings.genres.get(genre, ()):
+                scores[id] += weight
+        city, state = place_key(subject.city, subject.state)
+        for id in postings.states.get(state, ()):
+            scores[id] += STATE_WEIGHT
+        for id in postings.cities.get((city, state), ()):
+            scores[id] += CITY_WEIGHT
+        if model is Artist:
+            for id in scores:
+                scores[id] += AVAILABILITY_WEIGHT * min(self.slots.get(id, 0), AVAILABILITY_CAP) / AVAILABILITY_CAP
+        return scores
+
+    def top(self, subject, model, limit):
+        """ Returns the limit best (score, row) of model for subject, best first, ties by id """
+        best = heapq.nlargest(limit, self.scores(subject, model).items(), key=lambda item: (item[1], -item[0]))
+        rows = self.postings[model].rows
+        # A row re-indexed since scoring may have stopped seeking
+        return [(score, rows[id]) for id, score in best if id in rows]
+
+
+def build_index():
+    """ Reads the seeking artists and venues and the slot counts into a new MatchIndex
+
+    Reads on a connection of its own, so a build inside a request does not
+    leave the request's transaction idle.
+    """
+    with db.engine.connect() as connection:
+        artists, venues = (connection.execute(listing_select(model, seeking(model).is_(True))).all()
+                           for model in (Artist, Venue))
+        return MatchIndex(artists, venues, dict(connection.execute(slot_select()).all()))
+
+
+def build(generation):
+    """ Builds an index and makes it current unless invalidate ran since generation; hold _build_lock """
+    global _index, _pending
+    with _index_lock:
+        _pending = []
+    try:
+        index = build_index()
+    except Exception:
+        with _index_lock:
+            _pending = None
+        raise
+    with _index_lock:
+        pending, _pending = _pending, None
+        if generation == _generation:
+            for model, id in pending:
+                reindex(index, model, id)
+            _index = (time.monotonic(), index)
+    return index
+
+
+def rebuild(app, generation):
+    """ Builds a new index in the background while requests keep using the stale one """
+    global _rebuilding
+    try:
+        with app.app_context(), _build_lock:
+            build(generation)
+    except Exception:
+        app.logger.exception('match index rebuild failed')
+    finally:
+        with _index_lock:
+            _rebuilding = False
+
+
+def get_index():
+    """ Returns the in-process match index
+
+    Only the first call (or the first after invalidate) waits for a build.
+    Once the index is older than MATCH_INDEX_TTL it keeps being served while
+    a background thread builds its replacement.
+    """
+    global _rebuilding
+    ttl = current_app.config.get('MATCH_INDEX_TTL', 300)
+    with _index_lock:
+        entry = _index
+        if entry is not None and time.monotonic() - entry[0] > ttl and not _rebuilding:
+            _rebuilding = True
+            Thread(target=rebuild, args=(current_app._get_current_object(), _generation), daemon=True).start()
+    if entry is not None:
+        return entry[1]
+    with _build_lock:
+        with _index_lock:
+            if _index is not None:
+                return _index[1]
+            generation = _generation
+        return build(generation)
+
+
+def reindex(index, model, id):
+    rows = listing_rows(model, model.id == id)
+    index.update(model, id, rows[0] if rows else None)
+    if model is Artist:
+        index.slots[id] = slot_counts(ArtistAvailability.artist_id == id).get(id, 0)
+
+
+def refresh(model, id):
+    """ Re-indexes one artist or venue after a create or edit; a build under way re-indexes it too """
+    with _index_lock:
+        if _pending is not None:
+            _pending.append((model, id))
+        if _index is not None:
+            reindex(_index[1], model, id)
+
+
+def invalidate():
+    """ Drops the in-process index so the next match rebuilds it """
+    global _index, _generation
+    with _index_lock:
+        _index = None
+        _generation += 1
+
+# Matches.
+
+
+def reasons(subject, row, model, index):
+    """ Returns why row matched subject, for display """
+    shared = [genre for genre in row.genres or () if genre in set(subject.genres or ())]
+    city, state = place_key(subject.city, subject.state)
+    row_city, row_state = place_key(row.city, row.state)
+    return {
+        'shared_genres': shared,
+        'same_city': (row_city, row_state) == (city, state),
+        'same_state': row_state == state,
+        'upcoming_slots': index.slots.get(row.id, 0) if model is Artist else None,
+    }
+
+
+def matches(model, id, limit=None):
+    """ Returns (subject, counterparts best first) for the model row id, or None when it does not exist
+
+    Artists are matched with venues seeking talent, venues with artists
+    seeking venues; each counterpart has the row's fields, score and reasons.
+    """
+    limit = limit or current_app.config.get('MATCH_LIMIT', 20)
+    rows = listing_rows(model, model.id == id)
+    if not rows:
+        return None
+    subject, counterpart = rows[0], Venue if model is Artist else Artist
+    index = get_index()
+    return subject, [dict(id=row.id, name=row.name, city=row.city, state=row.state, genres=row.genres,
+                          image_link=row.image_link, score=round(score, 3), **reasons(subject, row, counterpart, index))
+                     for score, row in index.top(subject, counterpart, limit)]
@@ -97,6 +97,21 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # Index builds and backfills may outlast the app's statement timeout
+        connection.exec_driver_sql('SET statement_timeout = 0')
+        # the migrations skip indexes and constraints whose extension
+        # PostgreSQL lacks, so autogenerate must not add them back
+        available = {name for name, in connection.exec_driver_sql(
+            'SELECT name FROM pg_available_extensions')}
+        connection.commit()
+
+        def include_object(object, name, type_, reflected, compare_to):
+            extension = getattr(object, 'info', {}).get('extension')
+            return reflected or compare_to is not None or extension in (None, *available)
+
+        if conf_args.get("include_object") is None:
+            conf_args["include_object"] = include_object
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
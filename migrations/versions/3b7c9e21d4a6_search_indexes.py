@@ -0,0 +1,47 @@
+"""Search indexes
+
+Revision ID: 3b7c9e21d4a6
+Revises: f5ada8414c38
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7c9e21d4a6'
+down_revision = 'f5ada8414c38'
+branch_labels = None
+depends_on = None
+
+TRGM_COLUMNS = [('artists', 'name'), ('artists', 'city'), ('venues', 'name'), ('venues', 'city')]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.create_index('ix_artists_genres', 'artists', ['genres'], postgresql_using='gin')
+    op.create_index('ix_venues_genres', 'venues', ['genres'], postgresql_using='gin')
+
+    # pg_trgm ships with contrib; without it search.py uses its in-process index
+    available = bind.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )).scalar()
+    if not available:
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRGM_COLUMNS:
+        op.create_index(f'ix_{table}_{column}_trgm', table, [column],
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in TRGM_COLUMNS:
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_{column}_trgm')
+    op.drop_index('ix_venues_genres', table_name='venues')
+    op.drop_index('ix_artists_genres', table_name='artists')
@@ -0,0 +1,73 @@
+"""Add show end times and overlap constraints
+
+Revision ID: 5fa3c8e07b91
+Revises: e19b47c3a0d2
+Create Date: 2026-10-18 14:05:38.421067
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5fa3c8e07b91'
+down_revision = 'e19b47c3a0d2'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.env')
+
+# Matches the SHOW_DEFAULT_MINUTES default in config.py
+SHOW_MINUTES = 120
+
+
+def upgrade():
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.add_column(sa.Column('ends_at', sa.DateTime(), nullable=True))
+    op.execute(f"UPDATE shows SET ends_at = start_time + interval '{SHOW_MINUTES} minutes'")
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.alter_column('ends_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_shows_ends_after_start', 'ends_at > start_time')
+
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'])
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'])
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # The exclusion constraints need btree_gist for the "=" part; bookings.py
+    # also serializes bookings with row locks, so they are a second guard.
+    available = bind.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gist'"
+    )).scalar()
+    if not available:
+        logger.warning('btree_gist is not available, skipping show overlap constraints')
+        return
+    for column in ('artist_id', 'venue_id'):
+        overlaps = bind.execute(sa.text(
+            f'SELECT 1 FROM shows a JOIN shows b ON a.{column} = b.{column} AND a.id < b.id '
+            'AND a.start_time < b.ends_at AND b.start_time < a.ends_at LIMIT 1'
+        )).scalar()
+        if overlaps:
+            logger.warning('shows already overlap on %s, skipping its overlap constraint', column)
+            continue
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.create_exclude_constraint(
+            f"ex_shows_{column.split('_')[0]}_overlap", 'shows',
+            (column, '='), (sa.func.tsrange(sa.column('start_time'), sa.column('ends_at')), '&&'),
+            using='gist'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE shows DROP CONSTRAINT IF EXISTS ex_shows_venue_overlap')
+        op.execute('ALTER TABLE shows DROP CONSTRAINT IF EXISTS ex_shows_artist_overlap')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_constraint('ck_shows_ends_after_start', type_='check')
+        batch_op.drop_column('ends_at')
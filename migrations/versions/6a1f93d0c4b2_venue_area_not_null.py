@@ -0,0 +1,31 @@
+"""Make venue city and state required
+
+Revision ID: 6a1f93d0c4b2
+Revises: d58e0a7b3f16
+Create Date: 2026-10-18 21:42:09.317526
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f93d0c4b2'
+down_revision = 'd58e0a7b3f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Venues are paged by (state, city, id), and keyset comparisons skip NULL keys
+    op.execute("UPDATE venues SET state = coalesce(state, ''), city = coalesce(city, '') "
+               'WHERE state IS NULL OR city IS NULL')
+    with op.batch_alter_table('venues') as batch_op:
+        batch_op.alter_column('city', existing_type=sa.String(length=120), nullable=False)
+        batch_op.alter_column('state', existing_type=sa.String(length=120), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('venues') as batch_op:
+        batch_op.alter_column('state', existing_type=sa.String(length=120), nullable=True)
+        batch_op.alter_column('city', existing_type=sa.String(length=120), nullable=True)
@@ -0,0 +1,36 @@
+"""Keyset pagination indexes
+
+Revision ID: 8d41f0c2a7e5
+Revises: 3b7c9e21d4a6
+Create Date: 2026-10-18 10:02:17.604511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0c2a7e5'
+down_revision = '3b7c9e21d4a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset comparisons skip NULL keys, so created_at must always be set
+    op.execute('UPDATE artists SET created_at = now() WHERE created_at IS NULL')
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_artists_created_at_id', 'artists', ['created_at', 'id'])
+    op.create_index('ix_venues_state_city_id', 'venues', ['state', 'city', 'id'])
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_venues_state_city_id', table_name='venues')
+    op.drop_index('ix_artists_created_at_id', table_name='artists')
+
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
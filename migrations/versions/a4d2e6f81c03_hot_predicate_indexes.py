@@ -0,0 +1,42 @@
+"""Indexes for the hot query predicates
+
+Revision ID: a4d2e6f81c03
+Revises: 5fa3c8e07b91
+Create Date: 2026-10-18 16:48:09.215370
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d2e6f81c03'
+down_revision = '5fa3c8e07b91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # search() filters artists by city and state; venues already have this one
+    op.create_index('ix_artists_state_city_id', 'artists', ['state', 'city', 'id'])
+    # index() lists the ten newest venues
+    op.create_index('ix_venues_created_at_id', 'venues', ['created_at', 'id'])
+
+    # The detail pages read a listing's shows and their counterpart ids from
+    # these alone, and the upcoming counts are index-only range scans
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for column, counterpart in (('artist_id', 'venue_id'), ('venue_id', 'artist_id')):
+        op.drop_index(f'ix_shows_{column}_start_time', table_name='shows')
+        op.create_index(f'ix_shows_{column}_start_time', 'shows', [column, 'start_time'],
+                        postgresql_include=[counterpart, 'id'])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for column in ('venue_id', 'artist_id'):
+            op.drop_index(f'ix_shows_{column}_start_time', table_name='shows')
+            op.create_index(f'ix_shows_{column}_start_time', 'shows', [column, 'start_time'])
+
+    op.drop_index('ix_venues_created_at_id', table_name='venues')
+    op.drop_index('ix_artists_state_city_id', table_name='artists')
@@ -0,0 +1,52 @@
+"""Add the upcoming shows feed
+
+Revision ID: b7f3c1d92e48
+Revises: a4d2e6f81c03
+Create Date: 2026-10-18 18:21:44.903152
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3c1d92e48'
+down_revision = 'a4d2e6f81c03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upcoming_shows',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=True),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.Column('venue_name', sa.String(), nullable=True),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+    sa.ForeignKeyConstraint(['show_id'], ['shows.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.create_index('ix_upcoming_shows_start_time_show_id', 'upcoming_shows', ['start_time', 'show_id'])
+    op.create_index('ix_upcoming_shows_venue_id_start_time', 'upcoming_shows', ['venue_id', 'start_time'])
+
+    # Show times are naive local times, compared against the app's datetime.now()
+    op.execute(sa.text(
+        'INSERT INTO upcoming_shows (show_id, artist_id, venue_id, start_time, ends_at, '
+        'artist_name, artist_image_link, venue_name, venue_image_link) '
+        'SELECT shows.id, shows.artist_id, shows.venue_id, shows.start_time, shows.ends_at, '
+        'artists.name, artists.image_link, venues.name, venues.image_link '
+        'FROM shows JOIN artists ON artists.id = shows.artist_id JOIN venues ON venues.id = shows.venue_id '
+        'WHERE shows.start_time > :now'
+    ).bindparams(now=datetime.now()))
+
+
+def downgrade():
+    op.drop_index('ix_upcoming_shows_venue_id_start_time', table_name='upcoming_shows')
+    op.drop_index('ix_upcoming_shows_start_time_show_id', table_name='upcoming_shows')
+    op.drop_table('upcoming_shows')
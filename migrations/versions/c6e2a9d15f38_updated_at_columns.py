@@ -0,0 +1,32 @@
+"""Add updated_at columns
+
+Revision ID: c6e2a9d15f38
+Revises: 8d41f0c2a7e5
+Create Date: 2026-10-18 11:26:53.190862
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e2a9d15f38'
+down_revision = '8d41f0c2a7e5'
+branch_labels = None
+depends_on = None
+
+TABLES = ('artists', 'venues', 'shows')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
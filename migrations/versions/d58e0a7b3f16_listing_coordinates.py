@@ -0,0 +1,69 @@
+"""Add coordinates to artists and venues
+
+Revision ID: d58e0a7b3f16
+Revises: b7f3c1d92e48
+Create Date: 2026-10-18 20:07:31.558204
+
+"""
+import csv
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58e0a7b3f16'
+down_revision = 'b7f3c1d92e48'
+branch_labels = None
+depends_on = None
+
+GAZETTEER = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'gazetteer.csv')
+
+
+def upgrade():
+    for table in ('artists', 'venues'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+            batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+    # Matches geo.place_key: collapsed, case-insensitive city and upper-case state
+    with open(GAZETTEER, newline='', encoding='utf-8') as f:
+        places = [{
+            'city': ' '.join(row['city'].split()).casefold(),
+            'state': row['state'].strip().upper(),
+            'latitude': float(row['latitude']),
+            'longitude': float(row['longitude'])
+        } for row in csv.DictReader(f)]
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # No regexp_replace or point GiST index: match the keys in Python and
+        # leave nearby search to scan
+        coordinates = {(place['city'], place['state']): place for place in places}
+        for table in ('artists', 'venues'):
+            matched = []
+            for id, city, state in bind.execute(sa.text(f'SELECT id, city, state FROM {table}')):
+                key = (' '.join((city or '').split()).casefold(), (state or '').strip().upper())
+                if key in coordinates:
+                    matched.append(dict(coordinates[key], id=id))
+            if matched:
+                bind.execute(sa.text(
+                    f'UPDATE {table} SET latitude = :latitude, longitude = :longitude WHERE id = :id'
+                ), matched)
+        return
+
+    for table in ('artists', 'venues'):
+        bind.execute(sa.text(
+            f'UPDATE {table} SET latitude = :latitude, longitude = :longitude '
+            "WHERE lower(regexp_replace(trim(city), '\\s+', ' ', 'g')) = :city AND upper(trim(state)) = :state"
+        ), places)
+
+    op.create_index('ix_venues_location', 'venues', [sa.text('point(longitude, latitude)')], postgresql_using='gist')
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_venues_location')
+    for table in ('venues', 'artists'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
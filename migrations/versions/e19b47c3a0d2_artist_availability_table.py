@@ -0,0 +1,81 @@
+"""Move artist availability into its own table
+
+Revision ID: e19b47c3a0d2
+Revises: c6e2a9d15f38
+Create Date: 2026-10-18 12:40:05.772913
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b47c3a0d2'
+down_revision = 'c6e2a9d15f38'
+branch_labels = None
+depends_on = None
+
+# Matches the AVAILABILITY_SLOT_MINUTES default in config.py
+SLOT_MINUTES = 60
+
+artists = sa.table('artists', sa.column('id', sa.Integer), sa.column('availability', sa.JSON))
+slots = sa.table(
+    'artist_availability',
+    sa.column('artist_id', sa.Integer),
+    sa.column('starts_at', sa.DateTime),
+    sa.column('ends_at', sa.DateTime)
+)
+
+
+def upgrade():
+    op.create_table('artist_availability',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artists.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('artist_id', 'starts_at', name='uq_artist_availability_artist_id_starts_at')
+    )
+    op.create_index('ix_artist_availability_starts_at_ends_at', 'artist_availability', ['starts_at', 'ends_at'])
+
+    bind = op.get_bind()
+    rows = []
+    for artist_id, availability in bind.execute(sa.select(artists.c.id, artists.c.availability)):
+        starts = set()
+        for slot in availability or []:
+            try:
+                starts.add(datetime.strptime(f"{slot['date']} {slot['start_time']}", "%Y-%m-%d %H:%M"))
+            except (KeyError, TypeError, ValueError):
+                continue
+        rows.extend({
+            'artist_id': artist_id,
+            'starts_at': starts_at,
+            'ends_at': starts_at + timedelta(minutes=SLOT_MINUTES)
+        } for starts_at in sorted(starts))
+    if rows:
+        op.bulk_insert(slots, rows)
+
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.drop_column('availability')
+
+
+def downgrade():
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.add_column(sa.Column('availability', sa.JSON(), nullable=True))
+
+    bind = op.get_bind()
+    availability = {}
+    query = sa.select(slots.c.artist_id, slots.c.starts_at).order_by(slots.c.artist_id, slots.c.starts_at)
+    for artist_id, starts_at in bind.execute(query):
+        availability.setdefault(artist_id, []).append({
+            'date': starts_at.strftime('%Y-%m-%d'),
+            'start_time': starts_at.strftime('%H:%M')
+        })
+    for artist_id, entries in availability.items():
+        bind.execute(artists.update().where(artists.c.id == artist_id).values(availability=entries))
+
+    op.drop_index('ix_artist_availability_starts_at_ends_at', table_name='artist_availability')
+    op.drop_table('artist_availability')
@@ -3,10 +3,37 @@ Artist, Venue and Show models
 """
 # Imports
 
+from datetime import timedelta
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import ARRAY, JSON
+from sqlalchemy import ARRAY, DDL, event
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
+
+from pool_metrics import InstrumentedQueuePool
+from replicas import RoutingSession
+
+db = SQLAlchemy(engine_options={'poolclass': InstrumentedQueuePool}, session_options={'class_': RoutingSession})
+
+
+def extension_available(name):
+    """ A DDL condition: PostgreSQL can install the extension, as the migrations check before using it """
+    def available(ddl, target, bind, **kw):
+        return bind is not None and bind.execute(
+            db.text('SELECT 1 FROM pg_available_extensions WHERE name = :name'), {'name': name}).scalar() is not None
+    return available
+
+
+def needs_extension(name, item):
+    """ Creates the index or constraint only where the extension is available, like the migrations do """
+    item.info['extension'] = name
+    item.ddl_if(dialect='postgresql', callable_=extension_available(name))
+    return item
+
 
-db = SQLAlchemy()
+for name in ('pg_trgm', 'btree_gist'):
+    event.listen(db.metadata, 'before_create', DDL(f'CREATE EXTENSION IF NOT EXISTS {name}').execute_if(
+        dialect='postgresql', callable_=extension_available(name)))
 
 # Models.
 
@@ -14,6 +41,15 @@ db = SQLAlchemy()
 class Artist(db.Model):
     """ Artist Model"""
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        needs_extension('pg_trgm', db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                                            postgresql_ops={'name': 'gin_trgm_ops'})),
+        needs_extension('pg_trgm', db.Index('ix_artists_city_trgm', 'city', postgresql_using='gin',
+                                            postgresql_ops={'city': 'gin_trgm_ops'})),
+        db.Index('ix_artists_created_at_id', 'created_at', 'id'),
+        db.Index('ix_artists_state_city_id', 'state', 'city', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -26,11 +62,15 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
-    availability = db.Column(JSON)
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=db.func.now(), onupdate=db.func.now())
 
     venues = db.relationship('Venue', secondary='shows')
-    shows = db.relationship('Show', backref=('artists'),lazy='joined',cascade ="all,delete" )
+    shows = db.relationship('Show', backref=('artists'),lazy='select',cascade ="all,delete" )
+    availability = db.relationship('ArtistAvailability', order_by='ArtistAvailability.starts_at',
+                                   cascade='all, delete-orphan', passive_deletes=True)
 
     def to_dict(self):
         """ Returns a dictinary of artists """
@@ -40,27 +80,63 @@ class Artist(db.Model):
             'city': self.city,
             'state': self.state,
             'phone': self.phone,
-            'genres': self.genres.split(','), 
+            'genres': list(self.genres or []),
             'image_link': self.image_link,
             'facebook_link': self.facebook_link,
             'website_link': self.website_link,
             'seeking_venue': self.seeking_venue,
             'seeking_description': self.seeking_description,
-            'availability' :self.availability,
+            'availability': [slot.to_dict() for slot in self.availability],
         }
         
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
 
+class ArtistAvailability(db.Model):
+    """ Artist Availability Model """
+    __tablename__ = 'artist_availability'
+    __table_args__ = (
+        db.UniqueConstraint('artist_id', 'starts_at', name='uq_artist_availability_artist_id_starts_at'),
+        db.Index('ix_artist_availability_starts_at_ends_at', 'starts_at', 'ends_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey(
+        'artists.id', ondelete='CASCADE'), nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        """ Returns a dictinary of the availability slot """
+        return {
+            'starts_at': self.starts_at.isoformat(),
+            'ends_at': self.ends_at.isoformat(),
+        }
+
+    def __repr__(self):
+        return f'<ArtistAvailability {self.artist_id} {self.starts_at}>'
+
+
 class Venue(db.Model):
     """ Venue Model """
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        needs_extension('pg_trgm', db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                                            postgresql_ops={'name': 'gin_trgm_ops'})),
+        needs_extension('pg_trgm', db.Index('ix_venues_city_trgm', 'city', postgresql_using='gin',
+                                            postgresql_ops={'city': 'gin_trgm_ops'})),
+        db.Index('ix_venues_state_city_id', 'state', 'city', 'id'),
+        db.Index('ix_venues_created_at_id', 'created_at', 'id'),
+        db.Index('ix_venues_location', db.text('point(longitude, latitude)'),
+                 postgresql_using='gist').ddl_if(dialect='postgresql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     genres = db.Column(ARRAY(db.String))
@@ -69,10 +145,13 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(120))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=db.func.now(), onupdate=db.func.now())
 
     artists = db.relationship('Artist', secondary='shows')
-    shows = db.relationship('Show', backref=('venues') ,lazy='joined', cascade ="all,delete")
+    shows = db.relationship('Show', backref=('venues') ,lazy='select', cascade ="all,delete")
 
     def to_dict(self):
         """ Returns a dictinary of venues """
@@ -83,7 +162,7 @@ class Venue(db.Model):
             'state': self.state,
             'address': self.address,
             'phone': self.phone,
-            'genres': self.genres.split(','), 
+            'genres': list(self.genres or []),
             'image_link': self.image_link,
             'facebook_link': self.facebook_link,
             'website_link': self.website_link,
@@ -95,9 +174,27 @@ class Venue(db.Model):
         return f'<Venue {self.id} {self.name}>'
 
 
+def default_ends_at(context):
+    """ Shows listed without an end time last SHOW_DEFAULT_MINUTES """
+    minutes = current_app.config.get('SHOW_DEFAULT_MINUTES', 120)
+    return context.get_current_parameters()['start_time'] + timedelta(minutes=minutes)
+
+
 class Show(db.Model):
     """ Show Model """
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time', postgresql_include=['venue_id', 'id']),
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time', postgresql_include=['artist_id', 'id']),
+        db.CheckConstraint('ends_at > start_time', name='ck_shows_ends_after_start'),
+        needs_extension('btree_gist', ExcludeConstraint(
+            ('artist_id', '='), (db.func.tsrange(db.column('start_time'), db.column('ends_at')), '&&'),
+            name='ex_shows_artist_overlap', using='gist')),
+        needs_extension('btree_gist', ExcludeConstraint(
+            ('venue_id', '='), (db.func.tsrange(db.column('start_time'), db.column('ends_at')), '&&'),
+            name='ex_shows_venue_overlap', using='gist')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
@@ -105,6 +202,8 @@ class Show(db.Model):
     venue_id = db.Column(db.Integer, db.ForeignKey(
         'venues.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False, default=default_ends_at)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=db.func.now(), onupdate=db.func.now())
 
     venue = db.relationship('Venue')
     artist = db.relationship('Artist')
@@ -125,4 +224,29 @@ class Show(db.Model):
             'venue_name': self.venue.name,
             'venue_image_link': self.venue.image_link,
             'start_time': self.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+
+class UpcomingShow(db.Model):
+    """ Upcoming Show Model: the shows feed, with the artist and venue fields it lists
+
+    Maintained by feed.py; rows stay until `flask feed expire` removes them,
+    so readers still filter on start_time.
+    """
+    __tablename__ = 'upcoming_shows'
+    __table_args__ = (
+        db.Index('ix_upcoming_shows_start_time_show_id', 'start_time', 'show_id'),
+        db.Index('ix_upcoming_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    )
+
+    show_id = db.Column(db.Integer, db.ForeignKey('shows.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    artist_name = db.Column(db.String)
+    artist_image_link = db.Column(db.String(500))
+    venue_name = db.Column(db.String)
+    venue_image_link = db.Column(db.String(500))
+
+    def __repr__(self):
+        return f'<UpcomingShow {self.show_id} {self.start_time}>'
@@ -0,0 +1,106 @@
+"""
+Keyset (cursor) pagination for the listing routes
+"""
+# Imports
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+
+# Cursors.
+
+
+def encode_cursor(direction, values):
+    """ Returns an opaque page token for the key values of a boundary row """
+    payload = json.dumps([direction, [v.isoformat() if isinstance(v, datetime) else v for v in values]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """ Returns (direction, values) from a page token, aborting with 400 when it is malformed """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev') or len(values) != len(columns):
+            raise ValueError(token)
+        return direction, [cursor_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError, binascii.Error, NotImplementedError):
+        abort(400, 'Invalid page cursor.')
+
+
+def cursor_value(column, value):
+    """ Returns a cursor value as the Python type of its column, raising ValueError when it is not one """
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if not isinstance(value, python_type) or isinstance(value, bool):
+        raise ValueError(value)
+    return value
+
+# Pages.
+
+
+class Page:
+    """ One page of rows plus the tokens of its neighbours """
+
+    def __init__(self, items, next_token=None, prev_token=None):
+        self.items = items
+        self.next_token = next_token
+        self.prev_token = prev_token
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def keyset_page(query, columns, token=None, page_size=None):
+    """ Returns the Page of query after (or before) the token, ordered by columns
+
+    columns must end with a unique column, and each must be readable by its key
+    from the rows, so that the boundary rows can be turned into tokens.
+    """
+    page_size = page_size or current_app.config.get('PAGE_SIZE', 50)
+    direction, values = decode_cursor(token, columns) if token else ('next', None)
+
+    key = tuple_(*columns)
+    if direction == 'next':
+        if values is not None:
+            query = query.filter(key > tuple(values))
+        rows = query.order_by(*columns).limit(page_size + 1).all()
+    else:
+        query = query.filter(key < tuple(values))
+        rows = query.order_by(*(column.desc() for column in columns)).limit(page_size + 1).all()
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'prev':
+        rows.reverse()
+    if not rows:
+        return Page(rows)
+
+    def cursor(row, towards):
+        return encode_cursor(towards, [getattr(row, column.key) for column in columns])
+
+    has_next = more if direction == 'next' else True
+    has_prev = values is not None if direction == 'next' else more
+    return Page(
+        rows,
+        next_token=cursor(rows[-1], 'next') if has_next else None,
+        prev_token=cursor(rows[0], 'prev') if has_prev else None
+    )
+
+
+def next_offset(count, offset, page_length):
+    """ Returns the offset of the next page of an offset-paginated result, if any """
+    return offset + page_length if offset + page_length < count else None
+
+
+def past_shows_page():
+    """ Returns the show_listing window arguments for the ?past_page= of a detail page """
+    config = current_app.config
+    limit = config['PAST_SHOWS_PER_PAGE']
+    page = max(request.args.get('past_page', 1, type=int), 1)
+    return {'past_offset': (page - 1) * limit, 'past_limit': limit, 'upcoming_limit': config['UPCOMING_SHOWS_LIMIT']}
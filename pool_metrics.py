@@ -0,0 +1,138 @@
+"""
+Connection pool instrumentation and request-scoped session lifecycle
+"""
+# Imports
+
+import logging
+import time
+from threading import Lock
+
+from flask import request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Pools.
+
+
+class PoolStats:
+    """ Checkout counters and wait times of one pool, kept across pool recreation """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_max = 0
+
+    def record_wait(self, seconds, overflow):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.overflow_max = max(self.overflow_max, overflow)
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+
+class InstrumentedPool:
+    """ Pool mixin timing how long each checkout waits for a connection """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        self.stats.record_wait(time.perf_counter() - started, max(self.overflow(), 0))
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def metrics(self):
+        stats = self.stats
+        with stats.lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'overflow': max(self.overflow(), 0),
+                'overflow_max': stats.overflow_max,
+                'checkouts': stats.checkouts,
+                'timeouts': stats.timeouts,
+                'wait_avg_ms': round(stats.wait_total / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+                'wait_max_ms': round(stats.wait_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(InstrumentedPool, QueuePool):
+    """ QueuePool with checkout statistics """
+
+
+class InstrumentedAsyncPool(InstrumentedPool, AsyncAdaptedQueuePool):
+    """ AsyncAdaptedQueuePool with checkout statistics """
+
+
+def pool_metrics(engine):
+    """ Returns the checkout statistics of an engine's pool, or {} for other pool classes """
+    pool = engine.pool
+    return pool.metrics() if isinstance(pool, InstrumentedPool) else {}
+
+# Sessions.
+
+
+class SessionLifecycle:
+    """ Ends the request's session at teardown, counting the ones left mid-transaction
+
+    Flask-SQLAlchemy removes the scoped session when the app context ends; this
+    teardown runs just before that and rolls back explicitly, so a handler
+    that returns without committing or rolling back gives its connection back
+    at once and is counted as a leaked session. Flushed writes leave nothing
+    pending, so a flush marks the session's info until it commits or rolls
+    back.
+    """
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.leaked = 0
+        self.lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Teardowns run in reverse order, so this one runs before Flask-SQLAlchemy's
+        app.teardown_appcontext(self.teardown)
+        event.listen(self.db.session, 'after_flush', self.flushed)
+        event.listen(self.db.session, 'after_commit', self.ended)
+        event.listen(self.db.session, 'after_rollback', self.ended)
+        app.extensions['session_lifecycle'] = self
+
+    def flushed(self, session, flush_context):
+        session.info['flushed'] = True
+
+    def ended(self, session):
+        session.info.pop('flushed', None)
+
+    def teardown(self, error=None):
+        if not self.db.session.registry.has():
+            return
+        session = self.db.session()
+        flushed = session.in_transaction() and session.info.get('flushed')
+        if session.new or session.dirty or session.deleted or flushed:
+            with self.lock:
+                self.leaked += 1
+            logger.warning('Session left with uncommitted changes at the end of %s',
+                           request.endpoint if request else 'an app context')
+        if session.in_transaction():
+            session.rollback()
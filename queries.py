@@ -0,0 +1,236 @@
+"""
+Read queries shared by the routes
+"""
+# Imports
+
+from datetime import datetime
+
+from sqlalchemy.orm import load_only, raiseload
+
+from models import db, Artist, ArtistAvailability, Venue, Show, UpcomingShow
+
+# Loader profiles.
+# Column names to load per profile; None loads every column. Relationships
+# are never loaded implicitly, routes query shows explicitly when needed.
+LOADER_PROFILES = {
+    'list': ('id', 'name', 'city', 'state', 'image_link', 'created_at'),
+    'detail': None,
+}
+
+
+def loader_options(model, profile):
+    """ Returns the query options for a named loader profile """
+    if profile not in LOADER_PROFILES:
+        raise ValueError(f'Unknown loader profile: {profile}')
+    columns = LOADER_PROFILES[profile]
+    options = [raiseload('*')]
+    if columns is not None:
+        options.append(load_only(*(getattr(model, name) for name in columns)))
+    return options
+
+
+def load(model, profile):
+    """ Returns a query for model using the named loader profile """
+    return model.query.options(*loader_options(model, profile))
+
+# Queries.
+
+
+def upcoming_shows_count(now=None):
+    """ Returns a subquery counting the shows after now at the enclosing query's venue
+
+    Correlated per venue, it is an index-only scan of the upcoming shows feed,
+    so a page of venues never aggregates the whole shows table.
+    """
+    now = now or datetime.now()
+    return db.session.query(db.func.count()).filter(
+        UpcomingShow.venue_id == Venue.id,
+        UpcomingShow.start_time > now
+    ).scalar_subquery()
+
+
+def venue_query(*criteria, now=None):
+    """ Returns a query of id, name, city, state and num_upcoming_shows for matching venues """
+    return db.session.query(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        upcoming_shows_count(now).label('num_upcoming_shows')
+    ).filter(*criteria)
+
+
+def venue_rows(*criteria, now=None):
+    """ Returns the rows of venue_query ordered by state, city and id """
+    return venue_query(*criteria, now=now).order_by(Venue.state, Venue.city, Venue.id).all()
+
+
+def group_by_area(rows):
+    """ Returns venue rows grouped by (city, state), keeping their order """
+    areas = {}
+    for row in rows:
+        area = areas.setdefault((row.city, row.state), {
+            'city': row.city,
+            'state': row.state,
+            'venues': []
+        })
+        area['venues'].append({
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        })
+    return list(areas.values())
+
+
+def venue_areas(*criteria, now=None):
+    """ Returns the venues grouped by (city, state) with their upcoming show counts """
+    return group_by_area(venue_rows(*criteria, now=now))
+
+
+def show_listing_query(fk, id, counterpart, counterpart_fk, now, past_offset=0, past_limit=None, upcoming_limit=None):
+    """ Returns the query ranking the shows of one artist or venue on each side of now
+
+    Window functions number and count the shows on each side, so only the
+    soonest upcoming and the requested page of most recent past shows are
+    returned, while the counts still cover every show.
+    """
+    is_past = Show.start_time <= now
+    ranked = db.session.query(
+        Show.start_time,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link,
+        is_past.label('is_past'),
+        db.func.row_number().over(partition_by=is_past, order_by=(Show.start_time, Show.id)).label('soonest'),
+        db.func.row_number().over(partition_by=is_past, order_by=(Show.start_time.desc(), Show.id.desc())).label('latest'),
+        db.func.count().over(partition_by=is_past).label('total')
+    ).join(counterpart, counterpart.id == counterpart_fk) \
+        .filter(fk == id) \
+        .subquery()
+
+    upcoming_window = ~ranked.c.is_past
+    if upcoming_limit is not None:
+        upcoming_window = db.and_(upcoming_window, ranked.c.soonest <= upcoming_limit)
+    past_window = db.and_(ranked.c.is_past, ranked.c.latest > past_offset)
+    if past_limit is not None:
+        past_window = db.and_(past_window, ranked.c.latest <= past_offset + past_limit)
+
+    return db.session.query(ranked).filter(db.or_(upcoming_window, past_window)) \
+        .order_by(ranked.c.is_past, ranked.c.soonest, ranked.c.latest)
+
+
+def past_shows_count_query(fk, id, now):
+    """ Returns the query counting the past shows of one artist or venue """
+    return db.session.query(db.func.count(Show.id)).filter(fk == id, Show.start_time <= now)
+
+
+def show_listing_result(rows, prefix):
+    """ Returns the past and upcoming shows and their counts from the rows of show_listing_query """
+    past, upcoming, counts = [], [], {True: 0, False: 0}
+    for row in rows:
+        counts[row.is_past] = row.total
+        (past if row.is_past else upcoming).append({
+            f'{prefix}_id': row.id,
+            f'{prefix}_name': row.name,
+            f'{prefix}_image_link': row.image_link,
+            'start_time': row.start_time
+        })
+    past.reverse()
+    return {
+        'past_shows': past,
+        'upcoming_shows': upcoming,
+        'past_shows_count': counts[True],
+        'upcoming_shows_count': counts[False]
+    }
+
+
+def show_listing(fk, id, counterpart, counterpart_fk, prefix, now=None, past_offset=0, past_limit=None, upcoming_limit=None):
+    """ Returns the upcoming and past shows of one artist or venue with their counts """
+    now = now or datetime.now()
+    rows = show_listing_query(fk, id, counterpart, counterpart_fk, now, past_offset, past_limit, upcoming_limit)
+    listing = show_listing_result(rows, prefix)
+    # A page past the last one has no rows to carry the past count
+    if not listing['past_shows'] and past_offset:
+        listing['past_shows_count'] = past_shows_count_query(fk, id, now).scalar()
+    return listing
+
+
+def artist_shows(artist_id, **kwargs):
+    """ Returns the upcoming and past shows of an artist, with their venues """
+    return show_listing(Show.artist_id, artist_id, Venue, Show.venue_id, 'venue', **kwargs)
+
+
+def venue_shows(venue_id, **kwargs):
+    """ Returns the upcoming and past shows at a venue, with their artists """
+    return show_listing(Show.venue_id, venue_id, Artist, Show.artist_id, 'artist', **kwargs)
+
+
+# Versions.
+# Each returns (last_modified, parts) for the conditional decorator, where
+# last_modified is the latest change that shows on the page. A show moving
+# from upcoming to past changes the page at its start_time, so past start
+# times count as modifications too.
+
+
+def latest(*values):
+    """ Returns the latest of the non-null values """
+    return max((value for value in values if value is not None), default=None)
+
+
+def detail_version(model, fk, other, other_fk, id, now=None, extra=()):
+    """ Returns the version of a detail page listing the shows of model joined to other
+
+    extra columns are appended to the version; datetimes among them also count
+    as modification times.
+    """
+    now = now or datetime.now()
+    row = db.session.query(
+        model.updated_at,
+        db.func.max(Show.updated_at),
+        db.func.max(other.updated_at),
+        db.func.max(Show.start_time).filter(Show.start_time <= now),
+        db.func.count(Show.id).filter(Show.start_time <= now),
+        db.func.count(Show.id),
+        *extra
+    ).outerjoin(Show, fk == model.id) \
+        .outerjoin(other, other.id == other_fk) \
+        .filter(model.id == id) \
+        .group_by(model.id) \
+        .first()
+    if row is None:
+        return None
+    return latest(*row[:4], *(value for value in row[6:] if isinstance(value, datetime))), tuple(row)
+
+
+def artist_version(artist_id, now=None):
+    """ Returns the version of an artist page from its row, shows, their venues and elapsed slots """
+    now = now or datetime.now()
+    elapsed = db.session.query(ArtistAvailability).filter(
+        ArtistAvailability.artist_id == Artist.id,
+        ArtistAvailability.starts_at <= now
+    )
+    return detail_version(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now, extra=(
+        elapsed.with_entities(db.func.max(ArtistAvailability.starts_at)).scalar_subquery(),
+        elapsed.with_entities(db.func.count(ArtistAvailability.id)).scalar_subquery()
+    ))
+
+
+def venue_version(venue_id, now=None):
+    """ Returns the version of a venue page from its row, shows and their artists """
+    return detail_version(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now)
+
+
+def shows_version(now=None):
+    """ Returns the version of the shows listing from the latest show, artist and venue change
+
+    The listing drops a show when it starts, so the latest start time so far
+    counts as a change too.
+    """
+    now = now or datetime.now()
+    row = db.session.query(
+        db.session.query(db.func.max(Show.updated_at)).scalar_subquery(),
+        db.session.query(db.func.max(Artist.updated_at)).scalar_subquery(),
+        db.session.query(db.func.max(Venue.updated_at)).scalar_subquery(),
+        db.session.query(db.func.max(Show.start_time)).filter(Show.start_time <= now).scalar_subquery()
+    ).one()
+    return latest(*row), tuple(row)
@@ -0,0 +1,99 @@
+"""
+Primary / read-replica routing for the Flask-SQLAlchemy session
+"""
+# Imports
+
+import re
+import time
+
+from flask import after_this_request, current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.ddl import DDLElement
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Textual SQL reads from the replica only when it is a plain SELECT
+TEXT_READ = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+TEXT_LOCK = re.compile(r'\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE)\b|\bFOR\s+KEY\s+SHARE\b', re.IGNORECASE)
+
+# A plain cookie rather than the signed session, so every worker can read it
+# whatever its SECRET_KEY; a forged one only sends its client to the primary
+STICKY_COOKIE = 'primary_until'
+
+# Routing.
+
+
+def is_write(clause):
+    """ Returns True for INSERT / UPDATE / DELETE, DDL, SELECT ... FOR UPDATE and textual SQL but a plain SELECT """
+    if isinstance(clause, TextClause):
+        return not TEXT_READ.match(clause.text) or TEXT_LOCK.search(clause.text) is not None
+    return isinstance(clause, (UpdateBase, DDLElement)) or getattr(clause, '_for_update_arg', None) is not None
+
+
+def sticky():
+    """ Returns True within DB_REPLICA_STICKY_SECONDS of the current client's last write """
+    if not has_request_context():
+        return False
+    try:
+        primary_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    return primary_until >= time.time()
+
+
+def reads_from_replica():
+    """ Returns True when the current request may read from the replica
+
+    Only GET and HEAD requests do, and not for DB_REPLICA_STICKY_SECONDS after
+    the same client's last write, so it reads what it has just written.
+    """
+    return has_request_context() and request.method in READ_METHODS and not sticky()
+
+
+def stick_to_primary(response):
+    """ Sets the sticky cookie of the request's last committed write """
+    seconds = current_app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+    response.set_cookie(STICKY_COOKIE, f'{g._primary_until:.3f}', max_age=int(seconds) + 1, httponly=True,
+                        samesite='Lax')
+    return response
+
+
+class RoutingSession(Session):
+    """ Session sending the reads of GET requests to the replica bind, if one is configured
+
+    Writes, and every statement after the session's first write, go to the
+    primary; so do models with their own bind_key. A request that read from
+    the replica has g.read_replica set.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        engine = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if is_write(clause):
+            self.info['wrote'] = True
+
+        engines = self._db.engines
+        if self.info.get('wrote') or engine is not engines.get(None):
+            return engine
+        replica = engines.get(current_app.config.get('REPLICA_BIND', 'replica'))
+        if replica is None or not reads_from_replica():
+            return engine
+        g.read_replica = True
+        return replica
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def flushing(session, flush_context, instances):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def committed(session):
+    if session.info.get('wrote') and has_request_context():
+        if '_primary_until' not in g:
+            after_this_request(stick_to_primary)
+        g._primary_until = time.time() + current_app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
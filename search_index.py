@@ -0,0 +1,263 @@
+"""
+Ranked name, city and genre search for artists and venues
+"""
+# Imports
+
+import math
+import time
+from collections import defaultdict
+from threading import Lock, Thread
+
+from flask import current_app
+from sqlalchemy import case, func, or_, select, type_coerce
+
+from enums import Genre
+from genres import genre_filter, matches_genres
+from models import db
+
+_trgm_available = {}
+_indexes = {}  # table -> (built at, NgramIndex); built at is -inf once invalidated
+_indexes_lock = Lock()
+_build_lock = Lock()
+_building = set()
+_generations = defaultdict(int)  # table -> invalidations so far
+
+# Helpers.
+
+
+def escape_like(term):
+    """ Escapes LIKE wildcards so the term matches literally """
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def matching_genres(term):
+    """ Returns the Genre names whose name or label contains term """
+    needle = term.lower()
+    return [genre.name for genre in Genre if needle in genre.name.lower() or needle in genre.value.lower()]
+
+
+def trigrams(text):
+    """ Returns the pg_trgm style trigrams of every word in text """
+    grams = set()
+    for word in (text or '').lower().split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """ Returns the trigram similarity of a and b, like pg_trgm's similarity() """
+    return gram_similarity(trigrams(a), trigrams(b))
+
+
+def gram_similarity(a, b):
+    """ Returns the similarity of two trigram sets """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def backend():
+    """ Returns 'trigram' when pg_trgm can serve the search, 'ilike' on Postgres without it, else 'ngram' """
+    configured = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if configured != 'auto':
+        return configured
+    engine = db.engine
+    if engine.url not in _trgm_available:
+        available = False
+        if engine.dialect.name == 'postgresql':
+            with engine.connect() as connection:
+                available = bool(connection.execute(db.text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                )).scalar())
+        _trgm_available[engine.url] = available
+    if _trgm_available[engine.url]:
+        return 'trigram'
+    return 'ilike' if engine.dialect.name == 'postgresql' else 'ngram'
+
+# Postgres search.
+
+
+def term_search(model, term, limit, offset, filters=(), similar=True):
+    """ Ranks the rows whose name or city contains term, or having a genre it names
+
+    With similar, name and city matches rank by pg_trgm similarity to term
+    and the GIN indexes serve ILIKE and &&; without, a name match ranks above
+    a city match. filters are further criteria every match must meet.
+    """
+    pattern = f'%{escape_like(term)}%'
+    name_match, city_match = model.name.ilike(pattern, escape='\\'), model.city.ilike(pattern, escape='\\')
+    criteria = [name_match, city_match]
+    if similar:
+        rank = func.similarity(model.name, term) + func.similarity(model.city, term) * 0.5
+    else:
+        rank = case((name_match, 1.0), else_=0.0) + case((city_match, 0.5), else_=0.0)
+
+    genres = matching_genres(term)
+    if genres:
+        genre_match = model.genres.op('&&')(type_coerce(genres, model.genres.type))
+        criteria.append(genre_match)
+        rank = rank + case((genre_match, 0.25), else_=0)
+
+    return paged(model, [or_(*criteria), *filters], (rank.desc(), model.name, model.id), limit, offset)
+
+
+def paged(model, criteria, order_by, limit, offset):
+    """ Returns (total, rows) of one page of the model rows meeting criteria """
+    rows = db.session.query(
+        model.id,
+        model.name,
+        model.city,
+        model.state,
+        func.count().over().label('total')
+    ).filter(*criteria) \
+        .order_by(*order_by) \
+        .limit(limit) \
+        .offset(offset) \
+        .all()
+    total = rows[0].total if rows else 0
+    if not rows and offset:
+        total = db.session.query(func.count(model.id)).filter(*criteria).scalar()
+    return total, rows
+
+# In-process n-gram search.
+
+
+class NgramIndex:
+    """ Trigram posting lists over name and city, plus a genre -> ids map """
+
+    def __init__(self, rows):
+        self.rows = {row.id: row for row in rows}
+        self.by_name = None
+        self.grams = defaultdict(set)
+        self.genres = defaultdict(set)
+        for row in rows:
+            for gram in trigrams(row.name) | trigrams(row.city):
+                self.grams[gram].add(row.id)
+            for genre in row.genres or ():
+                self.genres[genre].add(row.id)
+
+    def candidates(self, needle):
+        """ Returns the ids whose name or city may contain needle """
+        grams = {needle[i:i + 3] for i in range(len(needle) - 2) if ' ' not in needle[i:i + 3]}
+        if not grams:
+            return set(self.rows)
+        postings = sorted((self.grams.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*postings)
+
+    def search(self, term):
+        """ Returns the matching rows, best first """
+        needle = term.lower().strip()
+        term_grams = trigrams(term)
+        # Cities repeat across rows, so each one's trigrams are computed once per search
+        city_grams = {}
+        scored = []
+        for id in self.candidates(needle):
+            row = self.rows[id]
+            name, city = (row.name or '').lower(), (row.city or '').lower()
+            if needle in name or needle in city:
+                if city not in city_grams:
+                    city_grams[city] = trigrams(city)
+                score = gram_similarity(trigrams(name), term_grams) + \
+                    gram_similarity(city_grams[city], term_grams) * 0.5
+                scored.append((score, row))
+
+        genre_ids = set()
+        for genre in matching_genres(term):
+            genre_ids |= self.genres.get(genre, set())
+        matched = {row.id for _, row in scored}
+        scored = [(score + (0.25 if row.id in genre_ids else 0), row) for score, row in scored]
+        scored.extend((0.25, self.rows[id]) for id in genre_ids - matched)
+
+        scored.sort(key=lambda item: (-item[0], item[1].name or '', item[1].id))
+        return [row for _, row in scored]
+
+    def listing(self):
+        """ Returns every row by name, as an empty search lists them; sorted once per index """
+        if self.by_name is None:
+            self.by_name = sorted(self.rows.values(), key=lambda row: (row.name or '', row.id))
+        return self.by_name
+
+
+def build(model):
+    """ Reads the model's rows into a new NgramIndex and makes it current
+
+    Reads on a connection of its own, so a build inside a request does not
+    leave the request's transaction idle. An index whose build began before
+    an invalidate() is installed already stale.
+    """
+    table = model.__tablename__
+    with _indexes_lock:
+        generation = _generations[table]
+    with db.engine.connect() as connection:
+        rows = connection.execute(select(model.id, model.name, model.city, model.state, model.genres)).all()
+    index = NgramIndex(rows)
+    with _indexes_lock:
+        _indexes[table] = (time.monotonic() if _generations[table] == generation else -math.inf, index)
+    return index
+
+
+def rebuild(app, model):
+    """ Builds a new index in the background while searches keep using the stale one """
+    try:
+        with app.app_context():
+            build(model)
+    except Exception:
+        app.logger.exception('%s search index rebuild failed', model.__tablename__)
+    finally:
+        with _indexes_lock:
+            _building.discard(model.__tablename__)
+
+
+def get_index(model):
+    """ Returns the in-process index for model
+
+    Only the first search waits for a build. Once the index is older than
+    SEARCH_INDEX_TTL, or invalidated, it keeps being served while a
+    background thread builds its replacement.
+    """
+    table = model.__tablename__
+    ttl = current_app.config.get('SEARCH_INDEX_TTL', 60)
+    with _indexes_lock:
+        entry = _indexes.get(table)
+        if entry is not None and time.monotonic() - entry[0] > ttl and table not in _building:
+            _building.add(table)
+            Thread(target=rebuild, args=(current_app._get_current_object(), model), daemon=True).start()
+    if entry is not None:
+        return entry[1]
+    with _build_lock:
+        with _indexes_lock:
+            entry = _indexes.get(table)
+        return entry[1] if entry is not None else build(model)
+
+
+def invalidate(model):
+    """ Marks the in-process index for model stale, so the next search starts a rebuild """
+    with _indexes_lock:
+        _generations[model.__tablename__] += 1
+        entry = _indexes.get(model.__tablename__)
+        if entry is not None:
+            _indexes[model.__tablename__] = (-math.inf, entry[1])
+
+# Search.
+
+
+def ranked(model, term, limit=None, offset=0, genres=(), match='any'):
+    """ Returns (total, rows) of model matching term by name, city or genre, best first
+
+    With genres, only rows having any (or with match='all', all) of them count.
+    An empty term matches every row, by name.
+    """
+    term = (term or '').strip()
+    limit = limit or current_app.config.get('SEARCH_PAGE_SIZE', 20)
+    method = backend()
+    if method != 'ngram':
+        filters = [genre_filter(model, genres, match)] if genres else []
+        if not term:
+            return paged(model, filters, (model.name, model.id), limit, offset)
+        return term_search(model, term, limit, offset, filters, similar=method == 'trigram')
+    index = get_index(model)
+    matches = index.search(term) if term else index.listing()
+    if genres:
+        matches = [row for row in matches if matches_genres(row.genres, genres, match)]
+    return len(matches), matches[offset:offset + limit]
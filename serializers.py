@@ -0,0 +1,87 @@
+"""
+Column-projected serializers and JSON encoding for the API
+"""
+# Imports
+
+import json
+from datetime import date
+from operator import attrgetter
+
+from sqlalchemy import Float, column
+
+from models import Artist, Venue, Show, UpcomingShow
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serializers.
+
+
+class Serializer:
+    """ Turns rows (or model instances) into dicts with a fixed set of fields
+
+    Built from the columns to select, so the same object gives the query its
+    projection and the field getter is compiled once rather than per row.
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self.fields = tuple(column.key for column in columns)
+        getter = attrgetter(*self.fields)
+        self.values = getter if len(self.fields) > 1 else lambda row: (getter(row),)
+
+    def dump(self, row):
+        return dict(zip(self.fields, self.values(row)))
+
+    def dump_many(self, rows):
+        fields, values = self.fields, self.values
+        return [dict(zip(fields, values(row))) for row in rows]
+
+
+# The fields of Artist.to_dict() and Venue.to_dict(), without relationships
+ARTIST_DETAIL = Serializer(
+    Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres, Artist.image_link,
+    Artist.facebook_link, Artist.website_link, Artist.seeking_venue, Artist.seeking_description
+)
+VENUE_DETAIL = Serializer(
+    Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone, Venue.genres, Venue.image_link,
+    Venue.facebook_link, Venue.website_link, Venue.seeking_talent, Venue.seeking_description
+)
+
+ARTIST_SUMMARY = Serializer(Artist.id, Artist.name, Artist.city, Artist.state, Artist.image_link, Artist.created_at)
+VENUE_SUMMARY = Serializer(Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link)
+
+# geo.venues_near rows
+NEARBY_VENUE = Serializer(*VENUE_SUMMARY.columns, column('distance_km', Float))
+
+# search_index.ranked rows
+SEARCH_RESULT = Serializer(Artist.id, Artist.name, Artist.city, Artist.state)
+
+SHOW = Serializer(
+    Show.id, Show.start_time, Show.ends_at,
+    Show.venue_id, Venue.name.label('venue_name'),
+    Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')
+)
+# The same fields from the upcoming shows feed
+UPCOMING_SHOW = Serializer(
+    UpcomingShow.show_id.label('id'), UpcomingShow.start_time, UpcomingShow.ends_at,
+    UpcomingShow.venue_id, UpcomingShow.venue_name,
+    UpcomingShow.artist_id, UpcomingShow.artist_name, UpcomingShow.artist_image_link
+)
+
+# Encoding.
+
+
+def json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """ Returns data encoded as compact JSON bytes, with orjson when it is installed """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=json_default, separators=(',', ':')).encode()